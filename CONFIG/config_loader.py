@@ -28,8 +28,17 @@ class PatternsConfig(TypedDict):
     private_patterns_file: str
     trusted_artists_file: str
 
+class PipelineStageWorkers(TypedDict):
+    download: int
+    sponsorblock: int
+    lyrics: int
+    thumbnail: int
+    tags: int
+    metadata: int
+
 class ProcessingConfig(TypedDict):
     max_lyrics_retries: int
+    id3_padding_kib: int
     playlist_id: str
 
 
@@ -71,6 +80,26 @@ class ProcessingConfig(TypedDict):
     create_db_if_not: bool
     add_folder_files_not_in_list: bool
 
+    workers: int
+    pipeline: bool
+    pipeline_queue_size: int
+    pipeline_stage_workers: PipelineStageWorkers
+    download_workers: int
+    prefetch_workers: int
+
+    use_fingerprints: bool
+    scan_workers: int
+    integrity_mode: Literal["verify", "repair"]
+    metadata_format: Literal["json", "zlib"]
+    metadata_exclude_rebuildable: bool
+
+class DatabaseConfig(TypedDict):
+    synchronous: Literal["OFF", "NORMAL", "FULL"]
+    cache_size_kib: int
+    mmap_size_mib: int
+    commit_interval: float
+    commit_batch: int
+
 class LoggingConfig(TypedDict):
     console_globally: bool
     level_console: str
@@ -82,6 +111,7 @@ class Config(TypedDict):
     paths: PathsConfig
     patterns: PatternsConfig
     processing: ProcessingConfig
+    database: DatabaseConfig
     logging: LoggingConfig
 
 
@@ -28,7 +28,7 @@ config = load_config(CONFIG_FILE)
 # ---------- Validation ----------
 
 def validate_config() -> None:
-    required_sections = ["paths", "patterns", "processing", "logging"]
+    required_sections = ["paths", "patterns", "processing", "database", "logging"]
     for section in required_sections:
         if section not in config:
             raise ValueError(f"Missing section in config.toml: [{section}]")
@@ -79,6 +79,14 @@ TRUSTED_ARTISTS_FILE: Path = PATTERN_DIR / config["patterns"]["trusted_artists_f
 
 # Processing
 MAX_LYRICS_RETRIES: int = config["processing"]["max_lyrics_retries"]
+ID3_PADDING: int = config["processing"]["id3_padding_kib"] * 1024
+
+# Database
+DB_SYNCHRONOUS: str = config["database"]["synchronous"].upper()
+DB_CACHE_SIZE_KIB: int = config["database"]["cache_size_kib"]
+DB_MMAP_SIZE: int = config["database"]["mmap_size_mib"] * 1024 * 1024
+DB_COMMIT_INTERVAL: float = config["database"]["commit_interval"]
+DB_COMMIT_BATCH: int = config["database"]["commit_batch"]
 
 # Logging
 LOGS_CONSOLE_GLOBALLY: bool = config["logging"]["console_globally"]
@@ -7,6 +7,7 @@ from mutagen.id3 import ID3
 from mutagen.id3._frames import TXXX
 
 from FUNCTIONS.helpers import VideoInfo
+from FUNCTIONS.metadata import decode_metadata_payload
 
 from logger import setup_logger
 logger = setup_logger(__name__)
@@ -28,7 +29,7 @@ def write_metadata_to_json(filepath: Path, file: Path, tag: str = 'metadata') ->
             for comment in comments:   # pyright: ignore[reportUnknownVariableType]
                 if isinstance(comment, TXXX) and comment.desc.lower() == tag.lower():  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
                     try:
-                        data = json.loads(comment.text[0])   # pyright: ignore[reportUnknownMemberType, reportAny, reportUnknownArgumentType, reportAttributeAccessIssue]
+                        data = decode_metadata_payload(comment.text[0])   # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType, reportAttributeAccessIssue]
                     except Exception as e:
                         logger.warning(f"[Get Metadata Tag] Exception during converting to python dict: {e}")
                         return None, 2
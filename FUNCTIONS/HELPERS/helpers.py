@@ -1,3 +1,4 @@
+from collections.abc import Callable
 from datetime import datetime
 from typing import TypeAlias, TypedDict, Literal
 from pathlib import Path
@@ -31,6 +32,8 @@ class VideoInfo(TypedDict, total=False):
     syncedlyrics: str
     syncedlyrics_query: str
     auto_subs: str
+    subtitles_track: str # JSON of the subtitle track (lang, ext, url) found at extraction, `subtitles` is fetched from it when needed
+    auto_subs_track: str # Same for `auto_subs`
     try_lyrics_if_not: bool
     lyrics_retries: int
 
@@ -50,6 +53,10 @@ class VideoInfo(TypedDict, total=False):
     status: Literal[0,1,2,3] # downloaded / unavailable / private / unknown
     reason: str # If the file is downloaded and fails this key is added with why it has failed
 
+    fingerprint: str # State of the row, files and config after the last full processing
+    verified_at: float # Last time the file passed the integrity check
+    metadata_digest: str # Digest of the metadata embedded in the file, empty when unknown
+
     date_added: float
     date_modified: float
 
@@ -80,6 +87,8 @@ VideoInfoKey = Literal[
     "syncedlyrics",
     "syncedlyrics_query",
     "auto_subs",
+    "subtitles_track",
+    "auto_subs_track",
     "try_lyrics_if_not",
     "lyrics_retries",
     "update_thumbnail",
@@ -93,6 +102,9 @@ VideoInfoKey = Literal[
     "filename",
     "status",
     "reason",
+    "fingerprint",
+    "verified_at",
+    "metadata_digest",
     "date_added",
     "date_modified"
 ]
@@ -177,6 +189,8 @@ class Ydl_opt(TypedDict, total=False):
     add_metadata: bool
     embed_metadata: bool
     postprocessors: list[Postprocessor]
+    postprocessor_args: dict[str, list[str]]
+    postprocessor_hooks: list[Callable[[dict[str, object]], None]]
     # progress_hooks: list[Callable[[dict[str, Any]], None]]
     http_headers: dict[str, str]
     extractor_args: dict[str, list[str]]
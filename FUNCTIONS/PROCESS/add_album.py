@@ -5,7 +5,7 @@ import time
 from FUNCTIONS.HELPERS.compute_tags_and_album import compute_album
 from FUNCTIONS.HELPERS.fprint import fprint
 from FUNCTIONS.set_tags_and_album import set_album
-from FUNCTIONS.metadata import read_id3_tag
+from FUNCTIONS.metadata import TagSession, read_id3_tag
 
 
 from FUNCTIONS.HELPERS.logger import setup_logger
@@ -23,6 +23,7 @@ def process_album_for_video(
     recompute_album: bool,
     error: bool,
     test_run: bool,
+    tag_session: TagSession | None
 ) -> float:
     """
     Process album for a single video: compute, choose, and embed into MP3.
@@ -33,7 +34,7 @@ def process_album_for_video(
 
     if info:fprint(progress_prefix, f"Getting album for ?", title)
     logger.debug(f"[Album] Getting album for '{title}'")
-    actual_album, state = read_id3_tag(filepath=filepath,frame_id="TALB")
+    actual_album, state = read_id3_tag(filepath=filepath,frame_id="TALB", session=tag_session)
     
     computed_album: str = "Private"
     if title and uploader and recompute_album:
@@ -55,6 +56,7 @@ def process_album_for_video(
             filepath=filepath,
             album=computed_album,
             test_run=test_run,
+            session=tag_session
         )
 
         if success:
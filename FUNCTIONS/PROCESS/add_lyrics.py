@@ -8,6 +8,7 @@ from FUNCTIONS.HELPERS.helpers import VideoInfo
 from FUNCTIONS.sql_requests import update_video_db, get_video_info_from_db
 from FUNCTIONS.lyrics import embed_lyrics_into_mp3, remove_lyrics_from_mp3, has_lyrics
 from FUNCTIONS.extract_lyrics import get_lyrics_from_syncedlyrics
+from FUNCTIONS.download import load_subtitles
 
 from CONSTANTS import MAX_LYRICS_RETRIES
 
@@ -22,10 +23,6 @@ def process_lyrics_for_video(
     lyrics_retries: int,
     title: str,
 
-    subtitles: str | None,
-    # syncedlyrics: str | None,
-    auto_subs: str | None,
-
     skips: list[tuple[float, float]] | None,
     duration: int | None,
     remix_of: str | None,
@@ -43,6 +40,7 @@ def process_lyrics_for_video(
     """
     Process lyrics for a given video: create/update/remove .lrc file (no MP3 embedding).
     Works directly with the SQLite database using VideoInfo.
+    The youtube subtitles are only fetched (load_subtitles) when they are the lyrics to use.
     """ 
 
     start_processing: float = time.time()
@@ -55,20 +53,18 @@ def process_lyrics_for_video(
 
     if remix_of is not None:
         logger.info(f"[Lyrics] video '{video_id}' is a remix of '{remix_of}', processing")
-        remix_info: VideoInfo = get_video_info_from_db(video_id=remix_of, cur=cur)
+        remix_info: VideoInfo = get_video_info_from_db(video_id=remix_of, cur=cur, with_texts=True)
 
-        remix_subtitles: str | None = remix_info.get("subtitles")
         remix_syncedlyrics: str | None = remix_info.get("syncedlyrics")
-        remix_auto_subs: str | None = remix_info.get("auto_subs")
 
+        # Each one is only fetched if the previous ones are missing
+        remix_subtitles: str | None = load_subtitles(video_id=remix_of, auto=False, cur=cur, conn=conn)
         if remix_subtitles:
             remix_lyrics = remix_subtitles
         elif remix_syncedlyrics:
             remix_lyrics = remix_syncedlyrics
-        elif remix_auto_subs:
-            remix_lyrics = remix_auto_subs
         else:
-            remix_lyrics = None
+            remix_lyrics = load_subtitles(video_id=remix_of, auto=True, cur=cur, conn=conn)
 
         orig_duration = remix_info.get("duration")
         # print(remix_lyrics,orig_duration)
@@ -145,6 +141,7 @@ def process_lyrics_for_video(
             else:
                 lyrics = None
                 # Choose which lyrics to use
+                subtitles: str | None = load_subtitles(video_id=video_id, auto=False, cur=cur, conn=conn)
                 if subtitles is not None:
                     logger.debug(f"[Choosing lyrics] Using manual subtitles from youtube for '{title}'")
                     lyrics = subtitles
@@ -153,6 +150,7 @@ def process_lyrics_for_video(
                         logger.debug(f"[Choosing lyrics] Using lyrics from syncedlyrics for '{title}'")
                         lyrics, query = get_lyrics_from_syncedlyrics(title, uploader)
                         if lyrics is None:
+                            auto_subs: str | None = load_subtitles(video_id=video_id, auto=True, cur=cur, conn=conn)
                             if auto_subs is not None:
                                 logger.debug(f"[Choosing lyrics] Using auto subtitles from youtube for '{title}'")
                                 lyrics = auto_subs
@@ -1,4 +1,5 @@
 from typing import Literal
+import time
 
 
 from pathlib import Path
@@ -7,7 +8,7 @@ from sqlite3 import Connection, Cursor
 
 from FUNCTIONS.HELPERS.fileops import load
 from FUNCTIONS.HELPERS.fprint import fprint
-from FUNCTIONS.sql_requests import get_video_info_from_db, get_videos_in_list, insert_video_db, update_video_db
+from FUNCTIONS.sql_requests import flush_video_db, get_incomplete_video_ids, get_videos_in_list, insert_videos_db, update_video_db
 from FUNCTIONS.HELPERS.helpers import VideoInfoMap, VideoInfo, youtube_required_info
 
 from FUNCTIONS.HELPERS.logger import setup_logger
@@ -40,50 +41,61 @@ def add_new_ids_to_database(
         if errors: print(f"\n[Adding ids] Error loading video ID file '{video_id_file}': {e}")
 
 
+    existing: set[str] = set(existing_video_ids)
+    in_list: dict[str, None] = dict.fromkeys(video_ids) # Ordered set, duplicates of the list are dropped
+
     # If asked, insert the videos already presents in the down_dir by date order (should be sorted due to SELECT query who sort by date added)
     if add_folder_files_not_in_list:
-        to_add = video_ids
-        for video_id in existing_video_ids:
-            if video_id not in to_add:
-                to_add.insert(0, video_id)
+        to_add: list[str] = [video_id for video_id in reversed(existing_video_ids) if video_id not in in_list] + list(in_list)
 
     # Build to_add list just by checking that the video is not aleardy in the datalist
     else:
-        to_add: list[str] = [video_id for video_id in video_ids if video_id not in existing_video_ids]
+        to_add = [video_id for video_id in in_list if video_id not in existing]
 
     correct_ids: int = 0
     added_ids: int = 0
     updated_ids: int = 0
 
-    for video_id in to_add:
+    # --- New videos, inserted in one go ---
+    # date_added follows the order of to_add, as when they were inserted one by one
+    now: float = time.time()
+    new_videos: list[VideoInfo] = []
+    for index, video_id in enumerate(video_id for video_id in to_add if video_id not in existing):
         # If the video is in the download dir, and coreectly formatted it will get some data, that i'll use later if the list entry is empty or corrupted
         video_data: VideoInfo = ids_presents_in_down_dir.get(video_id, {})
         status: Literal[0, 1, 2, 3] = video_data.get("status", 3)
-        try:
-            if video_id not in existing_video_ids:
-                if (not include_not_status0 and status == 3) or include_not_status0:
-                    video_data["video_id"] = video_id 
-                    insert_video_db(video_data=video_data, cur=cur, conn=conn)
-                    added_ids += 1
-
-            else:
-                db_data = get_video_info_from_db(video_id=video_id, cur=cur)
-                if not all(key in db_data and db_data[key] is not None for key in youtube_required_info):
-                    if all(key in video_data and video_data[key] is not None for key in youtube_required_info):
-                        update_video_db(video_id=video_id, update_fields=video_data, cur=cur, conn=conn)
-                        updated_ids += 1
-                else:
-                    correct_ids += 1
-
-            if info: fprint("",f"[Adding ids] Added {added_ids} ids, Updated {updated_ids} ids, {correct_ids} ids ok")
-
-
-        except Exception as e:
-            logger.error(f"[Adding ids] Failed to insert / update video_id '{video_id}': {e}")
-            if errors: 
-                print(f"\n[Adding ids] Failed to insert / update video_id '{video_id}': {e}")
-
-    conn.commit()
-    logger.info("[Adding ids] " + ("All ids are in the database" if not to_add else f"Added {added_ids}, updated {update_video_db} ids to the database"))
+        if (not include_not_status0 and status == 3) or include_not_status0:
+            new_videos.append({"date_added": now + index * 1e-6} | video_data | {"video_id": video_id})
+
+    try:
+        added_ids = insert_videos_db(videos=new_videos, cur=cur, conn=conn)
+    except Exception as e:
+        logger.error(f"[Adding ids] Failed to insert {len(new_videos)} new videos: {e}")
+        if errors: print(f"\n[Adding ids] Failed to insert {len(new_videos)} new videos: {e}")
+
+
+    # --- Videos already in the database, completed with the data of their file if theirs is missing ---
+    incomplete: set[str] = get_incomplete_video_ids(keys=youtube_required_info, cur=cur)
+    for video_id in to_add:
+        if video_id not in existing:
+            continue
+        if video_id not in incomplete:
+            correct_ids += 1
+            continue
+
+        video_data = ids_presents_in_down_dir.get(video_id, {})
+        if all(key in video_data and video_data[key] is not None for key in youtube_required_info):
+            try:
+                update_video_db(video_id=video_id, update_fields=video_data, cur=cur, conn=conn)
+                updated_ids += 1
+            except Exception as e:
+                logger.error(f"[Adding ids] Failed to update video_id '{video_id}': {e}")
+                if errors: print(f"\n[Adding ids] Failed to update video_id '{video_id}': {e}")
+
+    if info and to_add: fprint("",f"[Adding ids] Added {added_ids} ids, Updated {updated_ids} ids, {correct_ids} ids ok")
+
+    # The next steps select videos in SQL, the updates must be written
+    flush_video_db(cur=cur, conn=conn)
+    logger.info("[Adding ids] " + ("All ids are in the database" if not to_add else f"Added {added_ids}, updated {updated_ids} ids to the database"))
     if info and not to_add: print("[Adding ids] All ids are in the database")
     elif info: print()
@@ -7,6 +7,7 @@ from FUNCTIONS.HELPERS.compute_tags_and_album import compute_tags
 from FUNCTIONS.HELPERS.fprint import fprint
 from FUNCTIONS.sql_requests import update_video_db
 from FUNCTIONS.set_tags_and_album import set_tags
+from FUNCTIONS.metadata import TagSession
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
@@ -29,7 +30,8 @@ def process_tags_for_video(
     sep: str,
     start_def: str,
     end_def: str,
-    tag_sep: str
+    tag_sep: str,
+    tag_session: TagSession | None
 ) -> float:
     """
     Process tags for a single video: compute, merge, and embed into MP3.
@@ -57,7 +59,8 @@ def process_tags_for_video(
         sep=sep,
         start_def=start_def,
         end_def=end_def,
-        tag_sep=tag_sep
+        tag_sep=tag_sep,
+        session=tag_session
     )
 
     # Update DB with merged tags
@@ -8,6 +8,7 @@ import time
 from FUNCTIONS.HELPERS.fprint import fprint
 from FUNCTIONS.thumbnail import has_embedded_cover, embed_image_in_mp3, download_and_pad_image, remove_image_from_mp3
 from FUNCTIONS.sql_requests import update_video_db
+from FUNCTIONS.metadata import TagSession
 from FUNCTIONS.HELPERS.helpers import thumbnail_png_path_for_mp3
 
 from FUNCTIONS.HELPERS.logger import setup_logger
@@ -30,7 +31,8 @@ def process_thumbnail_for_video(
     cur: Cursor,
     conn: Connection,
     test_run: bool,
-    force_recompute_thumbnails: bool
+    force_recompute_thumbnails: bool,
+    tag_session: TagSession | None
 ) -> float:
     """
     Process thumbnail for a single video: extract, download, embed, or update.
@@ -43,7 +45,7 @@ def process_thumbnail_for_video(
 
     # Asked to remove thumbnail
     if remove_thumbnail:
-        success_remove = remove_image_from_mp3(mp3_path=filepath, image_path=this_thumbnail_path, test_run=test_run)
+        success_remove = remove_image_from_mp3(mp3_path=filepath, image_path=this_thumbnail_path, test_run=test_run, session=tag_session)
         if success_remove:
             update_video_db(video_id=video_id, update_fields={"update_thumbnail": False},cur=cur, conn=conn)
             fprint(progress_prefix, f"[Remove thumbnail] Sucessfully removed thumbnail and file for '{filepath}'")
@@ -58,7 +60,7 @@ def process_thumbnail_for_video(
         if info: fprint(progress_prefix, f"Checking thumbnail for ?", title)
         logger.verbose(f"[Thumbnail] Checking thumbnail for '{title}'")
 
-        embedded_bytes = has_embedded_cover(filepath)
+        embedded_bytes = has_embedded_cover(filepath, session=tag_session)
 
         # Save embedded cover to file if it's missing
         if embedded_bytes is not None and this_thumbnail_path and not this_thumbnail_path.exists():
@@ -107,7 +109,7 @@ def process_thumbnail_for_video(
                     success = download_and_pad_image(image_url=thumbnail_url, save_path=this_thumbnail_path, thumbnail_format=thumbnail_format)
                     logger.debug(f"[Thumbnail] Downloaded cover at '{thumbnail_url}'")
                 if success is True:
-                    embed_success: bool = embed_image_in_mp3(mp3_path=filepath, image_path=this_thumbnail_path,test_run=test_run)
+                    embed_success: bool = embed_image_in_mp3(mp3_path=filepath, image_path=this_thumbnail_path,test_run=test_run, session=tag_session)
                     if embed_success is True:
                         update_video_db(video_id=video_id, update_fields={"update_thumbnail": False}, cur=cur, conn=conn)
                         if info: fprint(progress_prefix, f"{'Downloaded & e' if download_thumbnail else 'E'}mbedded cover for ?", title)
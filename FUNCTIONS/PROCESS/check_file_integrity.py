@@ -3,9 +3,10 @@ from sqlite3 import Connection, Cursor
 import time
 from typing import Literal
 
-from FUNCTIONS.metadata import repair_mp3_file
-from FUNCTIONS.sql_requests import update_video_db, get_video_info_from_db
-from FUNCTIONS.HELPERS.helpers import VideoInfo, VideoInfoMap, youtube_required_info
+from FUNCTIONS.metadata import check_mp3_integrity
+from FUNCTIONS.library_index import unindex_file
+from FUNCTIONS.sql_requests import VIDEO_TEXT_COLUMNS, fill_missing_texts, update_video_db, get_video_info_from_db
+from FUNCTIONS.HELPERS.helpers import VideoInfo, VideoInfoMap, remove_data_from_video_info, youtube_required_info
 
 
 from FUNCTIONS.HELPERS.logger import setup_logger
@@ -21,6 +22,7 @@ def check_file_integrity_for_video(
     ids_present_in_down_dir: VideoInfoMap,
     retry_unavailable: bool,
     retry_private: bool,
+    integrity_mode: Literal["verify", "repair"],
     cur: Cursor,
     conn: Connection,
     test_run: bool
@@ -50,18 +52,23 @@ def check_file_integrity_for_video(
         if not filepath or not filepath.exists():
             # logger.warning(filepath)
             logger.debug(f"[File Checking] Missing filename or file not found for '{video_id}'")
+            unindex_file(video_id=video_id, cur=cur)
             return True ,time.time() - start_processing
 
         title: str = metadata.get("title", "")
 
-        # Merge DB data with extracted metadata
-        fusion: VideoInfo = metadata | video_data
+        # Merge DB data with extracted metadata, the texts embedded in the file only fill the missing ones
+        fusion: VideoInfo = remove_data_from_video_info(data=metadata.copy(), to_remove=VIDEO_TEXT_COLUMNS) | video_data
 
         if all(key in fusion and fusion[key] is not None for key in youtube_required_info):
-            if repair_mp3_file(filepath,test_run):
+            integrity: Literal[0, 1, 2] = check_mp3_integrity(filepath=filepath, verified_at=video_data.get("verified_at"), integrity_mode=integrity_mode, test_run=test_run)
+            if integrity != 2:
                 fusion["status"] = 0  # downloaded
+                if integrity == 1:
+                    fusion["verified_at"] = time.time()
                 update_video_db(video_id, fusion, cur, conn)
-                logger.debug(f"[File Checking] File valid and repaired: '{title}'")
+                fill_missing_texts(video_id=video_id, texts=metadata, cur=cur, conn=conn)
+                logger.debug(f"[File Checking] File valid{'' if integrity == 0 else ' (checked)'}: '{title}'")
                 return False ,time.time() - start_processing
             else:
                 logger.warning(f"[File Checking] Corrupted file, re-downloading: '{title}'")
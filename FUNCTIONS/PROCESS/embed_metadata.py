@@ -1,13 +1,13 @@
 from pathlib import Path
-import json
 from sqlite3 import Cursor
+from typing import Literal
 import time
 
 
 # from DEBUG.compare_dicts import compare_dicts
 from FUNCTIONS.HELPERS.fprint import fprint
-from FUNCTIONS.HELPERS.helpers import VideoInfo, normalize_skips, remove_data_from_video_info, timestamp_to_id3_unique
-from FUNCTIONS.metadata import get_metadata_tag, read_id3_tag, write_id3_tag
+from FUNCTIONS.HELPERS.helpers import VideoInfo, remove_data_from_video_info, timestamp_to_id3_unique
+from FUNCTIONS.metadata import REBUILDABLE_METADATA_KEYS, TagSession, compute_metadata_digest, encode_metadata_payload, read_id3_tag, write_id3_tag
 
 
 from FUNCTIONS.sql_requests import get_video_info_from_db
@@ -25,15 +25,28 @@ def embed_metadata_for_video(
     cur: Cursor,
     info: bool,
     error: bool,
-) -> tuple[float, bool]:
+    metadata_format: Literal["json", "zlib"],
+    exclude_rebuildable: bool,
+    tag_session: TagSession | None
+) -> tuple[float, bool, str | None]:
     """
     Embed metadata from DB into a single MP3 file using get_video_info.
     Also sets the 'TDRC' (date) frame to the video's date_added.
+    A digest of the payload and date is embedded next to them (TXXX:metadata_digest),
+    and returned to be stored in the DB once the tag session is saved (None if
+    there is nothing to store): when the DB digest matches, the file isn't even read.
+    The payload is encoded in `metadata_format`, without the fields that can be
+    fetched again from YouTube if `exclude_rebuildable`.
     """
 
     start_processing: float = time.time()
 
-    video_info: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur)
+    # The rebuildable keys are the large texts, only loaded when they are embedded
+    video_info: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur, with_texts=not exclude_rebuildable)
+    stored_digest: str = video_info.get("metadata_digest", "")
+
+    # The fingerprint, verification date and digest describe the file itself, they can't be embedded into it
+    video_info = remove_data_from_video_info(data=video_info.copy(), to_remove=["fingerprint", "verified_at", "metadata_digest"] + (REBUILDABLE_METADATA_KEYS if exclude_rebuildable else []))
     date: float = video_info.get('date_added',0.0)
     tm: str = timestamp_to_id3_unique(ts=date)
     title: str = video_info.get("title", "")
@@ -43,9 +56,18 @@ def embed_metadata_for_video(
     logger.verbose(f"[Metadata] Embedding metadata for '{title}'")
 
 
+    # Same digest as the database: the date and payload are already embedded, the file isn't opened
+    digest: str = compute_metadata_digest(data=video_info, metadata_format=metadata_format, id3_date=tm)
+
+    if digest == stored_digest:
+        fprint(progress_prefix, "No need to embed metadata for ?", title)
+        logger.info(f"No need to embed metadata for {title} (same digest as the database)")
+        return time.time() - start_processing, True, None
+
+
     # Embed the id in the dat field, to sort the video in the player
 
-    file_date, state = read_id3_tag(filepath=filepath, frame_id="TDRC")
+    file_date, state = read_id3_tag(filepath=filepath, frame_id="TDRC", session=tag_session)
 
     update_date: bool = False
     if state == 0:
@@ -66,7 +88,8 @@ def embed_metadata_for_video(
                 filepath=filepath,
                 frame_id="TDRC",
                 data=tm,
-                test_run=test_run
+                test_run=test_run,
+                session=tag_session
             )
             if not success_date:
                 if error: print(f"\n[Metadata] Failed to embed date '{tm}' for '{title}'")
@@ -80,45 +103,34 @@ def embed_metadata_for_video(
 
 
 
-    # Embed full metadata as JSON
-
-    file_video_info, _ = get_metadata_tag(filepath=filepath)
-    data: str = json.dumps(video_info,indent=4, ensure_ascii=True)
-
-    update_data: bool = True
-    if file_video_info:
-        cleaned_file_info: VideoInfo = remove_data_from_video_info(data=file_video_info,to_remove=["date_added", "date_modified"])
-        cleaned_data: VideoInfo = remove_data_from_video_info(data=video_info,to_remove=["date_added", "date_modified"])
-        if "skips" in cleaned_file_info:
-            cleaned_file_info = normalize_skips(cleaned_file_info)
-        if (cleaned_file_info == cleaned_data ):
-            if cleaned_data:
-                update_data = False
-
-        # Debug feature to see why they are updating
-        # else:
-            # compare_dicts(cleaned_data, cleaned_file_info)
-
-    if update_data:
-        success_meta: bool = write_id3_tag(
-            filepath=filepath,
-            frame_id="TXXX:metadata",
-            data=data,
-            test_run=test_run
-        )
-
-        if not success_meta:
-            if error: print(f"\n[Metadata] Failed to embed metadata for '{title}'")
-            logger.warning(f"[Metadata] Failed to embed metadata for '{title}'")
-        else:
-            if info: fprint(progress_prefix, f"Embedded metadata for ?", title)
-            logger.info(f"[Metadata] Embedded metadata for '{title}'")
-        return time.time() - start_processing, False
-    else:
+    # Embed full metadata, unless its digest shows it is already there
 
+    # Not known by the database: compare with the digest embedded next to the payload
+    file_digest, digest_state = read_id3_tag(filepath=filepath, frame_id="TXXX:metadata_digest", session=tag_session)
+    if digest_state == 0 and file_digest and str(file_digest[0]) == digest:
         fprint(progress_prefix, "No need to embed metadata for ?", title)
-        logger.info(f"No need to embed metadata for {title}")
-        return time.time() - start_processing, True
-
-
-
+        logger.info(f"No need to embed metadata for {title} (same digest as the file)")
+        return time.time() - start_processing, True, digest
+
+    data: str = encode_metadata_payload(data=video_info, metadata_format=metadata_format)
+    success_meta: bool = write_id3_tag(
+        filepath=filepath,
+        frame_id="TXXX:metadata",
+        data=data,
+        test_run=test_run,
+        session=tag_session
+    ) and write_id3_tag(
+        filepath=filepath,
+        frame_id="TXXX:metadata_digest",
+        data=digest,
+        test_run=test_run,
+        session=tag_session
+    )
+
+    if not success_meta:
+        if error: print(f"\n[Metadata] Failed to embed metadata for '{title}'")
+        logger.warning(f"[Metadata] Failed to embed metadata for '{title}'")
+        return time.time() - start_processing, False, ""
+    if info: fprint(progress_prefix, f"Embedded metadata for ?", title)
+    logger.info(f"[Metadata] Embedded metadata for '{title}'")
+    return time.time() - start_processing, False, digest
@@ -1,26 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sqlite3 import Cursor
+from sqlite3 import Connection, Cursor
 
 
 from FUNCTIONS.HELPERS.fileops import load
-from FUNCTIONS.sql_requests import get_videos_in_list, get_video_info_from_db
-from FUNCTIONS.HELPERS.fprint import fprint
+from FUNCTIONS.HELPERS.helpers import lyrics_lrc_path_for_mp3, thumbnail_png_path_for_mp3
+from FUNCTIONS.sql_requests import get_filenames, get_videos_in_list, remove_videos
+from FUNCTIONS.library_index import unindex_files
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
 
 
+
+
+# Threads unlinking the files of the removed videos
+REMOVE_WORKERS: int = 8
+
+
+
+
+def _remove_files(filename: str, download_path: Path, error: bool) -> bool:
+    """Delete the mp3 of a video with its .lrc and .png, returns False on error"""
+    try:
+        filepath: Path = download_path / filename
+        filepath.unlink(missing_ok=True)
+        lyrics_lrc_path_for_mp3(filepath).unlink(missing_ok=True)
+        thumbnail_png_path_for_mp3(filepath).unlink(missing_ok=True)
+        return True
+    except OSError as e:
+        logger.error(f"[Removing Ids] Error while removing {filename}: {e}")
+        if error: print(f"[Removing Ids] Error while removing {filename}: {e}")
+    except Exception as e:
+        logger.error(f"[Removing Ids] Unknown error while deleting {filename}: {e}")
+        if error: print(f"[Removing Ids] Unknown error while deleting {filename}: {e}")
+    return False
+
+
+
+
 def remove_ids_not_in_list(
     video_id_file: Path,
     download_path: Path,
     include_not_status0: bool,
     cur: Cursor,
+    conn: Connection,
     info: bool,
     error: bool,
     test_run: bool
 ) -> None:
     """
-    Remove id from list if not in playlist
+    Remove id from list if not in playlist.
+    The filenames are read and the rows deleted in one query each, the files are unlinked by a thread pool.
     """
     existing_video_ids: set[str] = set[str](get_videos_in_list(include_not_status0=include_not_status0,cur=cur))
 
@@ -30,39 +61,23 @@ def remove_ids_not_in_list(
     removed_ids = 0
     removed_files = 0
 
+    if not_in_video_ids:
+        filenames: dict[str, str] = get_filenames(video_ids=not_in_video_ids, cur=cur)
 
-    for video_id in not_in_video_ids:
-        data = get_video_info_from_db(video_id, cur)
-        filename = data.get("filename","")
-        
-        if filename:
-            try:
-                if not test_run:
-                    filepath: Path = (download_path / filename).with_suffix(suffix="mp3")
-                    lyrics_path: Path = (download_path / filename).with_suffix(suffix="lrc")
-                    thumbnail_path: Path = (download_path / filename).with_suffix(suffix="png")
-
-                    filepath.unlink(missing_ok=True)
-                    lyrics_path.unlink(missing_ok=True)
-                    thumbnail_path.unlink(missing_ok=True)
-
-                removed_files += 1
-            except OSError as e:
-                logger.error(f"[Removing Ids] Error while removing {filename}: {e}")
-                if error: print(f"[Removing Ids] Error while removing {filename}: {e}")
-            except Exception as e:
-                logger.error(f"[Removing Ids] Unknown error while deleting {filename}: {e}")
-                if error: print(f"[Removing Ids] Unknown error while deleting {filename}: {e}")
+        if test_run:
+            removed_files = len(filenames)
+            removed_ids = len(not_in_video_ids)
+        else:
+            with ThreadPoolExecutor(max_workers=REMOVE_WORKERS, thread_name_prefix="remove") as executor:
+                removed_files = sum(executor.map(lambda filename: _remove_files(filename=filename, download_path=download_path, error=error), filenames.values()))
+            unindex_files(video_ids=set(filenames), cur=cur)
 
-        if not test_run: _ = cur.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
-        removed_ids += 1
-        if info: fprint("",f"[Removing Ids] Removed {removed_ids} from list")
+            removed_ids = remove_videos(video_ids=not_in_video_ids, cur=cur, conn=conn)
 
 
-    if info: print()
     if removed_ids == 0:
         logger.info("[Removing Ids] No video to remove from the database")
         if info: print("[Removing Ids] No video to remove from the database")
     else:
         logger.info(f"[Removing Ids] Removed {removed_ids} videos and {removed_files} files")
-        if info: print(f"[Removing Ids] Removed {removed_ids} videos and {removed_files} files")
\ No newline at end of file
+        if info: print(f"[Removing Ids] Removed {removed_ids} videos and {removed_files} files")
@@ -6,12 +6,39 @@ from sqlite3 import Connection, Cursor
 
 from FUNCTIONS.HELPERS.fprint import fprint
 from FUNCTIONS.sponsorblock import get_skip_segments, cut_segments_ffmpeg
-from FUNCTIONS.sql_requests import update_video_db
+from FUNCTIONS.mp3_splice import Mp3SpliceError, splice_mp3
+from FUNCTIONS.sql_requests import get_video_info_from_db, update_video_db
+from FUNCTIONS.HELPERS.helpers import VideoInfo
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
 
 
+def get_segments_for_download(video_id: str, download_path: Path, categories: list[str], cur: Cursor) -> list[tuple[float, float]] | None:
+    """
+    Segments to cut while downloading a video without file: the known ones, else those of SponsorBlock.
+    None if it has a file, is marked unavailable or the query failed: its cut is left to remove_sponsorblock_segments_for_video.
+    """
+    data: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur)
+
+    filename: str | None = data.get("filename")
+    if (filename and (download_path / filename).exists()) or data.get("status", 0) in (1, 2):
+        return None
+
+    # Known from a previous download of the video
+    skips: list[tuple[float, float]] = data.get("skips", [])
+    if skips:
+        return skips
+    if data.get("removed_segments_int") == -1 and data.get("removed_segments_duration") == -1.0:
+        return []
+
+    try:
+        return get_skip_segments(video_id, categories=categories)
+    except Exception as e:
+        logger.warning(f"[Sponsorblock] Failed to get the segments of '{video_id}' before its download: {e}")
+        return None
+
+
 def remove_sponsorblock_segments_for_video(
     video_id: str,
     title: str,
@@ -31,13 +58,7 @@ def remove_sponsorblock_segments_for_video(
     start_cut: float = time.time()
 
     # --- Fetch existing skips from DB ---
-    _ = cur.execute("""
-        SELECT segment_start, segment_end
-        FROM removed_segments
-        WHERE video_id = ?
-    """, (video_id,))
-
-    skips = [(row["segment_start"], row["segment_end"]) for row in cur.fetchall()]  # pyright: ignore[reportAny]
+    skips: list[tuple[float, float]] = get_video_info_from_db(video_id=video_id, cur=cur).get("skips", [])
 
 
     # --- If values are defined (not None) ---
@@ -76,7 +97,14 @@ def remove_sponsorblock_segments_for_video(
 
     temp_output = filepath.with_suffix(".tmp.mp3")
     try:
-        total_removed = cut_segments_ffmpeg(filepath, temp_output, skips,test_run)
+        # Dropping whole frames, without decoding nor re-encoding; ffmpeg only for files it can't handle
+        try:
+            total_removed = splice_mp3(input_file=filepath, output_file=temp_output, segments=skips, test_run=test_run)
+        except Mp3SpliceError as e:
+            logger.warning(f"[Sponsorblock] {e}, cutting '{title}' with ffmpeg")
+            if temp_output.exists():
+                temp_output.unlink()
+            total_removed = cut_segments_ffmpeg(filepath, temp_output, skips,test_run)
         successful_segments = len(skips)
         update_video_db(
             video_id,
@@ -84,9 +112,11 @@ def remove_sponsorblock_segments_for_video(
                 "removed_segments_int": successful_segments,
                 "removed_segments_duration": total_removed,
                 "skips": skips,
+                "metadata_digest": "", # The cut file must be checked again
             },
             cur,
-            conn
+            conn,
+            flush=True # Cutting twice would remove audio, this must not be lost
         )
 
         logger.info(f"[Sponsorblock] Removed {successful_segments} segments ({round(total_removed, 1)}s) from '{title}'")
@@ -97,7 +127,7 @@ def remove_sponsorblock_segments_for_video(
             fprint(progress_prefix, f"Sucessfully cutted {len(skips)} segments from ?", title)
         logger.info(f"[Sponsorblock] Sucessfully cutted {len(skips)} segments from '{title}'")
 
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, OSError):
         logger.error(f"[Sponsorblock] Error cutting segments for '{title}'")
         if temp_output.exists():
             temp_output.unlink()
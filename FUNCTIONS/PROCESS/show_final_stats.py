@@ -1,12 +1,8 @@
-from typing import Literal
-
-
-from pathlib import Path
 from sqlite3 import Cursor
 from CONSTANTS import CORRECT_NOT_IN_DIR_FILE, UNAVAILABLE_VIDEOS_FILE
-from FUNCTIONS.extract_and_clean import extract_and_clean_video_ids
+from FUNCTIONS.library_index import LibraryStats, get_library_stats
+from FUNCTIONS.metadata import get_save_stats
 from FUNCTIONS.HELPERS.fileops import dump
-from FUNCTIONS.HELPERS.helpers import VideoInfoMap
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
@@ -16,7 +12,6 @@ logger = setup_logger(__name__)
 
 
 def show_final_stats(
-    download_path: Path,
     entire_duration: str | None,
     calculating_duration: str | None,
     download_duration: str | None,
@@ -26,35 +21,16 @@ def show_final_stats(
     tag_duration: str | None,
     album_duration: str | None,
     metadata_duration: str | None,
-    cur: Cursor,
-    test_run: bool,
-    remove_malformatted: bool,
-    force_mp3_presence: bool
+    cur: Cursor
 ) -> None:
     """
-    Show infos from the process, how much videos are correctly formatted and downloaded, and how much aren't
+    Show infos from the process, how much videos are correctly formatted and downloaded, and how much aren't.
+    Works from the library index kept up to date during the process, without rescanning the download directory.
     """
 
-    ids_present_in_down_dir: VideoInfoMap = extract_and_clean_video_ids(
-        download_directory=download_path,
-        info=False,
-        test_run=test_run,
-        remove=remove_malformatted,
-        force_mp3_presence=force_mp3_presence
-    )
-
-    list_without_unavailable: VideoInfoMap = {}
-
-    _ = cur.execute("SELECT video_id, status FROM videos")
-    infos: set[tuple[str, Literal[0, 1, 2, 3]]]  = {(row["video_id"],row["status"]) for row in cur.fetchall()}  # pyright: ignore[reportAny]
-
-    for video_id, status in infos:
-        if status == 0: # Downloaded
-            list_without_unavailable[video_id] = {}
-
-
-    not_in_dir: set[str] = set(list_without_unavailable.keys()) - set(ids_present_in_down_dir.keys())
-    not_in_list: set[str] = set(ids_present_in_down_dir.keys()) - set(list_without_unavailable.keys())
+    stats: LibraryStats = get_library_stats(cur=cur)
+    not_in_dir: list[str] = stats["not_in_dir"]
+    not_in_list: list[str] = stats["not_in_list"]
 
     final_stats: list[str] = []
 
@@ -63,15 +39,15 @@ def show_final_stats(
         final_stats.append(" ✅ The database and the download dir have been sucessfully synchronized")
     else:
         if not not_in_dir:
-            final_stats.append(f" - {len(list_without_unavailable)} ids are in the database and correctly downloaded")
+            final_stats.append(f" - {stats['downloaded_in_db']} ids are in the database and correctly downloaded")
         else:
-            final_stats.append(f" - {len(infos) - len(not_in_dir)} ids have not been downloaded, marked as unavailable")
+            final_stats.append(f" - {stats['total_in_db'] - len(not_in_dir)} ids have not been downloaded, marked as unavailable")
             if len(not_in_dir) < 10:
                 for id in not_in_dir:
                     final_stats.append(f"   • {id}")
                 final_stats.append("\n")
             else:
-                dump(data=list[str](not_in_dir),file=UNAVAILABLE_VIDEOS_FILE)
+                dump(data=not_in_dir,file=UNAVAILABLE_VIDEOS_FILE)
                 final_stats.append(f"   • List written in {UNAVAILABLE_VIDEOS_FILE}")
 
         if not not_in_list:
@@ -83,12 +59,16 @@ def show_final_stats(
                     final_stats.append(f"   • {id}")
                 final_stats.append("\n")
             else:
-                dump(data=list[str](not_in_list),file=CORRECT_NOT_IN_DIR_FILE)
+                dump(data=not_in_list,file=CORRECT_NOT_IN_DIR_FILE)
                 final_stats.append(f"   • List written in {CORRECT_NOT_IN_DIR_FILE}")
 
-    print(f"\n[TOTAL]:\n - {len(infos)} total videos are in the database {'(contains privates and unavailable)' if len(list_without_unavailable) < len(infos) else ""}\n - {len(ids_present_in_down_dir)} total videos are in download directory")
+    print(f"\n[TOTAL]:\n - {stats['total_in_db']} total videos are in the database {'(contains privates and unavailable)' if stats['downloaded_in_db'] < stats['total_in_db'] else ''}\n - {stats['in_dir']} total videos are in download directory")
     print("\n".join(final_stats))
 
+    tag_saves, tag_rewrites = get_save_stats()
+    print(f" - {tag_saves} tag saves, {tag_rewrites} of them had to rewrite the whole file")
+    logger.info(f"[Stats] {tag_saves} tag saves, {tag_rewrites} full-file rewrites")
+
 
     print(f"[TOTAL TIME] : {entire_duration}")
 
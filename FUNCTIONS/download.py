@@ -1,9 +1,13 @@
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from queue import Queue
 from re import Match
 import time
 import re
+import threading
 from sqlite3 import Connection, Cursor
-from typing import TypeAlias, cast, Literal
+from typing import TypeAlias, TypedDict, cast, Literal
 import requests
 import json
 
@@ -15,15 +19,81 @@ from FUNCTIONS.HELPERS.fprint import fprint
 from FUNCTIONS.HELPERS.text_helpers import sanitize_text
 from FUNCTIONS.HELPERS.helpers import ExtractedInfo, QuietLogger, Ydl_opt, VideoInfo, youtube_required_info
 
-from FUNCTIONS.metadata import get_metadata_tag, repair_mp3_file
+from FUNCTIONS.metadata import check_mp3_integrity, get_metadata_tag
 from FUNCTIONS.sql_requests import get_video_info_from_db, update_video_db
+from FUNCTIONS.library_index import index_file
+from FUNCTIONS.sponsorblock import removed_duration, segments_audio_filter
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
 
 
+# Filenames picked by downloads still in progress, so that two parallel
+# downloads of videos with the same title never share an output file
+_reserved_filenames: set[str] = set()
+_reserved_filenames_lock: threading.Lock = threading.Lock()
 
+MP3_BITRATE: int = 192 # kbps of the downloads
 
+# Postprocessing of the download running in this thread (a pooled YoutubeDL is only used by its borrower)
+_postprocessing: threading.local = threading.local()
+
+
+
+
+def _record_postprocessor(status: dict[str, object]) -> None:
+    """postprocessor_hooks entry: remembers that the FFmpegExtractAudio transcode (and its filter) ran"""
+    if status.get("status") == "finished" and status.get("postprocessor") == "ExtractAudio":
+        _postprocessing.extracted = True
+
+
+
+
+class YoutubeDLPool:
+    """
+    Long-lived YoutubeDL instances, created on first need and lent to one job at a time,
+    so the extractors are set up once per instance instead of once per video.
+    Their number is also the number of jobs running at once: borrow() waits for a free one.
+    """
+    def __init__(self, size: int, params: Callable[[], Ydl_opt]) -> None:
+        self._size: int = max(1, size)
+        self._params: Callable[[], Ydl_opt] = params
+        self._idle: Queue[yt_dlp.YoutubeDL] = Queue()
+        self._created: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+
+    @contextmanager
+    def borrow(self) -> Iterator[yt_dlp.YoutubeDL]:
+        with self._lock:
+            create: bool = self._idle.empty() and self._created < self._size
+            if create:
+                self._created += 1
+        ydl: yt_dlp.YoutubeDL = yt_dlp.YoutubeDL(params=self._params()) if create else self._idle.get()  # pyright: ignore[reportArgumentType]
+
+        try:
+            yield ydl
+        except BaseException:
+            # Its state is unknown after an unexpected error, the next job gets a new one
+            ydl.close()
+            with self._lock:
+                self._created -= 1
+            raise
+        self._idle.put(ydl)
+
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get().close()
+            with self._lock:
+                self._created -= 1
+
+
+
+
+# Created by configure_download_pools, for the run
+_download_pool: YoutubeDLPool | None = None
+_extract_pool: YoutubeDLPool | None = None
 
 
 
@@ -37,13 +107,15 @@ def _get_unique_filename(loc: Path, base: str, ext: str, video_id: str) -> str:
     filename = base
     filepath = loc / f"{filename}{ext}"
 
-    while filepath.exists():
-        data, state = get_metadata_tag(filepath)
-        if state == 0 and data is not None:
-            vid: str | None = data.get("video_id")
-            if vid is not None:
-                if vid == video_id:
-                    return filename
+    while filepath.exists() or filename in _reserved_filenames:
+        # A name reserved by a running download is never reused
+        if filename not in _reserved_filenames:
+            data, state = get_metadata_tag(filepath)
+            if state == 0 and data is not None:
+                vid: str | None = data.get("video_id")
+                if vid is not None:
+                    if vid == video_id:
+                        return filename
 
         filename = f"{base}_{counter}"
         filepath = loc / f"{filename}{ext}"
@@ -70,11 +142,12 @@ def _build_ydl_opts(loc: Path, filename: str | None = None, format_str: str = "b
         "add_metadata": True,
         "embed_metadata": True,
         "verbose": True,
+        "postprocessor_hooks": [_record_postprocessor],
         "postprocessors": [
             {
                 "key": "FFmpegExtractAudio",
                 "preferredcodec": "mp3",
-                "preferredquality": "192"
+                "preferredquality": str(MP3_BITRATE)
             },
             {"key": "FFmpegMetadata"}
         ],
@@ -119,6 +192,12 @@ def safe_bool(value: object, default: bool = False) -> bool:
 SubtitleLine: TypeAlias = tuple[float, float, str]  # (start_seconds, end_seconds, text)
 
 
+class SubtitleTrack(TypedDict):
+    lang: str
+    ext: str # "vtt" or "srt"
+    url: str
+
+
 def _parse_timestamp(ts: str) -> float:
     """Convert timestamp (HH:MM:SS.mmm or HH:MM:SS,mmm) into seconds (float)"""
     ts = ts.replace(",", ".")
@@ -198,39 +277,34 @@ def _srt_to_synced(srt: str) -> list[SubtitleLine]:
 
 
 
-def _pick_subtitles(info: ExtractedInfo, auto: bool = False) -> list[SubtitleLine]:
+def _pick_subtitle_track(info: ExtractedInfo, auto: bool = False) -> SubtitleTrack | None:
     """
-    Fetch the subtitles.
+    Choose the subtitle track of a video, without fetching it.
     Parameters:
-      - auto: If True, fetch the auto-generated subtitles; otherwise, fetch manual subtitles.
+      - auto: If True, choose among the auto-generated subtitles; otherwise, among the manual subtitles.
     Returns:
-      - list of (start, end, text) for synced lyrics
+      - the language, format and url of the track, None if there is no usable one
     """
     subtitles: dict[str, list[dict[str, str]]] = info.get("subtitles", {}) or {}
     automatic_subtitles: dict[str, list[dict[str, str]]] = info.get("automatic_captions", {}) or {}
+    tracks: dict[str, list[dict[str, str]]] = automatic_subtitles if auto else subtitles
 
     # Try to detect original language
     original_lang: str | None = info.get("language_code",info.get("language"))
 
     # Select entries (prefer original_lang, else first available track)
-    entries: list[dict[str, str]] = []
-    if auto:
-        if original_lang and original_lang in automatic_subtitles:
-            entries = automatic_subtitles[original_lang]
-        elif automatic_subtitles:
-            entries = next(iter(automatic_subtitles.values()), [])  # pyright: ignore[reportUnknownArgumentType]
-    else:
-        if original_lang and original_lang in subtitles:
-            entries = subtitles[original_lang]
-        elif subtitles:
-            entries = next(iter(subtitles.values()), [])  # pyright: ignore[reportUnknownArgumentType]
+    lang: str | None = None
+    if original_lang and original_lang in tracks:
+        lang = original_lang
+    elif tracks:
+        lang = next(iter(tracks))
 
-    if not entries:
+    if lang is None:
         logger.debug(f"[Sub Fetch] No {'automatic' if auto else 'manual'} subtitles found (lang={original_lang})")
-        return []
+        return None
 
-    # Parse VTT or SRT files
-    for entry in entries:
+    # VTT or SRT formats
+    for entry in tracks[lang]:
         sub_url = entry.get("url")
         ext = entry.get("ext")
         name = entry.get("name")
@@ -242,46 +316,81 @@ def _pick_subtitles(info: ExtractedInfo, auto: bool = False) -> list[SubtitleLin
             continue
 
         if isinstance(sub_url, str) and ext in ("vtt", "srt"):
-            try:
-                r = requests.get(sub_url, timeout=15)
-                if r.status_code == 200:
-                    text = r.text
-                    if ext == "vtt":
-                        if not auto: print("\nFound subtitles!")
-                        # print(f"\nFound {'auto' if auto else 'manual'} subtitles!")
-                        return _vtt_to_synced(text)
-                    elif ext == "srt":
-                        if not auto: print("\nFound subtitles!")
-                        # print(f"\nFound {'auto' if auto else 'manual'} subtitles!")
-                        return _srt_to_synced(text)
-            except Exception as e:
-                logger.error(
-                    f"[Sub Fetch] Failed to fetch {'automatic' if auto else 'manual'} subtitles: {e}"
-                )
-                return []
-    return []
+            return {"lang": lang, "ext": ext, "url": sub_url}
+    return None
 
 
 
-
-def safe_extract_info(id_or_url: str, proxy: str | None = None) -> tuple[Literal[0,1,2,3], VideoInfo]:
+def _fetch_subtitle_track(track: SubtitleTrack, auto: bool) -> list[SubtitleLine] | None:
     """
-    Fetches and returns the video info for a YouTube id or URL.
-    Returns a tuple of (state, data):
-      0 -> success
-      1 -> no data returned (null)
-      2 -> private video
-      3 -> unavailable video (blocked / bot-check (requires cookies or VPN/proxy))
+    Fetch and parse a subtitle track.
+    Returns the list of (start, end, text) for synced lyrics, None if the track couldn't be fetched
+    """
+    try:
+        r = requests.get(track["url"], timeout=15)
+    except Exception as e:
+        logger.error(f"[Sub Fetch] Failed to fetch {'automatic' if auto else 'manual'} subtitles: {e}")
+        return None
+
+    if r.status_code != 200:
+        logger.warning(f"[Sub Fetch] Failed to fetch {'automatic' if auto else 'manual'} subtitles: HTTP {r.status_code}")
+        return None
 
+    logger.debug(f"[Sub Fetch] Got {'automatic' if auto else 'manual'} subtitles ({track['lang']}, {track['ext']})")
+    return _vtt_to_synced(r.text) if track["ext"] == "vtt" else _srt_to_synced(r.text)
+
+
+
+
+# Stored for a track fetched without any line, so it isn't fetched again on every run
+NO_SUBTITLES: str = "[]"
+
+
+
+
+def load_subtitles(video_id: str, auto: bool, cur: Cursor, conn: Connection) -> str | None:
+    """
+    Subtitles of a video (JSON list of (start, end, text)), fetched from the track found
+    at extraction the first time they are needed, then kept in the database.
+    Returns None if the video has no such track, it is empty or it couldn't be fetched.
     """
+    text_key: Literal["subtitles", "auto_subs"] = "auto_subs" if auto else "subtitles"
+    track_key: Literal["subtitles_track", "auto_subs_track"] = "auto_subs_track" if auto else "subtitles_track"
 
-    if "youtube.com/watch?v=" in id_or_url:
-        url = id_or_url
-        video_id = id_or_url.replace("https://youtube.com/watch?v=", "")
-    else:
-        url = f"https://youtube.com/watch?v={id_or_url}"
-        video_id = id_or_url
+    data: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur, with_texts=True)
+    stored: str | None = data.get(text_key)
+    if stored:
+        return stored if stored != NO_SUBTITLES else None
+
+    track: str | None = data.get(track_key)
+    if not track:
+        return None
+
+    lines: list[SubtitleLine] | None = _fetch_subtitle_track(track=cast(SubtitleTrack, json.loads(track)), auto=auto)
+    if lines is None:
+        # The track urls expire, get new ones once
+        logger.debug(f"[Sub Fetch] Refreshing the subtitle tracks of '{video_id}'")
+        state, fresh = safe_extract_info(id_or_url=video_id)
+        fresh_track: str | None = fresh.get(track_key)
+        if state == 0 and fresh_track:
+            update_video_db(video_id=video_id, update_fields={key: fresh[key] for key in ("subtitles_track", "auto_subs_track") if key in fresh}, cur=cur, conn=conn)
+            lines = _fetch_subtitle_track(track=cast(SubtitleTrack, json.loads(fresh_track)), auto=auto)
+
+    if lines is None:
+        return None
+    if not lines:
+        update_video_db(video_id=video_id, update_fields={text_key: NO_SUBTITLES}, cur=cur, conn=conn)
+        return None
 
+    subtitles: str = json.dumps(lines, ensure_ascii=False)
+    update_video_db(video_id=video_id, update_fields={text_key: subtitles}, cur=cur, conn=conn)
+    return subtitles
+
+
+
+
+def _build_fetch_opts(proxy: str | None = None) -> Ydl_opt:
+    """yt-dlp options to extract the info and subtitles of a video without downloading it"""
     ydl_fetch_opt: Ydl_opt = {
         "quiet": True,
         "no_warnings": True,
@@ -298,9 +407,69 @@ def safe_extract_info(id_or_url: str, proxy: str | None = None) -> tuple[Literal
 
     if proxy:
         ydl_fetch_opt["proxy"] = proxy
+    return ydl_fetch_opt
+
+
+
+
+def configure_download_pools(download_workers: int, prefetch_workers: int) -> None:
+    """
+    Create the YoutubeDL pools of the run: `download_workers` instances for downloads
+    and `prefetch_workers` for info extraction, which is also the limit of each running at once.
+    """
+    global _download_pool, _extract_pool
+    close_download_pools()
+    _download_pool = YoutubeDLPool(size=download_workers, params=lambda: _build_ydl_opts(loc=Path(".")))
+    _extract_pool = YoutubeDLPool(size=prefetch_workers, params=_build_fetch_opts)
+    logger.debug(f"[Download] Pools of {download_workers} download and {prefetch_workers} extraction YoutubeDL instances ready")
+
+
+
+
+def close_download_pools() -> None:
+    """Close the YoutubeDL instances of the run"""
+    global _download_pool, _extract_pool
+    for pool in (_download_pool, _extract_pool):
+        if pool is not None:
+            pool.close()
+    _download_pool, _extract_pool = None, None
+
+
+
+
+@contextmanager
+def _borrow_extractor(proxy: str | None) -> Iterator[yt_dlp.YoutubeDL]:
+    """A pooled YoutubeDL for info extraction, or a new one for a proxy or without pools"""
+    if _extract_pool is None or proxy:
+        with yt_dlp.YoutubeDL(params=_build_fetch_opts(proxy=proxy)) as ydl:  # pyright: ignore[reportArgumentType]
+            yield ydl
+    else:
+        with _extract_pool.borrow() as ydl:
+            yield ydl
+
+
+
+
+def safe_extract_info(id_or_url: str, proxy: str | None = None) -> tuple[Literal[0,1,2,3], VideoInfo]:
+    """
+    Fetches and returns the video info for a YouTube id or URL.
+    Returns a tuple of (state, data):
+      0 -> success
+      1 -> no data returned (null)
+      2 -> private video
+      3 -> unavailable video (blocked / bot-check (requires cookies or VPN/proxy))
+
+    """
+
+    if "youtube.com/watch?v=" in id_or_url:
+        url = id_or_url
+        video_id = id_or_url.replace("https://youtube.com/watch?v=", "")
+    else:
+        url = f"https://youtube.com/watch?v={id_or_url}"
+        video_id = id_or_url
 
     try:
-        with yt_dlp.YoutubeDL(params=ydl_fetch_opt) as ydl:  # pyright: ignore[reportArgumentType]
+        with _borrow_extractor(proxy=proxy) as ydl:
             info: ExtractedInfo = cast(ExtractedInfo, cast(object, ydl.extract_info(url=url, download=False)))
 
             if not info:
@@ -312,9 +481,9 @@ def safe_extract_info(id_or_url: str, proxy: str | None = None) -> tuple[Literal
                     logger.error(f"[Safe Extract] Data is None for {video_id}, unknown reason")
                 return 1, {}
 
-            # subtitles
-            manual_subs: list[SubtitleLine] = _pick_subtitles(info=info, auto=False)
-            auto_subs: list[SubtitleLine] = _pick_subtitles(info=info, auto=True)
+            # subtitles, only their tracks: load_subtitles fetches them if the lyrics need them
+            manual_track: SubtitleTrack | None = _pick_subtitle_track(info=info, auto=False)
+            auto_track: SubtitleTrack | None = _pick_subtitle_track(info=info, auto=True)
 
             data: VideoInfo = {
                 "video_id": safe_str(info.get("id")),
@@ -334,12 +503,12 @@ def safe_extract_info(id_or_url: str, proxy: str | None = None) -> tuple[Literal
                 "duration": safe_int(info.get("duration")),
                 "duration_string": safe_str(info.get("duration_string")),
             }
-            if manual_subs:
-                logger.debug("[Safe Extract] Got manual subs")
-                data["subtitles"] = json.dumps(manual_subs, ensure_ascii=False)
-            if auto_subs:
-                logger.debug("[Safe Extract] Got auto subs")
-                data["auto_subs"] = json.dumps(auto_subs, ensure_ascii=False)
+            if manual_track:
+                logger.debug("[Safe Extract] Got manual subs track")
+                data["subtitles_track"] = json.dumps(manual_track, ensure_ascii=False)
+            if auto_track:
+                logger.debug("[Safe Extract] Got auto subs track")
+                data["auto_subs_track"] = json.dumps(auto_track, ensure_ascii=False)
 
             logger.debug(f"[Safe Extract] Data correctly returned for {video_id} -> '{data['title']}'")
             return 0, data
@@ -370,16 +539,19 @@ def download_yt_dlp(
     video_id: str,
     title: str,
     uploader: str,
+    segments: list[tuple[float, float]] | None = None,
     max_retries: int = 3,
     retry_delay: int = 5
-) -> tuple[bool, str, str | None]:
+) -> tuple[bool, str, str | None, bool]:
     """
     Download YouTube video as mp3 with retries and detailed error handling.
+    The `segments` are cut by the mp3 transcode itself.
 
     Returns:
         success (bool)
         message (str)
         final filename (str)
+        segments cut (bool), False if the transcode didn't run
     """
     url: str = f"https://youtube.com/watch?v={video_id}"
     loc.mkdir(parents=True, exist_ok=True)
@@ -388,45 +560,134 @@ def download_yt_dlp(
     # To ensure the files will have a name, due to the strict sanitize
     if not base: base = "sanitized_name"
 
-    final_filename: str = _get_unique_filename(loc=loc, base=base, ext=".mp3", video_id=video_id)
+    with _reserved_filenames_lock:
+        final_filename: str = _get_unique_filename(loc=loc, base=base, ext=".mp3", video_id=video_id)
+        _reserved_filenames.add(final_filename)
     final_filename_with_ext: str = final_filename + ".mp3"
     ydl_opts: Ydl_opt = _build_ydl_opts(loc=loc, filename=final_filename, format_str="bestaudio/best")
+    outtmpl: str = ydl_opts.get("outtmpl", {})["default"]
+    # Output options of the FFmpegExtractAudio transcode. An mp3 source would be copied instead,
+    # which can't be filtered: the encoder is given again, the last one given wins
+    ydl_opts["postprocessor_args"] = {
+        "extractaudio+ffmpeg_o": ["-af", segments_audio_filter(segments), "-acodec", "libmp3lame", "-b:a", f"{MP3_BITRATE}k"]
+    } if segments else {}
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            logger.debug(f"[Download] Attempt {attempt} for video {video_id}")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # pyright: ignore[reportArgumentType]
-                ydl.download([url])
-            # Check file after download - optional: add call to your repair_mp3_file here
-            final_path = loc / final_filename_with_ext
-            if not final_path.exists():
-                raise FileNotFoundError(f"Expected file '{final_path}' not exists after download")
-
-            logger.info(f"[Download] Finished successfully: '{final_filename_with_ext}' from '{uploader}'")
-            return True, "", final_filename_with_ext
-
-        except (HTTPError, DownloadError, ExtractorError, UnavailableVideoError) as e:
-            logger.warning(f"[Download] Download error on attempt {attempt}: {e}")
-            if attempt < max_retries:
-                logger.debug(f"[Download] Retrying in {retry_delay} seconds")
-                time.sleep(retry_delay)
-            else:
-                return False, f"Download failed after {max_retries} attempts: {e}", None
-
-        except FileNotFoundError as e:
-            logger.error(f"[Download] File after download missing: {e}")
-            return False, str(e), None
-
-        except Exception as e:
-            logger.error(f"[Download] Unexpected error on attempt {attempt}: {e}")
-            logger.debug("Exception details:", exc_info=True)
-            if attempt < max_retries:
-                logger.debug(f"[Download] Retrying in {retry_delay} seconds")
-                time.sleep(retry_delay)
-            else:
-                return False, f"Unexpected error after {max_retries} attempts: {e}", None
+    try:
+        for attempt in range(1, max_retries + 1):
+            try:
+                logger.debug(f"[Download] Attempt {attempt} for video {video_id}")
+                _postprocessing.extracted = False
+                if _download_pool is not None:
+                    # Same options for every download, only the output path changes
+                    with _download_pool.borrow() as ydl:
+                        ydl.params["outtmpl"]["default"] = outtmpl
+                        ydl.params["postprocessor_args"] = ydl_opts["postprocessor_args"]
+                        _ = ydl.download([url])
+                else:
+                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # pyright: ignore[reportArgumentType]
+                        _ = ydl.download([url])
+                # Check file after download - optional: add call to your repair_mp3_file here
+                final_path = loc / final_filename_with_ext
+                if not final_path.exists():
+                    raise FileNotFoundError(f"Expected file '{final_path}' not exists after download")
+
+                logger.info(f"[Download] Finished successfully: '{final_filename_with_ext}' from '{uploader}'")
+                # The transcode ran with the filter: ExtractAudio always converts to the new .mp3 path
+                cut: bool = bool(segments) and getattr(_postprocessing, "extracted", False)
+                return True, "", final_filename_with_ext, cut
+
+            except (HTTPError, DownloadError, ExtractorError, UnavailableVideoError) as e:
+                logger.warning(f"[Download] Download error on attempt {attempt}: {e}")
+                if attempt < max_retries:
+                    logger.debug(f"[Download] Retrying in {retry_delay} seconds")
+                    time.sleep(retry_delay)
+                else:
+                    return False, f"Download failed after {max_retries} attempts: {e}", None, False
+
+            except FileNotFoundError as e:
+                logger.error(f"[Download] File after download missing: {e}")
+                return False, str(e), None, False
+
+            except Exception as e:
+                logger.error(f"[Download] Unexpected error on attempt {attempt}: {e}")
+                logger.debug("Exception details:", exc_info=True)
+                if attempt < max_retries:
+                    logger.debug(f"[Download] Retrying in {retry_delay} seconds")
+                    time.sleep(retry_delay)
+                else:
+                    return False, f"Unexpected error after {max_retries} attempts: {e}", None, False
+
+        return False, "Download failed after retries", None, False
 
-    return False, "Download failed after retries", None
+    finally:
+        with _reserved_filenames_lock:
+            _reserved_filenames.discard(final_filename)
+
+
+
+
+
+
+
+def prefetch_video_info(
+    download_path: Path,
+    video_id: str,
+    retry_unavailable: bool,
+    retry_private: bool,
+    progress_prefix: str,
+    info: bool,
+    cur: Cursor,
+    conn: Connection
+) -> bool:
+    """
+    Fetch and store the infos of a video about to be downloaded, ahead of its download,
+    so that download_video finds them in the database.
+    Returns False if the video turned out unavailable or private (marked so), True otherwise.
+    """
+    data: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur)
+    state: Literal[0,1,2,3] = data.get("status", 0)
+
+    # Skipped by download_video anyway
+    if (state == 1 and not retry_unavailable) or (state == 2 and not retry_private):
+        return True
+
+    filename: str | None = data.get("filename")
+    if filename and (download_path / filename).exists():
+        return True
+
+    if all(data.get(key) for key in youtube_required_info):
+        return True
+
+    logger.info(f"[Prefetch] Fetching infos for '{video_id}'")
+    state, fetched = safe_extract_info(id_or_url=video_id)
+
+    if state == 0:
+        update_video_db(video_id=video_id, update_fields=fetched, cur=cur, conn=conn)
+        logger.debug(f"[Prefetch] Stored the infos of '{video_id}' -> '{fetched.get('title')}'")
+        return True
+
+    update_video_db(video_id=video_id, update_fields={"status": 2 if state == 2 else 1}, cur=cur, conn=conn)
+    if info: fprint(progress_prefix, f"Failed to fetch infos for '{video_id}', skipping")
+    logger.info(f"[Prefetch] Failed to fetch infos for '{video_id}', marked as {'private' if state == 2 else 'unavailable'}")
+    return False
+
+
+
+
+
+
+
+def _applied_cut_fields(filename: str, segments: list[tuple[float, float]], cut: bool) -> VideoInfo:
+    """
+    SponsorBlock fields of a file downloaded with these segments, `cut` telling whether the
+    transcode ran with them. Empty if it didn't, the sponsorblock stage then cuts the file.
+    """
+    if not segments:
+        return {"removed_segments_int": -1, "removed_segments_duration": -1.0}
+    if not cut:
+        logger.warning(f"[Download] Segments not cut while downloading '{filename}', left to the sponsorblock stage")
+        return {}
+    return {"skips": segments, "removed_segments_int": len(segments), "removed_segments_duration": removed_duration(segments)}
 
 
 
@@ -441,10 +702,16 @@ def download_video(
     retry_private: bool,
     progress_prefix: str,
     info: bool,
+    integrity_mode: Literal["verify", "repair"],
     cur: Cursor,
     conn: Connection,
-    test_run: bool
+    test_run: bool,
+    segments: list[tuple[float, float]] | None = None
 ) -> float:
+    """
+    Fetch the infos of a video if the database lacks some, download it and store the result.
+    The SponsorBlock `segments`, when known before, are cut during the download.
+    """
 
     Download_start_time: float = time.time()
 
@@ -456,7 +723,7 @@ def download_video(
 
     # Extracts youtube video's infos if the already present isn't enough
 
-    data: VideoInfo = get_video_info_from_db(video_id=video_id,cur=cur)
+    data: VideoInfo = get_video_info_from_db(video_id=video_id,cur=cur).copy() # Modified below before being written
     state: Literal[0,1,2,3] = data.get("status",0)
 
     if state == 1 and not retry_unavailable:
@@ -470,10 +737,11 @@ def download_video(
         return time.time() - Download_start_time
     
 
-    if not all(key in youtube_required_info and value for key, value in data.items()):
+    if not all(data.get(key) for key in youtube_required_info):
         state, data = safe_extract_info(id_or_url=video_id)
     else:
         logger.debug("[Extract] Enough data in db, no need to fetch yt_dlp")
+        state = 0
 
     if state == 0: # Data ok, can proceed to download
 
@@ -489,12 +757,12 @@ def download_video(
 
         if info: fprint(progress_prefix,f"Downloading ?", title)
 
-
-        download_success, message, final_filename = download_yt_dlp(
+        download_success, message, final_filename, cut = download_yt_dlp(
             loc=download_path,
             video_id=video_id,
             title=title,
-            uploader=uploader
+            uploader=uploader,
+            segments=segments
         )
 
         if download_success and final_filename:
@@ -502,14 +770,20 @@ def download_video(
             filepath: Path = Path(download_path / filename)
 
             logger.debug(f"[Download] Download finished, checking file intergity: '{filename}'")
-            if repair_mp3_file(filepath=filepath, test_run=test_run): # Newly downloaded file is readable and clean
+            if check_mp3_integrity(filepath=filepath, verified_at=None, integrity_mode=integrity_mode, test_run=test_run) != 2: # Newly downloaded file is readable and clean
 
                 # Update metadata
                 data["filename"] = final_filename
                 data["status"] = 0
+                data["verified_at"] = time.time()
+                data["metadata_digest"] = "" # New file, nothing embedded yet
+                cut_fields: VideoInfo = _applied_cut_fields(filename=final_filename, segments=segments, cut=cut) if segments is not None else {}
+                data.update(cut_fields)
                 if info: fprint(progress_prefix, f"Downloaded ?", title)
                 logger.debug(f"[Download] Sucessfully downloaded '{title}")
-                update_video_db(video_id=video_id, update_fields=data, cur=cur, conn=conn)
+                # Cutting the file again would remove audio, the cut must not be lost
+                update_video_db(video_id=video_id, update_fields=data, cur=cur, conn=conn, flush=bool(cut_fields))
+                index_file(video_id=video_id, filename=final_filename, cur=cur)
 
             else:
                 if info: fprint(progress_prefix," Downloaded file is corrupted, skipping rest of processing")
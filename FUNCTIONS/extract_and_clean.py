@@ -1,9 +1,14 @@
 import os
+import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from sqlite3 import Connection, Cursor
+from typing import Literal, TypeAlias
 
 
 from FUNCTIONS.metadata import get_metadata_tag
-from FUNCTIONS.HELPERS.helpers import VideoInfoMap
+from FUNCTIONS.sql_requests import ScanCacheEntry, get_scan_cache, update_scan_cache
+from FUNCTIONS.HELPERS.helpers import VideoInfo, VideoInfoMap
 from FUNCTIONS.HELPERS.fprint import fprint
 
 from FUNCTIONS.HELPERS.logger import setup_logger
@@ -12,6 +17,52 @@ logger = setup_logger(__name__)
 
 
 
+# Files sent to a worker process at once by the parallel scan
+SCAN_CHUNK_SIZE: int = 64
+
+# Parsed result sent back by a worker: filename, state, minified metadata JSON
+ParsedFile: TypeAlias = tuple[str, Literal[0, 1, 2, 3], str | None]
+
+
+
+
+def _dump_metadata(data: VideoInfo | None) -> str | None:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) if data is not None else None
+
+
+
+
+def _parse_chunk(filepaths: list[str]) -> list[ParsedFile]:
+    """Read the metadata tag of each file, run in a worker process of the parallel scan"""
+    parsed: list[ParsedFile] = []
+    for filepath in filepaths:
+        data, state = get_metadata_tag(Path(filepath))
+        parsed.append((Path(filepath).name, state, _dump_metadata(data)))
+    return parsed
+
+
+
+
+def _parse_in_pool(filepaths: list[Path], scan_workers: int) -> dict[str, ParsedFile]:
+    """
+    Parse the files in chunks over `scan_workers` processes.
+    Only compact results come back: nothing is removed by the workers.
+    """
+    chunks: list[list[str]] = [
+        [str(filepath) for filepath in filepaths[i:i + SCAN_CHUNK_SIZE]]
+        for i in range(0, len(filepaths), SCAN_CHUNK_SIZE)
+    ]
+    parsed: dict[str, ParsedFile] = {}
+    with ProcessPoolExecutor(max_workers=min(scan_workers, len(chunks))) as executor:
+        for chunk_result in executor.map(_parse_chunk, chunks):
+            for parsed_file in chunk_result:
+                parsed[parsed_file[0]] = parsed_file
+    logger.info(f"[Clean & Extract] Parsed {len(parsed)} MP3s in {len(chunks)} chunks over {min(scan_workers, len(chunks))} processes")
+    return parsed
+
+
+
+
 
 
 def extract_and_clean_video_ids(
@@ -19,12 +70,20 @@ def extract_and_clean_video_ids(
     info: bool,
     test_run: bool,
     remove: bool,
-    force_mp3_presence: bool
+    force_mp3_presence: bool,
+    scan_workers: int,
+    cur: Cursor,
+    conn: Connection
 ) -> VideoInfoMap:
     """
     Cleans the directory by removing non-MP3 or invalid files,
     and returns a mapping of valid video IDs to metadata.
 
+    The result of parsing each MP3 is kept in the scan_cache table, keyed by
+    (filename, size, mtime_ns, inode): only new or modified files are parsed again.
+    With `scan_workers` > 1 and more than one chunk of files to parse (cold cache),
+    the parsing is spread over a process pool; removals are still done here.
+
     Returns:
         VideoInfoMap: dict of video_id -> metadata (with filename added)
     """
@@ -32,24 +91,50 @@ def extract_and_clean_video_ids(
     valid_files: VideoInfoMap = {}
     checked_files: int = 0
     lrc_or_png: int = 0
+    parsed_files: int = 0
 
     if not download_directory.exists():
         if info: print(f"[Clean & Extract] Directory does not exist: {download_directory}")
         logger.warning(f"[Clean & Extract] Directory does not exist: {download_directory}")
         return valid_files
 
-    for filename in os.listdir(str(download_directory)):
+    scan_cache: dict[str, ScanCacheEntry] = get_scan_cache(cur=cur)
+    to_save: dict[str, ScanCacheEntry] = {}
+
+    with os.scandir(download_directory) as it:
+        entries: list[os.DirEntry[str]] = list(it)
+    filenames: set[str] = {entry.name for entry in entries}
+
+    # Stat every MP3 once and find those the cache can't answer for
+    stats: dict[str, os.stat_result] = {}
+    stale: list[Path] = []
+    for entry in entries:
+        if entry.name.lower().endswith(".mp3") and entry.is_file():
+            st: os.stat_result = entry.stat()
+            stats[entry.name] = st
+            cached: ScanCacheEntry | None = scan_cache.get(entry.name)
+            if cached is None or cached[:3] != (st.st_size, st.st_mtime_ns, st.st_ino):
+                stale.append(download_directory / entry.name)
+
+    parsed: dict[str, ParsedFile] = {}
+    if scan_workers > 1 and len(stale) > SCAN_CHUNK_SIZE:
+        if info: fprint("[Clean & Extract] ", f"Parsing {len(stale)} new or modified MP3s over {scan_workers} processes")
+        parsed = _parse_in_pool(filepaths=stale, scan_workers=scan_workers)
+    stale_names: set[str] = {filepath.name for filepath in stale}
+
+    for entry in entries:
+        filename: str = entry.name
         filepath = download_directory / filename
         checked_files += 1
 
-        if not filepath.is_file():
+        if not entry.is_file():
             logger.warning(f"[Clean & Extract] Not a file, skipping : '{filepath}'")
             continue  # Skip directories or symlinks
 
         # Case 1: Not an MP3 (but keep .lrc and .png files)
         if not filename.lower().endswith(".mp3"):
             if filename.lower().endswith((".lrc", ".png")):
-                if not force_mp3_presence or filepath.with_suffix(".mp3").exists(): # If no mp3 associated file:
+                if not force_mp3_presence or filepath.with_suffix(".mp3").name in filenames: # If no mp3 associated file:
                     logger.verbose(f"[Clean & Extract] Keeping '{filename}' (.lrc or .png)")
                     lrc_or_png += 1
                     continue
@@ -59,8 +144,23 @@ def extract_and_clean_video_ids(
             logger.warning(f"[Clean & Extract] Removed '{filename}': Not an MP3")
             continue
 
-        # Case 2: MP3 file — check metadata
-        data, state = get_metadata_tag(filepath)
+        # Case 2: MP3 file — check metadata, from the cache if the file didn't change
+        st = stats[filename]
+        state: Literal[0, 1, 2, 3]
+        data: VideoInfo | None
+        if filename in parsed:
+            _, state, dumped = parsed[filename]
+            data = json.loads(dumped) if dumped else None
+            parsed_files += 1
+            to_save[filename] = (st.st_size, st.st_mtime_ns, st.st_ino, state, dumped)
+        elif filename not in stale_names:
+            state, dumped = scan_cache[filename][3:]
+            data = json.loads(dumped) if dumped else None
+        else:
+            data, state = get_metadata_tag(filepath)
+            parsed_files += 1
+            to_save[filename] = (st.st_size, st.st_mtime_ns, st.st_ino, state, _dump_metadata(data))
+
         if state == 0 and data is not None:
 
             video_id = data.get("video_id")
@@ -70,9 +170,8 @@ def extract_and_clean_video_ids(
                 data["video_id"] = video_id
 
             if video_id:
-                filename = data.get("filename")
                 valid_files[video_id] = data
-                logger.verbose(f"[Clean & Extract] Valid MP3: '{filename}' with ID '{video_id}'")
+                logger.verbose(f"[Clean & Extract] Valid MP3: '{data.get('filename')}' with ID '{video_id}'")
             else:
                 removed_files[filename] = "Missing video ID in metadata"
                 if not test_run and remove: os.remove(filepath)
@@ -93,6 +192,14 @@ def extract_and_clean_video_ids(
         if info:
             fprint("[Clean & Extract] ",f"Checked {checked_files} files, removed {len(removed_files)}, kept {len(valid_files)} valid MP3s, {lrc_or_png} valid lyrics or thumbnail")
 
+
+    # Forget the files that are gone or were just removed
+    still_present: set[str] = filenames if test_run or not remove else filenames - set(removed_files)
+    to_forget: set[str] = set(scan_cache) - still_present
+    to_save = {filename: entry for filename, entry in to_save.items() if filename in still_present}
+    update_scan_cache(to_save=to_save, to_remove=to_forget, cur=cur, conn=conn)
+
+    logger.info(f"[Clean & Extract] Parsed {parsed_files} new or modified MP3s, {checked_files - parsed_files} from cache or not MP3s")
     logger.info(f"[Clean & Extract] Checked {checked_files} files, removed {len(removed_files)}, kept {len(valid_files)} valid MP3s, {lrc_or_png} valid lyrics or thumbnail")
 
     if info:
@@ -0,0 +1,112 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+
+
+from CONSTANTS import MAX_LYRICS_RETRIES, PATTERN_DIR, TAGS_DIR
+from FUNCTIONS.HELPERS.helpers import VideoInfo, lyrics_lrc_path_for_mp3, thumbnail_png_path_for_mp3
+from FUNCTIONS.sql_requests import VIDEO_TEXT_COLUMNS
+
+from FUNCTIONS.HELPERS.logger import setup_logger
+logger = setup_logger(__name__)
+
+
+
+
+# Keys that change on every write without the video itself changing, and the large texts:
+# they are only loaded by the stages using them, and only changed by stages, which store a new fingerprint afterwards
+FINGERPRINT_IGNORED_KEYS: set[str] = {"fingerprint", "verified_at", "metadata_digest", "date_modified", *VIDEO_TEXT_COLUMNS}
+
+
+
+
+def _stat_signature(path: Path) -> list[int] | None:
+    """Return (size, mtime_ns, inode) of a file, or None if it doesn't exist"""
+    try:
+        st: os.stat_result = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+
+
+def compute_config_digest(flags: dict[str, object]) -> str:
+    """
+    Digest of the processing options that change what the stages produce,
+    plus the pattern and tag files used to compute tags and albums.
+    Computed once per run.
+    """
+    pattern_files: dict[str, list[int] | None] = {}
+    for directory in (PATTERN_DIR, TAGS_DIR):
+        if directory.is_dir():
+            for file in sorted(directory.glob("*.txt")):
+                pattern_files[str(file)] = _stat_signature(file)
+
+    payload: str = json.dumps({"flags": flags, "patterns": pattern_files}, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+
+
+def compute_video_fingerprint(data: VideoInfo, filepath: Path, config_digest: str) -> str | None:
+    """
+    Fingerprint of everything the stages look at for one video:
+    its DB row, its mp3 / .lrc / .png files and the config digest.
+    Returns None if the mp3 doesn't exist.
+    """
+    file_signature: list[int] | None = _stat_signature(filepath)
+    if file_signature is None:
+        return None
+
+    row: dict[str, object] = {key: value for key, value in data.items() if key not in FINGERPRINT_IGNORED_KEYS}
+    if "skips" in data:
+        row["skips"] = [[start, end] for start, end in data["skips"]]
+    if "tags" in data:
+        row["tags"] = sorted(data["tags"])
+
+    payload: str = json.dumps(
+        {
+            "row": row,
+            "mp3": file_signature,
+            "lrc": _stat_signature(lyrics_lrc_path_for_mp3(filepath)),
+            "png": _stat_signature(thumbnail_png_path_for_mp3(filepath)),
+            "config": config_digest,
+        },
+        sort_keys=True,
+        default=str
+    )
+    fingerprint: str = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    logger.verbose(f"[Fingerprint] Computed '{fingerprint}' for '{filepath.name}'")
+    return fingerprint
+
+
+
+
+def has_pending_work(data: VideoInfo, filepath: Path, use_sponsorblock: bool, get_lyrics: bool, get_thumbnail: bool) -> bool:
+    """
+    True if the stages still have something to retry or apply for this video on
+    the next run, in which case it must not be skipped even if nothing changed.
+    """
+    if data.get("status", 3) != 0:
+        return True
+
+    if data.get("recompute_yt_info") or data.get("remove_lyrics") or data.get("update_thumbnail") or data.get("remove_thumbnail"):
+        return True
+
+    if use_sponsorblock:
+        removed_segments_int: int = data.get("removed_segments_int", 0)
+        removed_segments_duration: float = data.get("removed_segments_duration", 0.0)
+        processed: bool = (removed_segments_int == -1 and removed_segments_duration == -1.0) or (removed_segments_int > 0 and removed_segments_duration > 0.0)
+        if not processed:
+            return True
+
+    if get_lyrics and data.get("try_lyrics_if_not") and data.get("lyrics_retries", 0) <= MAX_LYRICS_RETRIES:
+        if not lyrics_lrc_path_for_mp3(filepath).exists():
+            return True
+
+    if get_thumbnail and data.get("thumbnail_url") and not thumbnail_png_path_for_mp3(filepath).exists():
+        return True
+
+    return False
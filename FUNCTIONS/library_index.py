@@ -0,0 +1,97 @@
+from sqlite3 import Connection, Cursor
+from typing import TypedDict
+
+
+from FUNCTIONS.sql_requests import DB_LOCK, commit_db
+from FUNCTIONS.HELPERS.helpers import VideoInfoMap
+
+from FUNCTIONS.HELPERS.logger import setup_logger
+logger = setup_logger(__name__)
+
+
+
+
+class LibraryStats(TypedDict):
+    total_in_db: int
+    downloaded_in_db: int
+    in_dir: int
+    not_in_dir: list[str]
+    not_in_list: list[str]
+
+
+
+
+def init_library_index(ids_present_in_down_dir: VideoInfoMap, cur: Cursor, conn: Connection) -> None:
+    """
+    Seed the library index (video_id -> filename of the files in the download directory)
+    from the initial directory scan.
+    It is a TEMP table, living in memory for the connection's lifetime only, so the
+    final stats can be computed in SQL against the videos table without a rescan.
+    """
+    with DB_LOCK:
+        _ = cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS library_files (
+            video_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL
+        )
+        """)
+        _ = cur.execute("DELETE FROM library_files")
+        _ = cur.executemany(
+            "INSERT OR REPLACE INTO library_files (video_id, filename) VALUES (?, ?)",
+            [(video_id, data.get("filename", "")) for video_id, data in ids_present_in_down_dir.items()]
+        )
+        commit_db(conn=conn)
+    logger.debug(f"[Library Index] Indexed {len(ids_present_in_down_dir)} files from the directory scan")
+
+
+
+
+def index_file(video_id: str, filename: str, cur: Cursor) -> None:
+    """Record that the file of a video is (now) in the download directory"""
+    with DB_LOCK:
+        _ = cur.execute("INSERT OR REPLACE INTO library_files (video_id, filename) VALUES (?, ?)", (video_id, filename))
+    logger.verbose(f"[Library Index] Indexed '{filename}' for '{video_id}'")
+
+
+
+
+def unindex_file(video_id: str, cur: Cursor) -> None:
+    """Record that the file of a video is no longer in the download directory"""
+    with DB_LOCK:
+        _ = cur.execute("DELETE FROM library_files WHERE video_id = ?", (video_id,))
+    logger.verbose(f"[Library Index] Removed '{video_id}' from the index")
+
+
+
+
+def unindex_files(video_ids: set[str], cur: Cursor) -> None:
+    """Record that the files of these videos are no longer in the download directory"""
+    with DB_LOCK:
+        _ = cur.executemany("DELETE FROM library_files WHERE video_id = ?", [(video_id,) for video_id in video_ids])
+    logger.verbose(f"[Library Index] Removed {len(video_ids)} videos from the index")
+
+
+
+
+def get_library_stats(cur: Cursor) -> LibraryStats:
+    """Compare the index with the downloaded videos of the database, with set differences done in SQL"""
+    with DB_LOCK:
+        _ = cur.execute("SELECT COUNT(*), COALESCE(SUM(status = 0), 0) FROM videos")
+        total_in_db, downloaded_in_db = cur.fetchone()  # pyright: ignore[reportAny]
+
+        _ = cur.execute("SELECT COUNT(*) FROM library_files")
+        in_dir: int = cur.fetchone()[0]  # pyright: ignore[reportAny]
+
+        _ = cur.execute("SELECT video_id FROM videos WHERE status = 0 EXCEPT SELECT video_id FROM library_files")
+        not_in_dir: list[str] = [row[0] for row in cur.fetchall()]  # pyright: ignore[reportAny]
+
+        _ = cur.execute("SELECT video_id FROM library_files EXCEPT SELECT video_id FROM videos WHERE status = 0")
+        not_in_list: list[str] = [row[0] for row in cur.fetchall()]  # pyright: ignore[reportAny]
+
+    return {
+        "total_in_db": total_in_db,
+        "downloaded_in_db": downloaded_in_db,
+        "in_dir": in_dir,
+        "not_in_dir": not_in_dir,
+        "not_in_list": not_in_list,
+    }
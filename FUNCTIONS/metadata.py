@@ -1,13 +1,22 @@
 from pathlib import Path
 from typing import Literal
+import base64
+import hashlib
 import json
+import os
+import threading
+import zlib
 
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, Frames  # pyright: ignore[reportUnknownVariableType]
 from mutagen.id3._frames import TXXX
 from mutagen._util import MutagenError
+from mutagen._tags import PaddingInfo
+
+from CONSTANTS import ID3_PADDING
 
 from FUNCTIONS.HELPERS.helpers import VideoInfo
+from FUNCTIONS.mp3_frames import FrameHeader, find_frame, id3v2_size
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
@@ -17,7 +26,165 @@ logger = setup_logger(__name__)
 
 
 
-def get_metadata_tag(filepath: Path, tag: str = 'metadata') -> tuple[VideoInfo | None, Literal[0,1,2,3]]:
+# Format markers of the TXXX:metadata payload. Payloads without a marker are
+# the original indented JSON (version 1), still read for existing libraries.
+METADATA_MARKER_JSON: str = "v2:"  # minified JSON
+METADATA_MARKER_ZLIB: str = "v2z:" # base64 of the zlib-compressed minified JSON
+
+# Fields that can be fetched again from YouTube (force_recompute_yt_info),
+# left out of the payload with metadata_exclude_rebuildable
+REBUILDABLE_METADATA_KEYS: list[str] = ["description", "subtitles", "auto_subs", "subtitles_track", "auto_subs_track", "lyrics", "syncedlyrics"]
+
+
+
+
+def encode_metadata_payload(data: VideoInfo, metadata_format: Literal["json", "zlib"]) -> str:
+    """Encode video info into the text of the TXXX:metadata frame, with its format marker"""
+    minified: str = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if metadata_format == "zlib":
+        return METADATA_MARKER_ZLIB + base64.b64encode(zlib.compress(minified.encode("utf-8"), 9)).decode("ascii")
+    return METADATA_MARKER_JSON + minified
+
+
+
+
+def decode_metadata_payload(text: str) -> VideoInfo:
+    """Decode the text of a TXXX:metadata frame, in any of its formats. Raises ValueError if malformed"""
+    try:
+        if text.startswith(METADATA_MARKER_ZLIB):
+            return json.loads(zlib.decompress(base64.b64decode(text[len(METADATA_MARKER_ZLIB):])).decode("utf-8"))  # pyright: ignore[reportAny]
+        if text.startswith(METADATA_MARKER_JSON):
+            return json.loads(text[len(METADATA_MARKER_JSON):])  # pyright: ignore[reportAny]
+        return json.loads(text)  # pyright: ignore[reportAny]
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed metadata payload: {e}") from e
+
+
+
+
+def compute_metadata_digest(data: VideoInfo, metadata_format: Literal["json", "zlib"], id3_date: str) -> str:
+    """
+    Digest of the canonicalized video info as embedded in `metadata_format`
+    (sorted keys, skips as lists, dates ignored like in the payload comparison),
+    and of the TDRC date frame written with it.
+    """
+    canonical: dict[str, object] = {key: value for key, value in data.items() if key not in ("date_added", "date_modified")}
+    if "skips" in data:
+        canonical["skips"] = [[start, end] for start, end in data["skips"]]
+    if "tags" in data:
+        canonical["tags"] = sorted(data["tags"])
+    payload: str = json.dumps({"format": metadata_format, "date": id3_date, "data": canonical}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+
+
+# Tag saves done in this run, and those that had to rewrite the whole file
+_save_stats: dict[str, int] = {"saves": 0, "rewrites": 0}
+_save_stats_lock: threading.Lock = threading.Lock()
+
+
+
+
+def save_tags(audio: MP3, v2_version: Literal[3, 4] = 4) -> None:
+    """
+    Save the tags of an MP3 with the padding policy: a tag that still fits keeps
+    its padding as is (the audio isn't moved, only the tag is overwritten), and a
+    tag that must grow gets ID3_PADDING bytes of headroom so the next updates fit.
+    Every tag save goes through here to be counted.
+    """
+    rewrite: list[bool] = [False]
+
+    def padding_policy(padding_info: PaddingInfo) -> int:
+        if padding_info.padding >= 0:
+            return padding_info.padding
+        rewrite[0] = True
+        return ID3_PADDING
+
+    audio.save(v2_version=v2_version, padding=padding_policy)  # pyright: ignore[reportUnknownMemberType]
+
+    with _save_stats_lock:
+        _save_stats["saves"] += 1
+        _save_stats["rewrites"] += rewrite[0]
+    if rewrite[0]:
+        logger.verbose(f"[Save Tags] Tag grew, whole file rewritten with {ID3_PADDING} bytes of padding: '{audio.filename}'")  # pyright: ignore[reportUnknownMemberType]
+
+
+
+
+def get_save_stats() -> tuple[int, int]:
+    """Number of tag saves of the run, and of those that rewrote the whole file"""
+    with _save_stats_lock:
+        return _save_stats["saves"], _save_stats["rewrites"]
+
+
+
+
+class TagSession:
+    """
+    The ID3 tags of one MP3, loaded once (on first use) for all the stages of a video.
+    The helpers given a session read from it and queue their frame edits on it
+    instead of opening and saving the file themselves; save() then writes the
+    file once, and only if an edit actually changed something.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self.filepath: Path = filepath
+        self._audio: MP3 | None = None
+        self.changed: bool = False
+        self.v2_version: Literal[3, 4] = 4
+
+
+    @property
+    def audio(self) -> MP3:
+        if self._audio is None:
+            self._audio = MP3(str(self.filepath), ID3=ID3)
+            logger.verbose(f"[Tag Session] Loaded '{self.filepath.name}'")
+        return self._audio
+
+
+    @property
+    def tags(self) -> ID3:
+        if self.audio.tags is None:  # pyright: ignore[reportUnknownMemberType]
+            self.audio.add_tags()  # pyright: ignore[reportUnknownMemberType]
+        return self.audio.tags  # pyright: ignore[reportUnknownMemberType, reportReturnType]
+
+
+    def mark_changed(self) -> None:
+        self.changed = True
+
+
+    def save(self, test_run: bool) -> bool:
+        """Write the queued edits, returns False if the save failed"""
+        if not self.changed:
+            logger.verbose(f"[Tag Session] Nothing changed, not saving '{self.filepath.name}'")
+            return True
+        try:
+            if not test_run:
+                save_tags(audio=self.audio, v2_version=self.v2_version)
+            self.changed = False
+            logger.verbose(f"[Tag Session] Saved the tags of '{self.filepath.name}'")
+            return True
+        except Exception as e:
+            logger.error(f"[Tag Session] Failed to save the tags of '{self.filepath.name}': {e}")
+            return False
+
+
+
+
+def open_tag_session(filepath: Path) -> TagSession | None:
+    """Session for the tags of an MP3 (loaded on first use), None if the file doesn't exist"""
+    if not filepath.is_file():
+        logger.error(f"[Tag Session] No file to open a session on: '{filepath}'")
+        return None
+    return TagSession(filepath)
+
+
+
+
+
+
+def get_metadata_tag(filepath: Path, tag: str = 'metadata', session: TagSession | None = None) -> tuple[VideoInfo | None, Literal[0,1,2,3]]:
     """Return metadata from an MP3 file, and a state code
     Returns:
         0 -> ok
@@ -26,13 +193,13 @@ def get_metadata_tag(filepath: Path, tag: str = 'metadata') -> tuple[VideoInfo |
         3 -> corrupted
     """
     try:
-        audio: MP3 | None = MP3(str(filepath), ID3=ID3)
+        audio: MP3 | None = session.audio if session else MP3(str(filepath), ID3=ID3)
         if audio.tags is not None:  # pyright: ignore[reportUnknownMemberType]
             comments = audio.tags.getall('TXXX')  # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType]
             for comment in comments:   # pyright: ignore[reportUnknownVariableType]
                 if isinstance(comment, TXXX) and comment.desc.lower() == tag.lower():  # pyright: ignore[reportUnknownMemberType, reportAttributeAccessIssue]
                     try:
-                        data = json.loads(comment.text[0])   # pyright: ignore[reportUnknownMemberType, reportAny, reportUnknownArgumentType, reportAttributeAccessIssue]
+                        data = decode_metadata_payload(comment.text[0])   # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType, reportAttributeAccessIssue]
                     except Exception as e:
                         logger.warning(f"[Get Metadata Tag] Exception during converting to python dict: {e}")
                         return None, 2
@@ -73,7 +240,7 @@ def repair_mp3_file(filepath: Path, test_run: bool) -> bool:
         _ = audio.tags    # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType]
 
         # Try saving tags to fix minor corruptions or header problems
-        if not test_run: audio.save()   # pyright: ignore[reportUnknownMemberType]
+        if not test_run: save_tags(audio=audio)
         logger.verbose(f"[Repair MP3] File '{filepath}' is healthy or repaired successfully")
         return True
 
@@ -90,7 +257,104 @@ def repair_mp3_file(filepath: Path, test_run: bool) -> bool:
 
 
 
-def read_id3_tag(filepath: Path, frame_id: str) -> tuple[list[str] | str, Literal[0, 1, 2]]:
+# Positions sampled in the audio by verify_mp3_file, and bytes read at each of them
+VERIFY_SAMPLES: int = 8
+VERIFY_WINDOW: int = 8192
+
+
+
+
+def verify_mp3_file(filepath: Path) -> bool:
+    """
+    Read-only integrity check: the ID3v2 header (if any) must be sane and fit in the file,
+    and MPEG frames of one consistent stream must be found right after it and at
+    VERIFY_SAMPLES positions spread over the audio.
+    Only a few small windows of the file are read.
+    """
+    try:
+        file_size: int = os.path.getsize(filepath)
+        with open(filepath, "rb") as f:
+            audio_start: int | None = id3v2_size(f.read(10))
+            if audio_start is None or audio_start >= file_size:
+                logger.warning(f"[Verify MP3] Malformed ID3 header in '{filepath}'")
+                return False
+
+            # ID3v1 tag at the end
+            audio_end: int = file_size
+            if file_size >= 128:
+                _ = f.seek(file_size - 128)
+                if f.read(3) == b"TAG":
+                    audio_end -= 128
+
+            # Some encoders leave junk between the tag and the first frame, search a bit for it
+            _ = f.seek(audio_start)
+            head: bytes = f.read(65536 + VERIFY_WINDOW)
+            first: tuple[int, FrameHeader] | None = find_frame(data=head, start=0, end=min(65536, len(head)))
+            if first is None:
+                logger.warning(f"[Verify MP3] No MPEG frame after the tag in '{filepath}'")
+                return False
+            stream: FrameHeader = first[1]
+            audio_start += first[0]
+
+            for sample in range(1, VERIFY_SAMPLES + 1):
+                position: int = audio_start + (audio_end - audio_start) * sample // (VERIFY_SAMPLES + 1)
+                if audio_end - position < VERIFY_WINDOW:
+                    break # Short file, the head already covered it
+                _ = f.seek(position)
+                window: bytes = f.read(VERIFY_WINDOW)
+                found: tuple[int, FrameHeader] | None = find_frame(data=window, start=0, end=VERIFY_WINDOW // 2)
+                if found is None or (found[1]["version"], found[1]["layer"], found[1]["sample_rate"]) != (stream["version"], stream["layer"], stream["sample_rate"]):
+                    logger.warning(f"[Verify MP3] Lost MPEG frame sync at byte {position} of '{filepath}'")
+                    return False
+
+        logger.verbose(f"[Verify MP3] File '{filepath}' looks healthy")
+        return True
+
+    except OSError as e:
+        logger.error(f"[Verify MP3] Failed to read '{filepath}': {e}")
+        return False
+
+
+
+
+def check_mp3_integrity(filepath: Path, verified_at: float | None, integrity_mode: Literal["verify", "repair"], test_run: bool) -> Literal[0, 1, 2]:
+    """
+    Check a file according to `integrity_mode`:
+        "verify" -> skip files not modified since `verified_at`, verify the others
+                    read-only and only try to repair (rewrite) those failing
+        "repair" -> always repair_mp3_file (rewrites the tags of every file)
+
+    Returns:
+        0 -> healthy, unchanged since the last verification (verified_at stays valid)
+        1 -> healthy, just verified or repaired (store a new verified_at)
+        2 -> corrupted
+    """
+    if integrity_mode == "repair":
+        return 1 if repair_mp3_file(filepath=filepath, test_run=test_run) else 2
+
+    if verified_at:
+        try:
+            if os.stat(filepath).st_mtime <= verified_at:
+                logger.verbose(f"[Check MP3] '{filepath.name}' not modified since its last verification")
+                return 0
+        except OSError:
+            return 2
+
+    if verify_mp3_file(filepath=filepath):
+        return 1
+
+    logger.warning(f"[Check MP3] Verification failed, trying to repair '{filepath.name}'")
+    if repair_mp3_file(filepath=filepath, test_run=test_run) and (test_run or verify_mp3_file(filepath=filepath)):
+        return 1
+    return 2
+
+
+
+
+
+
+
+def read_id3_tag(filepath: Path, frame_id: str, session: TagSession | None = None) -> tuple[list[str] | str, Literal[0, 1, 2]]:
     """
     Read ID3 tag frame text from the MP3 file.
 
@@ -103,7 +367,7 @@ def read_id3_tag(filepath: Path, frame_id: str) -> tuple[list[str] | str, Litera
             2 -> exception/error
     """
     try:
-        audio = MP3(str(filepath), ID3=ID3)
+        audio = session.audio if session else MP3(str(filepath), ID3=ID3)
         if audio.tags is not None:  # pyright: ignore[reportUnknownMemberType]
             frame = audio.tags.get(frame_id) # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType]
             if frame:
@@ -131,7 +395,7 @@ def read_id3_tag(filepath: Path, frame_id: str) -> tuple[list[str] | str, Litera
 
 
 
-def write_id3_tag(filepath: Path, frame_id: str, data: str | list[str] | set[str], test_run: bool) -> bool:
+def write_id3_tag(filepath: Path, frame_id: str, data: str | list[str] | set[str], test_run: bool, session: TagSession | None = None) -> bool:
     """
     Write ID3 tag frame text to the MP3 file.
 
@@ -139,12 +403,14 @@ def write_id3_tag(filepath: Path, frame_id: str, data: str | list[str] | set[str
       - filepath: path to MP3 file
       - frame_id: ID3 frame id (e.g. 'TCON' for genre, 'TPE1' for artist)
       - data: string or iterable of strings to write as tag text
+      - session: if given, the edit is queued on it (saved by the session) and
+        skipped when the frame already holds the same text
 
     Returns:
       - True if success, False otherwise
     """
     try:
-        audio = MP3(str(filepath), ID3=ID3)
+        audio = session.audio if session else MP3(str(filepath), ID3=ID3)
         if audio.tags is None:  # pyright: ignore[reportUnknownMemberType]
             audio.add_tags()    # pyright: ignore[reportUnknownMemberType]
 
@@ -157,20 +423,30 @@ def write_id3_tag(filepath: Path, frame_id: str, data: str | list[str] | set[str
         # Handle custom TXXX frame explicitly
         if frame_id.startswith("TXXX:"):
             desc = frame_id.replace("TXXX:", "")
-            audio.tags.add(TXXX(encoding=3, desc=desc, text=text_data))  # pyright: ignore[reportUnknownMemberType, reportOptionalMemberAccess]
+            frame = TXXX(encoding=3, desc=desc, text=text_data)
         else:
             frame_class = Frames.get(frame_id)  # pyright: ignore[reportUnknownVariableType, reportUnknownMemberType]
 
             if frame_class is None:
                 logger.warning(f"[Write Tag] Frame '{frame_id}' not found. Using 'TXXX' custom frame")
                 text_data = ["; ".join(text_data)]  # collapse to single string
-                audio.tags.add(TXXX(encoding=3, desc=frame_id, text=text_data))  # pyright: ignore[reportUnknownMemberType, reportOptionalMemberAccess]
+                frame = TXXX(encoding=3, desc=frame_id, text=text_data)
             else:
                 # Standard frame
-                audio.tags.add(frame_class(encoding=3, text=text_data))  # pyright: ignore[reportUnknownMemberType, reportOptionalMemberAccess]
+                frame = frame_class(encoding=3, text=text_data)  # pyright: ignore[reportUnknownVariableType]
 
-        if not test_run:
-            audio.save()  # pyright: ignore[reportUnknownMemberType]
+        if session:
+            existing = audio.tags.get(frame.HashKey)  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType, reportOptionalMemberAccess, reportUnknownArgumentType]
+            if existing is not None and [str(text) for text in existing.text] == [str(text) for text in frame.text]:  # pyright: ignore[reportUnknownMemberType, reportUnknownVariableType, reportAttributeAccessIssue]
+                logger.verbose(f"[Write Tag] Tag '{frame_id}' already up to date in '{filepath.name}'")
+                return True
+
+        audio.tags.add(frame)  # pyright: ignore[reportUnknownMemberType, reportOptionalMemberAccess]
+
+        if session:
+            session.mark_changed()
+        elif not test_run:
+            save_tags(audio=audio)
 
         logger.verbose(f"[Write Tag] Successfully written tag '{frame_id}' into '{filepath.name}'")
         return True
@@ -178,6 +454,3 @@ def write_id3_tag(filepath: Path, frame_id: str, data: str | list[str] | set[str
     except Exception as e:
         logger.error(f"[Write Tag] Failed to write tag '{frame_id}' into '{filepath.name}': {e}")
         return False
-
-
-
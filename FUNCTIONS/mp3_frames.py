@@ -0,0 +1,123 @@
+from typing import Literal, TypedDict
+
+
+from FUNCTIONS.HELPERS.logger import setup_logger
+logger = setup_logger(__name__)
+
+
+
+
+# Bitrates in kbps, indexed by the 4 bitrate bits of a frame header (0 = free format, 15 = invalid)
+_BITRATES: dict[tuple[int, int], list[int]] = {
+    # (MPEG1, layer)
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    # (MPEG2 and 2.5, layer)
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# Sample rates indexed by the 2 sample rate bits (3 = invalid)
+_SAMPLE_RATES: dict[Literal["1", "2", "2.5"], list[int]] = {
+    "1": [44100, 48000, 32000],
+    "2": [22050, 24000, 16000],
+    "2.5": [11025, 12000, 8000],
+}
+
+
+
+
+class FrameHeader(TypedDict):
+    version: Literal["1", "2", "2.5"]
+    layer: Literal[1, 2, 3]
+    bitrate: int # kbps
+    sample_rate: int
+    padding: bool
+    channel_mode: int # 3 = mono
+    samples: int # per frame
+    length: int # whole frame, header included
+
+
+
+
+def parse_frame_header(header: bytes) -> FrameHeader | None:
+    """
+    Parse the 4 bytes of an MPEG audio frame header.
+    Returns None if they are not a valid header (free format bitrates are not supported).
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits: int = (header[1] >> 3) & 0x03
+    layer_bits: int = (header[1] >> 1) & 0x03
+    bitrate_index: int = header[2] >> 4
+    sample_rate_index: int = (header[2] >> 2) & 0x03
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version: Literal["1", "2", "2.5"] = "1" if version_bits == 3 else "2" if version_bits == 2 else "2.5"
+    layer: Literal[1, 2, 3] = 1 if layer_bits == 3 else 2 if layer_bits == 2 else 3
+    bitrate: int = _BITRATES[(1 if version == "1" else 2, layer)][bitrate_index]
+    sample_rate: int = _SAMPLE_RATES[version][sample_rate_index]
+    padding: bool = bool((header[2] >> 1) & 0x01)
+
+    samples: int
+    if layer == 1:
+        samples = 384
+        length: int = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == "1" else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "padding": padding,
+        "channel_mode": header[3] >> 6,
+        "samples": samples,
+        "length": length,
+    }
+
+
+
+
+def id3v2_size(header: bytes) -> int | None:
+    """
+    Total size (header and footer included) of the ID3v2 tag starting with these 10 bytes,
+    0 if there is no tag, None if the header is malformed.
+    """
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    major, revision, flags = header[3], header[4], header[5]
+    if major not in (2, 3, 4) or revision == 0xFF or flags & 0x0F:
+        return None
+    if any(byte & 0x80 for byte in header[6:10]):
+        return None # Not a syncsafe integer
+    size: int = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + size + (10 if flags & 0x10 else 0)
+
+
+
+
+def find_frame(data: bytes, start: int, end: int) -> tuple[int, FrameHeader] | None:
+    """
+    First offset in data[start:end] holding a frame header followed by another
+    frame of the same stream (or by the end of data), with its parsed header.
+    """
+    position: int = data.find(b"\xFF", start, end)
+    while position != -1:
+        header: FrameHeader | None = parse_frame_header(data[position:position + 4])
+        if header is not None:
+            next_position: int = position + header["length"]
+            if next_position + 4 > len(data):
+                return position, header
+            next_header: FrameHeader | None = parse_frame_header(data[next_position:next_position + 4])
+            if next_header is not None and (next_header["version"], next_header["layer"], next_header["sample_rate"]) == (header["version"], header["layer"], header["sample_rate"]):
+                return position, header
+        position = data.find(b"\xFF", position + 1, end)
+    return None
@@ -0,0 +1,324 @@
+from collections import deque
+from pathlib import Path
+import struct
+
+
+from FUNCTIONS.mp3_frames import FrameHeader, find_frame, id3v2_size, parse_frame_header
+
+from FUNCTIONS.HELPERS.logger import setup_logger
+logger = setup_logger(__name__)
+
+
+
+
+# Flags of the Xing / Info header, telling which fields follow it
+_XING_FRAMES: int = 0x1
+_XING_BYTES: int = 0x2
+_XING_TOC: int = 0x4
+_XING_QUALITY: int = 0x8
+
+# Offsets in the LAME extension, from its start right after the Xing fields
+_LAME_DELAY_PADDING: int = 21 # 3 bytes: 12 bits of encoder delay, 12 bits of padding
+_LAME_MUSIC_LENGTH: int = 28 # 4 bytes: from the start of the Xing frame to the end of the audio
+_LAME_MUSIC_CRC: int = 32 # CRC of the audio frames after the Xing frame
+_LAME_TAG_CRC: int = 34 # CRC of the frame up to there (LAME) or of its first 190 bytes (ffmpeg), last 2 bytes of the extension
+_LAME_TAG_CRC_LENGTH: int = 190
+_LAME_ENCODERS: set[bytes] = {b"LAME", b"L3.9", b"Lavc", b"Lavf"} # First bytes of the encoder name
+
+# APEv2 tag footer (ReplayGain...): its last 32 bytes, with the tag size (footer included) and flags
+_APE_FOOTER: int = 32
+_APE_HAS_HEADER: int = 0x80000000 # 32 more bytes before the items
+
+# Bit reservoir: a frame's audio data can start up to 511 bytes before it, in the previous frames
+_MAX_MAIN_DATA_BEGIN: int = 511
+_RESERVOIR_FRAMES: int = 64 # Dropped frames remembered to rebuild it, enough for the lowest bitrates
+
+
+
+
+class Mp3SpliceError(ValueError):
+    """The file can't be spliced (no MPEG frames found), it has to be cut by re-encoding"""
+
+
+
+
+def _side_info_size(header: bytes, frame: FrameHeader) -> int:
+    """Size of the layer III side information, after the 4 header bytes and the CRC if any"""
+    crc: int = 0 if header[1] & 0x01 else 2
+    mono: bool = frame["channel_mode"] == 3
+    if frame["version"] == "1":
+        return crc + (17 if mono else 32)
+    return crc + (9 if mono else 17)
+
+
+
+
+def _main_data_begin(data: bytes, position: int, frame: FrameHeader) -> int:
+    """
+    Bytes of the frame's audio data stored in the previous frames (bit reservoir),
+    the first 9 (MPEG1) or 8 bits of the layer III side information
+    """
+    if frame["layer"] != 3:
+        return 0
+    offset: int = position + 4 + (0 if data[position + 1] & 0x01 else 2)
+    if frame["version"] == "1":
+        return (data[offset] << 1) | (data[offset + 1] >> 7)
+    return data[offset]
+
+
+
+
+def _main_data_size(data: bytes, position: int, frame: FrameHeader) -> int:
+    """Bytes of the frame after its header and side information, holding audio data"""
+    return frame["length"] - 4 - _side_info_size(data[position:position + 4], frame)
+
+
+
+
+def _silent_frame(data: bytes, position: int, frame: FrameHeader) -> bytes:
+    """
+    Silent copy of a layer III frame: its side information is zeroed (no audio data,
+    main_data_begin 0) but its other bytes are kept, still filling the bit reservoir
+    for the next frames. The CRC, if any, is dropped and replaced by padding.
+    """
+    header: bytes = data[position:position + 4]
+    side_info: int = _side_info_size(header, frame) # With the CRC, zeroed as well
+    return bytes([header[0], header[1] | 0x01]) + header[2:4] + bytes(side_info) + data[position + 4 + side_info:position + frame["length"]]
+
+
+
+
+def _crc16_byte_table() -> list[int]:
+    """CRC-16/ARC of each byte value"""
+    table: list[int] = []
+    for byte in range(256):
+        crc: int = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC16_BYTES: list[int] = _crc16_byte_table()
+# Two bytes at a time (the CRC is reflected, so XORed with them read little-endian): about 0.3s for 6MB of audio
+_CRC16_WORDS: list[int] = [_CRC16_BYTES[(_CRC16_BYTES[word & 0xFF] ^ (word >> 8)) & 0xFF] ^ (_CRC16_BYTES[word & 0xFF] >> 8) for word in range(65536)]
+
+
+
+
+def _crc16(data: bytes | bytearray) -> int:
+    """CRC-16/ARC, the one of the LAME tag and of the audio it describes"""
+    crc: int = 0
+    view: memoryview = memoryview(data)
+    even: int = len(data) & ~1
+    for word in view[:even].cast("H"):
+        crc = _CRC16_WORDS[crc ^ word]
+    for byte in view[even:]:
+        crc = (crc >> 8) ^ _CRC16_BYTES[(crc ^ byte) & 0xFF]
+    return crc
+
+
+
+
+def _tag_crc(frame: bytearray, tag_crc: int, length: int) -> int:
+    """CRC of the first `length` bytes of the Xing frame, the CRC field itself read as zeros"""
+    if length <= tag_crc:
+        return _crc16(bytes(frame[:length]))
+    return _crc16(bytes(frame[:tag_crc]) + bytes(2) + bytes(frame[tag_crc + 2:length]))
+
+
+
+
+def _xing_offset(data: bytes, position: int, frame: FrameHeader) -> int | None:
+    """Offset of the 'Xing' / 'Info' marker if the frame at `position` is a VBR header frame, not audio"""
+    if frame["layer"] != 3:
+        return None
+    offset: int = position + 4 + _side_info_size(data[position:position + 4], frame)
+    if data[offset:offset + 4] in (b"Xing", b"Info"):
+        return offset
+    return None
+
+
+
+
+def _rewrite_xing_frame(frame: bytearray, xing: int, frame_offsets: list[int], audio: bytes, keep_delay: bool, keep_padding: bool) -> None:
+    """
+    Update a Xing / Info frame (`xing` being the offset of its marker) for the kept frames:
+    frame and byte counts, seek table, and the delay, padding, music length and CRCs of its LAME tag.
+    `frame_offsets` are the offsets of the kept frames from the start of the Xing frame,
+    `audio` the kept frames following it.
+    """
+    flags: int = struct.unpack(">I", frame[xing + 4:xing + 8])[0]
+    frames_field: int = xing + 8
+    bytes_field: int = frames_field + (4 if flags & _XING_FRAMES else 0)
+    toc_field: int = bytes_field + (4 if flags & _XING_BYTES else 0)
+    lame: int = toc_field + (100 if flags & _XING_TOC else 0) + (4 if flags & _XING_QUALITY else 0)
+    if lame > len(frame):
+        logger.warning("[Splice MP3] Truncated Xing header, left as it is")
+        return
+
+    # LAME, and encoders using its tag format (ffmpeg), are recognized by their name or the CRC of the tag
+    tag_crc: int = lame + _LAME_TAG_CRC
+    crc_length: int = tag_crc
+    has_lame_tag: bool = False
+    if len(frame) >= tag_crc + 2:
+        stored_crc: int = struct.unpack(">H", frame[tag_crc:tag_crc + 2])[0]
+        for length in (tag_crc, max(tag_crc, _LAME_TAG_CRC_LENGTH)):
+            if stored_crc == _tag_crc(frame=frame, tag_crc=tag_crc, length=length):
+                has_lame_tag, crc_length = True, length
+                break
+        has_lame_tag = has_lame_tag or bytes(frame[lame:lame + 4]) in _LAME_ENCODERS
+
+    total: int = len(frame) + len(audio)
+    if flags & _XING_FRAMES:
+        frame[frames_field:frames_field + 4] = struct.pack(">I", len(frame_offsets))
+    if flags & _XING_BYTES:
+        frame[bytes_field:bytes_field + 4] = struct.pack(">I", total)
+    if flags & _XING_TOC:
+        # Position (in 1/256 of the file) of each percent of the duration
+        for percent in range(100):
+            offset: int = frame_offsets[len(frame_offsets) * percent // 100] if frame_offsets else 0
+            frame[toc_field + percent] = min(255, offset * 256 // total)
+
+    # LAME extension: the delay (or padding) only applies if the first (or last) frame was kept
+    if has_lame_tag:
+        delay_padding: int = lame + _LAME_DELAY_PADDING
+        packed: int = int.from_bytes(frame[delay_padding:delay_padding + 3], "big")
+        delay: int = packed >> 12 if keep_delay else 0
+        padding: int = packed & 0xFFF if keep_padding else 0
+        frame[delay_padding:delay_padding + 3] = ((delay << 12) | padding).to_bytes(3, "big")
+        frame[lame + _LAME_MUSIC_LENGTH:lame + _LAME_MUSIC_LENGTH + 4] = struct.pack(">I", total)
+        frame[lame + _LAME_MUSIC_CRC:lame + _LAME_MUSIC_CRC + 2] = struct.pack(">H", _crc16(audio))
+        frame[tag_crc:tag_crc + 2] = struct.pack(">H", _tag_crc(frame=frame, tag_crc=tag_crc, length=crc_length))
+
+
+
+
+def splice_mp3(input_file: Path, output_file: Path, segments: list[tuple[float, float]], test_run: bool) -> float:
+    """
+    Cut the segments out of an MP3 without re-encoding it, by dropping the MPEG frames
+    whose middle falls in one of them. The ID3 tags, and whatever follows the last frame
+    (APE tag...), are kept and the Xing / LAME header, if any, is updated for the remaining frames.
+    The cuts are accurate to a frame (26 ms at 44.1 kHz). When the first frames after a cut
+    take audio data from the dropped ones (bit reservoir), the last dropped frames are
+    kept as silent frames still carrying that data, so every kept frame decodes as before.
+    Returns the seconds removed.
+    Raises Mp3SpliceError if no frames can be found, or if a cut is too short to hold the
+    bit reservoir of the frame after it.
+    """
+    data: bytes = input_file.read_bytes()
+
+    tag_size: int | None = id3v2_size(data[:10])
+    if tag_size is None or tag_size >= len(data):
+        raise Mp3SpliceError(f"Malformed ID3 header in '{input_file}'")
+
+    audio_end: int = len(data)
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        audio_end -= 128 # ID3v1 tag, kept
+    if audio_end - _APE_FOOTER >= tag_size and data[audio_end - _APE_FOOTER:audio_end - _APE_FOOTER + 8] == b"APETAGEX":
+        ape_size: int = struct.unpack("<I", data[audio_end - 20:audio_end - 16])[0]
+        ape_flags: int = struct.unpack("<I", data[audio_end - 12:audio_end - 8])[0]
+        audio_end -= ape_size + (_APE_FOOTER if ape_flags & _APE_HAS_HEADER else 0) # Kept after the frames
+        if audio_end < tag_size:
+            raise Mp3SpliceError(f"Malformed APE tag in '{input_file}'")
+
+    first: tuple[int, FrameHeader] | None = find_frame(data=data, start=tag_size, end=min(audio_end, tag_size + 65536))
+    if first is None:
+        raise Mp3SpliceError(f"No MPEG frame after the tag in '{input_file}'")
+    position, frame = first
+
+    # VBR header frame, rewritten for the kept frames
+    xing_frame: bytearray | None = None
+    xing: int | None = _xing_offset(data=data, position=position, frame=frame)
+    if xing is not None:
+        xing_frame = bytearray(data[position:position + frame["length"]])
+        xing -= position
+        position += frame["length"]
+
+    ranges: list[tuple[float, float]] = sorted(segments)
+    kept: list[bytes | memoryview] = []
+    total_frames: int = 0
+    first_kept: bool = False
+    last_kept: bool = False
+    removed: float = 0.0
+    elapsed: float = 0.0
+    view: memoryview = memoryview(data)
+
+    # Bit reservoir after a cut: dropped frames that can still be kept as silent ones (latest last),
+    # where they go, and the audio data bytes the following frames can take from (None once enough)
+    dropped_frames: deque[tuple[int, FrameHeader]] = deque(maxlen=_RESERVOIR_FRAMES)
+    cut_index: int = 0
+    reservoir: int | None = None
+    silent_frames: int = 0
+
+    while position + 4 <= audio_end:
+        header: FrameHeader | None = parse_frame_header(data[position:position + 4])
+        if header is None or position + header["length"] > audio_end:
+            found: tuple[int, FrameHeader] | None = find_frame(data=data, start=position + 1, end=audio_end)
+            if found is None:
+                break
+            position = found[0]
+            continue # Junk between two frames, dropped
+
+        duration: float = header["samples"] / header["sample_rate"]
+        middle: float = elapsed + duration / 2
+        dropped: bool = any(start <= middle < end for start, end in ranges)
+
+        if dropped:
+            removed += duration
+            if last_kept or total_frames == 0: # First frame of a cut
+                dropped_frames.clear()
+                cut_index = len(kept)
+            dropped_frames.append((position, header))
+            reservoir = 0
+        else:
+            if reservoir is not None:
+                # Silent copies of the last dropped frames, until they hold the data this frame starts with
+                while _main_data_begin(data=data, position=position, frame=header) > reservoir:
+                    if not dropped_frames:
+                        raise Mp3SpliceError(f"Cut too short for the bit reservoir after it in '{input_file}'")
+                    silent_position, silent_header = dropped_frames.pop()
+                    kept.insert(cut_index, _silent_frame(data=data, position=silent_position, frame=silent_header))
+                    reservoir += _main_data_size(data=data, position=silent_position, frame=silent_header)
+                    removed -= silent_header["samples"] / silent_header["sample_rate"]
+                    silent_frames += 1
+                reservoir += _main_data_size(data=data, position=position, frame=header)
+                if reservoir > _MAX_MAIN_DATA_BEGIN:
+                    reservoir = None
+                    dropped_frames.clear()
+            kept.append(view[position:position + header["length"]])
+        if total_frames == 0:
+            first_kept = not dropped
+        last_kept = not dropped
+
+        total_frames += 1
+        elapsed += duration
+        position += header["length"]
+
+    if total_frames == 0:
+        raise Mp3SpliceError(f"No MPEG frame after the tag in '{input_file}'")
+    trailer: int = position # Bytes after the last frame, APE and ID3v1 tags included, copied as they are
+
+    if test_run:
+        logger.debug("[Splice MP3] test_run was enabled, didn't cutted anything")
+        return 0.0
+
+    frame_offsets: list[int] = []
+    offset: int = len(xing_frame) if xing_frame is not None else 0
+    for chunk in kept:
+        frame_offsets.append(offset)
+        offset += len(chunk)
+    audio: bytes = b"".join(kept)
+
+    if xing_frame is not None and xing is not None:
+        _rewrite_xing_frame(frame=xing_frame, xing=xing, frame_offsets=frame_offsets, audio=audio, keep_delay=first_kept, keep_padding=last_kept)
+
+    with open(output_file, "wb") as f:
+        _ = f.write(view[:tag_size])
+        if xing_frame is not None:
+            _ = f.write(xing_frame)
+        _ = f.write(audio)
+        _ = f.write(view[trailer:])
+
+    logger.info(f"[Splice MP3] Dropped {total_frames - len(frame_offsets)} of {total_frames} frames ({round(removed, 2)}s), {silent_frames} kept silent for the bit reservoir, from '{input_file}'")
+    return removed
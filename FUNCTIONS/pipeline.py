@@ -0,0 +1,116 @@
+from collections.abc import Callable, Iterable
+from queue import Queue
+from typing import Generic, TypedDict, TypeVar
+import threading
+
+
+from FUNCTIONS.HELPERS.logger import setup_logger
+logger = setup_logger(__name__)
+
+
+
+
+Item = TypeVar("Item")
+
+
+class PipelineStage(TypedDict, Generic[Item]):
+    """One step of the pipeline: `function` is applied to every item by `workers` threads"""
+    name: str
+    function: Callable[[Item], None]
+    workers: int
+
+
+
+
+# Put in a queue once per consumer thread to tell it that no more items will come
+_END: object = object()
+
+
+
+
+def run_pipeline(
+    items: Iterable[Item],
+    stages: list[PipelineStage[Item]],
+    queue_size: int,
+    on_done: Callable[[Item], None],
+    on_error: Callable[[Item, str], None] | None = None
+) -> None:
+    """
+    Run every item through the stages, in order.
+
+    Each stage has its own worker threads and reads from a bounded queue filled
+    by the previous stage, so different stages work on different items at the
+    same time while at most `queue_size` items wait between two stages.
+    Items are mutated in place by the stage functions; `on_done` is called once
+    an item has left the last stage.
+    An exception raised by a stage is logged and passed to `on_error` with the item
+    and the stage name, then the item keeps going, so it still reaches `on_done`.
+    """
+    queues: list[Queue[object]] = [Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+    workers: list[int] = [max(1, stage["workers"]) for stage in stages]
+    remaining_workers: list[int] = workers.copy()
+    remaining_lock: threading.Lock = threading.Lock()
+
+
+    def stage_worker(index: int) -> None:
+        stage: PipelineStage[Item] = stages[index]
+        input_queue: Queue[object] = queues[index]
+        output_queue: Queue[object] = queues[index + 1]
+
+        while True:
+            item = input_queue.get()
+            if item is _END:
+                break
+            try:
+                stage["function"](item)  # pyright: ignore[reportArgumentType]
+            except Exception as e:
+                logger.error(f"[Pipeline] Stage '{stage['name']}' failed: {e}")
+                logger.debug("Exception details:", exc_info=True)
+                if on_error is not None:
+                    on_error(item, stage["name"])  # pyright: ignore[reportArgumentType]
+            output_queue.put(item)
+
+        # The last worker of a stage closes the next one
+        with remaining_lock:
+            remaining_workers[index] -= 1
+            last: bool = remaining_workers[index] == 0
+        if last:
+            next_consumers: int = workers[index + 1] if index + 1 < len(stages) else 1
+            for _ in range(next_consumers):
+                output_queue.put(_END)
+
+
+    threads: list[threading.Thread] = []
+    for index, stage in enumerate(stages):
+        for worker in range(workers[index]):
+            thread = threading.Thread(target=stage_worker, args=(index,), name=f"{stage['name']}-{worker}", daemon=True)
+            thread.start()
+            threads.append(thread)
+    logger.debug(f"[Pipeline] Started {len(threads)} threads over {len(stages)} stages")
+
+
+    # Feed the first stage from a separate thread, the bounded queue blocks it when the pipeline is full
+    def feeder() -> None:
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            logger.error(f"[Pipeline] Failed to produce the next item, stopping the feed: {e}")
+        finally:
+            for _ in range(workers[0]):
+                queues[0].put(_END)
+
+    feeder_thread = threading.Thread(target=feeder, name="pipeline-feeder", daemon=True)
+    feeder_thread.start()
+
+
+    # Drain the last queue in the calling thread
+    while True:
+        item = queues[-1].get()
+        if item is _END:
+            break
+        on_done(item)  # pyright: ignore[reportArgumentType]
+
+    feeder_thread.join()
+    for thread in threads:
+        thread.join()
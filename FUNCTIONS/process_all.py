@@ -1,6 +1,9 @@
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from sqlite3 import Connection, Cursor
-from typing import Literal
+from typing import Literal, TypedDict
+import threading
 import time
 from datetime import timedelta
 
@@ -11,17 +14,22 @@ from CONSTANTS import OVERWRITE_UNCHANGED
 from FUNCTIONS.PROCESS.add_new_ids import add_new_ids_to_database
 from FUNCTIONS.PROCESS.remove_ids_not_in_list import remove_ids_not_in_list
 from FUNCTIONS.extract_and_clean import extract_and_clean_video_ids
+from FUNCTIONS.library_index import init_library_index
 from FUNCTIONS.PROCESS.add_lyrics import process_lyrics_for_video
 from FUNCTIONS.PROCESS.add_tags import process_tags_for_video
 from FUNCTIONS.PROCESS.add_thumbails import process_thumbnail_for_video
 from FUNCTIONS.PROCESS.check_file_integrity import check_file_integrity_for_video
-from FUNCTIONS.PROCESS.remove_sponsorblock_segments import remove_sponsorblock_segments_for_video
+from FUNCTIONS.PROCESS.remove_sponsorblock_segments import get_segments_for_download, remove_sponsorblock_segments_for_video
 from FUNCTIONS.PROCESS.embed_metadata import embed_metadata_for_video
 from FUNCTIONS.PROCESS.add_album import process_album_for_video
-from FUNCTIONS.download import download_video, safe_extract_info
-from FUNCTIONS.sql_requests import get_videos_in_list, get_video_info_from_db, init_db, update_video_db
+from FUNCTIONS.download import close_download_pools, configure_download_pools, download_video, prefetch_video_info, safe_extract_info
+from FUNCTIONS.metadata import TagSession, open_tag_session
+from FUNCTIONS.sql_requests import DB_LOCK, flush_video_db, get_videos_in_list, get_video_info_from_db, init_db, preload_videos, update_video_db
 from FUNCTIONS.HELPERS.helpers import VideoInfo, VideoInfoMap
 from FUNCTIONS.HELPERS.fprint import fprint
+from FUNCTIONS.pipeline import PipelineStage, run_pipeline
+from FUNCTIONS.fingerprint import compute_config_digest, compute_video_fingerprint, has_pending_work
+from CONFIG.config_loader import PipelineStageWorkers
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
@@ -29,6 +37,25 @@ logger = setup_logger(__name__)
 
 
 
+class VideoContext(TypedDict, total=False):
+    """State of one video while it goes through the processing stages"""
+    video_id: str
+    progress_prefix: str
+    cur: Cursor
+    start: float
+    durations: dict[str, float]
+    unchanged: bool
+    unavailable: bool # Found unavailable or private by the prefetch, not downloaded
+    segments: list[tuple[float, float]] | None # SponsorBlock segments got by the prefetch, cut during the download
+    ready: bool # The file is present, the stages after the download can run
+    data: VideoInfo
+    filepath: Path
+    tag_session: TagSession | None # Opened by the first stage editing tags, saved once by the metadata stage
+    failed: bool # A stage raised (pipeline, where the next stages still run), the video isn't fingerprinted
+
+
+
+
 def process_all(
     download_path: Path,
     playlist_video_file: Path,
@@ -66,6 +93,19 @@ def process_all(
     add_folder_files_not_in_list: bool,
     force_mp3_presence: bool,
 
+    workers: int,
+    pipeline: bool,
+    pipeline_queue_size: int,
+    pipeline_stage_workers: PipelineStageWorkers,
+    download_workers: int,
+    prefetch_workers: int,
+
+    use_fingerprints: bool,
+    scan_workers: int,
+    integrity_mode: Literal["verify", "repair"],
+    metadata_format: Literal["json", "zlib"],
+    metadata_exclude_rebuildable: bool,
+
     cur: Cursor,
     conn: Connection
 ) -> dict[str,float | None]:
@@ -80,7 +120,11 @@ def process_all(
     # Initialise the database if not (create it)
     init_db(cur=cur, conn=conn)
 
-    ids_present_in_down_dir: VideoInfoMap = extract_and_clean_video_ids(download_path, info=info,test_run=test_run, remove=remove_malformatted, force_mp3_presence=force_mp3_presence)
+    ids_present_in_down_dir: VideoInfoMap = extract_and_clean_video_ids(download_path, info=info,test_run=test_run, remove=remove_malformatted, force_mp3_presence=force_mp3_presence, scan_workers=scan_workers, cur=cur, conn=conn)
+    init_library_index(ids_present_in_down_dir=ids_present_in_down_dir, cur=cur, conn=conn)
+
+    # Every step below reads the videos through the identity map, filled here in 3 queries
+    _ = preload_videos(cur=cur)
 
     include_not_status0: bool = retry_private or retry_unavailable
 
@@ -104,42 +148,127 @@ def process_all(
             info=info,
             error=error,
             cur=cur,
+            conn=conn,
             test_run=test_run
         )
 
 
     video_ids: list[str] = get_videos_in_list(include_not_status0, cur)
 
+
+    # Options that change what the stages produce: a change invalidates every fingerprint
+    config_digest: str = compute_config_digest(flags={
+        "use_sponsorblock": use_sponsorblock,
+        "sponsorblock_categories": sorted(sponsorblock_categories),
+        "get_lyrics": get_lyrics,
+        "get_thumbnail": get_thumbnail,
+        "thumbnail_format": thumbnail_format,
+        "embed_metadata": embed_metadata,
+        "metadata_format": metadata_format,
+        "metadata_exclude_rebuildable": metadata_exclude_rebuildable,
+        "add_tags": add_tags,
+        "add_album": add_album,
+        "tag_format": [sep, start_def, end_def, tag_sep],
+    })
+
+    # Tags and album are computed from the pattern files (part of the digest), so forcing them
+    # still allows skipping; the other recomputes depend on the network and must run
+    skip_unchanged: bool = use_fingerprints and not test_run and not (
+        force_recompute_lyrics or force_recompute_thumbnails or force_recompute_yt_info
+    )
+
     avg_times: list[float] = []
     eta_str: str = 'N/A'
     total_videos: int = len(video_ids)
     progress_count: int = 1
+    progress_lock: threading.Lock = threading.Lock()
+    loop_start: float = time.time() # Set again when the videos start being processed
 
 
-    calculating_duration: float = 0.0
-    download_duration: float = 0.0
-    cut_duration:  float = 0.0
-    lyrics_duration: float = 0.0
-    thumbnail_duration: float = 0.0
-    tag_duration: float = 0.0
-    album_duration: float = 0.0
-    metadata_duration: float = 0.0
-
-
+    durations: dict[str, float] = {
+        "calculating_duration": 0.0,
+        "download_duration": 0.0,
+        "cut_duration": 0.0,
+        "lyrics_duration": 0.0,
+        "thumbnail_duration": 0.0,
+        "tag_duration": 0.0,
+        "album_duration": 0.0,
+        "metadata_duration": 0.0,
+    }
 
 
-    if info: print(f"[PROCESSING] Processing {total_videos} videos...")
-    logger.info(f"[PROCESSING] Processing {total_videos} videos...")
 
 
-    for video_id in video_ids:
+    def new_video_context(video_id: str, progress_prefix: str, video_cur: Cursor) -> VideoContext:
+        return {
+            "video_id": video_id,
+            "progress_prefix": progress_prefix,
+            "cur": video_cur,
+            "start": time.time(),
+            "durations": {key: 0.0 for key in durations},
+            "unchanged": False,
+            "unavailable": False,
+            "segments": None,
+            "ready": False,
+            "failed": False,
+        }
 
-        start_processing: float = time.time()
 
-        progress_prefix = f"{progress_count:{len(str(total_videos))}d}/{total_videos} | {eta_str} | "
 
 
+    # --- Stages, each one works on the VideoContext of a single video ---
 
+    def prefetch_stage(ctx: VideoContext) -> None:
+        """
+        Fetch the youtube infos of a video to download while the previous ones download,
+        so its download doesn't wait for them, and unavailable videos never reach it.
+        Its SponsorBlock segments are also fetched, to be cut by the transcode of the download.
+        """
+        start_prefetch: float = time.time()
+        ctx["unavailable"] = not prefetch_video_info(
+            download_path=download_path,
+            video_id=ctx["video_id"],
+            retry_unavailable=retry_unavailable,
+            retry_private=retry_private,
+            progress_prefix=ctx["progress_prefix"],
+            info=info,
+            cur=ctx["cur"],
+            conn=conn
+        )
+        if use_sponsorblock and not test_run and not ctx["unavailable"]:
+            ctx["segments"] = get_segments_for_download(
+                video_id=ctx["video_id"],
+                download_path=download_path,
+                categories=sponsorblock_categories,
+                cur=ctx["cur"]
+            )
+        ctx["durations"]["download_duration"] += time.time() - start_prefetch
+
+
+
+    def download_stage(ctx: VideoContext) -> None:
+        """
+        Check the file, download it if needed, re-fetch youtube info if asked,
+        and mark the context as ready when the file is present.
+        """
+        video_id: str = ctx["video_id"]
+        progress_prefix: str = ctx["progress_prefix"]
+        video_cur: Cursor = ctx["cur"]
+
+        if skip_unchanged:
+            start_checking: float = time.time()
+            stored: VideoInfo = get_video_info_from_db(video_id=video_id, cur=video_cur)
+            stored_fingerprint: str | None = stored.get("fingerprint")
+            stored_filename: str | None = stored.get("filename")
+
+            if stored_fingerprint and stored_filename:
+                if compute_video_fingerprint(data=stored, filepath=download_path / stored_filename, config_digest=config_digest) == stored_fingerprint:
+                    if info: fprint(progress_prefix, "Unchanged since last run, skipping ?", stored.get("title", video_id))
+                    logger.debug(f"[Process All] Fingerprint unchanged for '{video_id}', skipping all stages")
+                    ctx["unchanged"] = True
+                    ctx["durations"]["calculating_duration"] += time.time() - start_checking
+                    return
+            ctx["durations"]["calculating_duration"] += time.time() - start_checking
 
         need_download, checking_duration = check_file_integrity_for_video(
             video_id=video_id,
@@ -147,28 +276,34 @@ def process_all(
             ids_present_in_down_dir=ids_present_in_down_dir,
             retry_unavailable=retry_unavailable,
             retry_private=retry_private,
-            cur=cur,
+            integrity_mode=integrity_mode,
+            cur=video_cur,
             conn=conn,
             test_run=test_run
         )
-        calculating_duration += checking_duration
+        ctx["durations"]["calculating_duration"] += checking_duration
+
 
+        if need_download and ctx["unavailable"]:
+            logger.debug(f"[Process All] '{video_id}' found unavailable by the prefetch, not downloading it")
 
-        if need_download:
-            download_duration += download_video(
+        elif need_download:
+            ctx["durations"]["download_duration"] += download_video(
                 download_path=download_path,
                 video_id=video_id,
                 retry_unavailable=retry_unavailable,
                 retry_private=retry_private,
                 progress_prefix=progress_prefix,
                 info=info,
-                cur=cur,
+                integrity_mode=integrity_mode,
+                cur=video_cur,
                 conn=conn,
-                test_run=test_run
+                test_run=test_run,
+                segments=ctx["segments"]
             )
 
 
-        data: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur)
+        data: VideoInfo = get_video_info_from_db(video_id=video_id, cur=video_cur)
 
         recompute_yt_info: bool | None = data.get("recompute_yt_info")
 
@@ -178,190 +313,386 @@ def process_all(
             state, new_info = safe_extract_info(id_or_url=video_id)
 
             if state == 0:
-                data.update(new_info)
-                data["recompute_yt_info"] = False
-                update_video_db(video_id=video_id, update_fields=data, cur=cur, conn=conn)
+                # Written through the identity map, `data` gets the new values
+                update_video_db(video_id=video_id, update_fields=new_info | {"recompute_yt_info": False}, cur=video_cur, conn=conn)
                 fprint(progress_prefix,f"Sucessfully fetched and updated new data from Youtube for '{video_id}'")
                 logger.info(f"[Process] Sucessfully fetched and updated  new data from Youtube for '{video_id}'")
             else:
                 logger.warning(f"[Process] Error while re-fetching data from yt for '{video_id}', no new data")
 
 
-
-
         filename: str | None = data.get("filename")
         filepath: Path | None = download_path / filename if filename else None
-        removed_segments_int: int = data.get("removed_segments_int",0)
-        removed_segments_duration: float = data.get("removed_segments_duration",0.0)
-
-
 
         if filepath is None or not filepath.exists():
             if info: fprint(progress_prefix, f"Missing filename, title or file not found for '{video_id}', skipping rest of processing")
             logger.debug(f"[Process All] Missing filename, title or file not found for '{video_id}', skipping rest of processing")
-            progress_count += 1
-            continue
+            return
 
-        title: str = data.get("title", "")
-        uploader: str = data.get("uploader", "")
+        ctx["data"] = data
+        ctx["filepath"] = filepath
+        ctx["ready"] = True
 
-        try_lyrics_if_not: bool = data.get("try_lyrics_if_not", False)
-        remove_lyrics: bool = data.get("remove_lyrics", False)
-        lyrics_retries: int = data.get("lyrics_retries",0)
-        subtitles: str | None = data.get("subtitles")
-        auto_subs: str | None = data.get("auto_subs")
-        skips: list[tuple[float, float]] | None = data.get("skips")
-        duration: int | None = data.get("duration", 0)
-        remix_of: str | None = data.get("remix_of")
 
-        update_thumbnail: bool = bool(data.get("update_thumbnail", False))
-        remove_thumbnail: bool = bool(data.get("remove_thumbnail", False))
-        thumbnail_url: str = data.get("thumbnail_url", "")
 
-        existing_tags: set[str] = data.get("existing_tags", set[str])
+    def sponsorblock_stage(ctx: VideoContext) -> None:
+        if not use_sponsorblock or not ctx["ready"]:
+            return
+        data: VideoInfo = ctx["data"]
 
-        recompute_tags = data.get("recompute_tags") or force_recompute_tags
-        recompute_album = data.get("recompute_tags") or force_recompute_album
+        ctx["durations"]["cut_duration"] += remove_sponsorblock_segments_for_video(
+            video_id=ctx["video_id"],
+            title=data.get("title", ""),
+            filepath=ctx["filepath"],
+            removed_segments_int=data.get("removed_segments_int",0),
+            removed_segments_duration=data.get("removed_segments_duration",0.0),
+            cur=ctx["cur"],
+            conn=conn,
+            progress_prefix=ctx["progress_prefix"],
+            categories=sponsorblock_categories,
+            info=info,
+            test_run=test_run
+        )
 
 
 
+    def lyrics_stage(ctx: VideoContext) -> None:
+        if not get_lyrics or not ctx["ready"]:
+            return
+        # The subtitles are loaded by process_lyrics_for_video, only if it uses them
+        data: VideoInfo = ctx["data"]
 
-        if use_sponsorblock:
-            cut_duration += remove_sponsorblock_segments_for_video(
-                video_id=video_id,
-                title=title,
-                filepath=filepath,
-                removed_segments_int=removed_segments_int,
-                removed_segments_duration=removed_segments_duration,
-                cur=cur,
-                conn=conn,
-                progress_prefix=progress_prefix,
-                categories=sponsorblock_categories,
-                info=info,
-                test_run=test_run
-            )
+        ctx["durations"]["lyrics_duration"] += process_lyrics_for_video(
+            uploader=data.get("uploader", ""),
+            try_lyrics_if_not=data.get("try_lyrics_if_not", False),
+            remove_lyrics=data.get("remove_lyrics", False),
+            lyrics_retries=data.get("lyrics_retries",0),
+            title=data.get("title", ""),
 
+            skips=data.get("skips"),
+            duration=data.get("duration", 0),
+            remix_of=data.get("remix_of"),
+            video_id=ctx["video_id"],
+            filepath=ctx["filepath"],
+            progress_prefix=ctx["progress_prefix"],
+            info=info,
+            error=error,
+            cur=ctx["cur"],
+            conn=conn,
+            test_run=test_run,
+            recompute_lyrics=force_recompute_lyrics
+        )
 
-        if get_lyrics:
-            lyrics_duration += process_lyrics_for_video(
-                uploader=uploader,
-                try_lyrics_if_not=try_lyrics_if_not,
-                remove_lyrics=remove_lyrics,
-                lyrics_retries=lyrics_retries,
-                title=title,
 
-                subtitles=subtitles,
-                auto_subs=auto_subs,
 
-                skips=skips,
-                duration=duration,
-                remix_of=remix_of,
-                video_id=video_id,
-                filepath=filepath,
-                progress_prefix=progress_prefix,
-                info=info,
-                error=error,
-                cur=cur,
-                conn=conn,
-                test_run=test_run,
-                recompute_lyrics=force_recompute_lyrics
-            )
+    def tag_session_of(ctx: VideoContext) -> TagSession | None:
+        """
+        The tag session of the video, opened on first use: after the cut,
+        which replaces the file, so every tag edit goes through one load.
+        """
+        if "tag_session" not in ctx:
+            ctx["tag_session"] = open_tag_session(ctx["filepath"])
+        return ctx["tag_session"]
 
 
-        if get_thumbnail:
-            thumbnail_duration += process_thumbnail_for_video(
-                video_id=video_id,
-                title=title,
-                update_thumbnail=update_thumbnail,
-                remove_thumbnail=remove_thumbnail,
-                thumbnail_url=thumbnail_url,
-                filepath=filepath,
-                thumbnail_format=thumbnail_format,
-                progress_prefix=progress_prefix,
-                info=info,
-                error=error,
-                cur=cur,
-                conn=conn,
-                test_run=test_run,
-                force_recompute_thumbnails=force_recompute_thumbnails
-            )
 
+    def thumbnail_stage(ctx: VideoContext) -> None:
+        if not get_thumbnail or not ctx["ready"]:
+            return
+        data: VideoInfo = ctx["data"]
+
+        ctx["durations"]["thumbnail_duration"] += process_thumbnail_for_video(
+            video_id=ctx["video_id"],
+            title=data.get("title", ""),
+            update_thumbnail=bool(data.get("update_thumbnail", False)),
+            remove_thumbnail=bool(data.get("remove_thumbnail", False)),
+            thumbnail_url=data.get("thumbnail_url", ""),
+            filepath=ctx["filepath"],
+            thumbnail_format=thumbnail_format,
+            progress_prefix=ctx["progress_prefix"],
+            info=info,
+            error=error,
+            cur=ctx["cur"],
+            conn=conn,
+            test_run=test_run,
+            force_recompute_thumbnails=force_recompute_thumbnails,
+            tag_session=tag_session_of(ctx)
+        )
+
+
+
+    def tags_stage(ctx: VideoContext) -> None:
+        """Tags and album"""
+        if not ctx["ready"]:
+            return
+        data: VideoInfo = ctx["data"]
+        title: str = data.get("title", "")
+        uploader: str = data.get("uploader", "")
+
+        existing_tags: set[str] = data.get("existing_tags", set[str])
+
+        recompute_tags = data.get("recompute_tags") or force_recompute_tags
+        recompute_album = data.get("recompute_tags") or force_recompute_album
 
         if add_tags:
-            calculating_duration += process_tags_for_video(
-                video_id=video_id,
+            ctx["durations"]["calculating_duration"] += process_tags_for_video(
+                video_id=ctx["video_id"],
                 title=title,
                 uploader=uploader,
                 existing_tags=existing_tags,
 
-                filepath=filepath,
-                progress_prefix=progress_prefix,
+                filepath=ctx["filepath"],
+                progress_prefix=ctx["progress_prefix"],
                 info=info,
                 error=error,
-                cur=cur,
+                cur=ctx["cur"],
                 conn=conn,
                 test_run=test_run,
                 recompute_tags=recompute_tags,
                 sep=sep,
                 start_def=start_def,
                 end_def=end_def,
-                tag_sep=tag_sep
+                tag_sep=tag_sep,
+                tag_session=tag_session_of(ctx)
             )
 
 
         if add_album:
-            calculating_duration += process_album_for_video(
+            ctx["durations"]["calculating_duration"] += process_album_for_video(
                 uploader=uploader,
                 title=title,
-                filepath=filepath,
-                progress_prefix=progress_prefix,
+                filepath=ctx["filepath"],
+                progress_prefix=ctx["progress_prefix"],
                 recompute_album=recompute_album,
                 info=info,
                 error=error,
                 test_run=test_run,
+                tag_session=tag_session_of(ctx)
             )
 
-        unchanged: bool = False
+
+
+    def save_tag_session(ctx: VideoContext) -> bool:
+        """
+        Write all the tag edits of the video at once, returns False if the save failed.
+        Also run after a failed stage, so the edits queued by the stages before it are not lost
+        while their database updates are kept. Nothing is written again once saved.
+        """
+        tag_session: TagSession | None = ctx.get("tag_session")
+        if tag_session is None:
+            return True
+        start_saving: float = time.time()
+        saved: bool = tag_session.save(test_run=test_run)
+        if not saved:
+            if error: print(f"\n[Process All] Failed to save the tags of '{ctx['filepath'].name}'")
+        ctx["durations"]["metadata_duration"] += time.time() - start_saving
+        return saved
+
+
+
+    def metadata_stage(ctx: VideoContext) -> None:
+        """Embed metadata, then store its digest and the fingerprint of the final state once the tags are saved"""
+        if not ctx["ready"]:
+            return
+
+        digest: str | None = None
         if embed_metadata:
-            metadata_time, unchanged = embed_metadata_for_video(
-                video_id=video_id,
-                filepath=filepath,
-                progress_prefix=progress_prefix,
-                cur=cur,
+            metadata_time, unchanged, digest = embed_metadata_for_video(
+                video_id=ctx["video_id"],
+                filepath=ctx["filepath"],
+                progress_prefix=ctx["progress_prefix"],
+                cur=ctx["cur"],
                 info=info,
                 error=error,
-                test_run=test_run
+                test_run=test_run,
+                metadata_format=metadata_format,
+                exclude_rebuildable=metadata_exclude_rebuildable,
+                tag_session=tag_session_of(ctx)
+            )
+            ctx["durations"]["metadata_duration"] += metadata_time
+            ctx["unchanged"] = unchanged
+
+        # Before fingerprinting the file
+        saved: bool = save_tag_session(ctx)
+
+        # The digest says the payload is in the file: only true once the session is written
+        if digest is not None and not test_run:
+            update_video_db(video_id=ctx["video_id"], update_fields={"metadata_digest": digest if saved else ""}, cur=ctx["cur"], conn=conn)
+
+        if use_fingerprints and not test_run:
+            start_fingerprint: float = time.time()
+            final_data: VideoInfo = get_video_info_from_db(video_id=ctx["video_id"], cur=ctx["cur"])
+            fingerprint: str | None = None
+            # Unsaved tags or a failed stage are pending work too: no fingerprint, the video is processed again next run
+            if saved and not ctx["failed"] and not has_pending_work(data=final_data, filepath=ctx["filepath"], use_sponsorblock=use_sponsorblock, get_lyrics=get_lyrics, get_thumbnail=get_thumbnail):
+                fingerprint = compute_video_fingerprint(data=final_data, filepath=ctx["filepath"], config_digest=config_digest)
+
+            if (fingerprint or "") != final_data.get("fingerprint", ""):
+                update_video_db(video_id=ctx["video_id"], update_fields={"fingerprint": fingerprint or ""}, cur=ctx["cur"], conn=conn)
+            ctx["durations"]["calculating_duration"] += time.time() - start_fingerprint
+
+
+
+    stages: list[PipelineStage[VideoContext]] = [
+        {"name": "prefetch", "function": prefetch_stage, "workers": prefetch_workers},
+        {"name": "download", "function": download_stage, "workers": pipeline_stage_workers["download"]},
+        {"name": "sponsorblock", "function": sponsorblock_stage, "workers": pipeline_stage_workers["sponsorblock"]},
+        {"name": "lyrics", "function": lyrics_stage, "workers": pipeline_stage_workers["lyrics"]},
+        {"name": "thumbnail", "function": thumbnail_stage, "workers": pipeline_stage_workers["thumbnail"]},
+        {"name": "tags", "function": tags_stage, "workers": pipeline_stage_workers["tags"]},
+        {"name": "metadata", "function": metadata_stage, "workers": pipeline_stage_workers["metadata"]},
+    ]
+
+
+
+    def process_video(ctx: VideoContext) -> None:
+        """
+        Run every processing stage for a single video, one after the other,
+        then write its updates to the database.
+        """
+        try:
+            for stage in stages:
+                stage["function"](ctx)
+        finally:
+            _ = save_tag_session(ctx)
+            flush_video_db(cur=ctx["cur"], conn=conn, video_id=ctx["video_id"])
+
+
+
+
+    def record_video(ctx: VideoContext) -> None:
+        """
+        Add the durations of a processed video to the totals and update the progress / ETA.
+        """
+        nonlocal progress_count, eta_str
+
+        with progress_lock:
+            for key, value in ctx["durations"].items():
+                durations[key] += value
+
+            progress_count += 1
+            if info:
+                if OVERWRITE_UNCHANGED and ctx["unchanged"]: print("\r\033[F")
+                else: print()
+
+            avg_times.append(time.time() - ctx["start"])
+            if len(avg_times) > 5:
+                _ = avg_times.pop(0)
+
+            remaining: int = total_videos - progress_count + 1
+            if pipeline or overlap_downloads or workers > 1:
+                # Several videos in progress at once, their own times include the waits in the queues:
+                # the ETA comes from the rate at which they complete
+                eta_seconds: int = round((time.time() - loop_start) / (progress_count - 1) * remaining)
+            else:
+                eta_seconds = round((sum(avg_times) / len(avg_times)) * remaining)
+            eta_str = str(timedelta(seconds=eta_seconds))
+
+
+
+
+    # Without workers nor pipeline, infos are prefetched `prefetch_workers` at a time and downloads
+    # run `download_workers` at a time, ahead of the other stages which keep processing the videos one by one
+    overlap_downloads: bool = not pipeline and workers <= 1 and (download_workers > 1 or prefetch_workers > 1)
+    overlap_workers: dict[str, int] = {"prefetch": prefetch_workers, "download": download_workers}
+    pipeline_stages: list[PipelineStage[VideoContext]] = stages if pipeline else [
+        {**stage, "workers": overlap_workers.get(stage["name"], 1)} for stage in stages
+    ]
+
+    # Long-lived yt-dlp instances, shared by every download and info fetch of the run
+    configure_download_pools(download_workers=download_workers, prefetch_workers=prefetch_workers)
+
+
+    if info: print(f"[PROCESSING] Processing {total_videos} videos{' as a pipeline' if pipeline else f' with {workers} workers' if workers > 1 else ''}...")
+    logger.info(f"[PROCESSING] Processing {total_videos} videos {'as a pipeline' if pipeline else f'with {workers} worker(s)'}, {download_workers} download(s) at once...")
+
+
+    # On an exception (or Ctrl-C) too, the pending updates are flushed and committed before leaving
+    loop_start = time.time()
+    try:
+        if pipeline or overlap_downloads:
+            # Each video gets its own cursor, handed from stage to stage; sql_requests serializes them via DB_LOCK
+            def pipeline_items() -> Iterator[VideoContext]:
+                for index, video_id in enumerate(video_ids, start=1):
+                    progress_prefix = f"{index:{len(str(total_videos))}d}/{total_videos} | {eta_str} | "
+                    with DB_LOCK:
+                        video_cur: Cursor = conn.cursor()
+                    yield new_video_context(video_id=video_id, progress_prefix=progress_prefix, video_cur=video_cur)
+
+            def pipeline_failed(ctx: VideoContext, stage_name: str) -> None:
+                ctx["failed"] = True
+                if error: print(f"\n[Process All] Stage '{stage_name}' failed on '{ctx['video_id']}'")
+
+            def pipeline_done(ctx: VideoContext) -> None:
+                _ = save_tag_session(ctx) # In case the metadata stage failed before saving
+                with DB_LOCK:
+                    flush_video_db(cur=ctx["cur"], conn=conn, video_id=ctx["video_id"])
+                    ctx["cur"].close()
+                record_video(ctx)
+
+            run_pipeline(
+                items=pipeline_items(),
+                stages=pipeline_stages,
+                queue_size=pipeline_queue_size,
+                on_done=pipeline_done,
+                on_error=pipeline_failed
             )
-            metadata_duration += metadata_time
 
 
+        elif workers <= 1:
+            for video_id in video_ids:
+
+                progress_prefix = f"{progress_count:{len(str(total_videos))}d}/{total_videos} | {eta_str} | "
+
+                ctx: VideoContext = new_video_context(video_id=video_id, progress_prefix=progress_prefix, video_cur=cur)
+                process_video(ctx)
+                record_video(ctx)
+
+        else:
+            # sqlite3 cursors can't be shared between threads: each task gets its own
+            # cursor on the shared connection, and sql_requests serializes them via DB_LOCK
+            def run_worker(video_id: str, index: int) -> None:
+                progress_prefix = f"{index:{len(str(total_videos))}d}/{total_videos} | {eta_str} | "
+
+                with DB_LOCK:
+                    video_cur: Cursor = conn.cursor()
+                ctx: VideoContext = new_video_context(video_id=video_id, progress_prefix=progress_prefix, video_cur=video_cur)
+                try:
+                    process_video(ctx)
+                except Exception as e:
+                    logger.error(f"[Process All] Worker failed on '{video_id}': {e}")
+                    if error: print(f"\n[Process All] Worker failed on '{video_id}': {e}")
+                finally:
+                    with DB_LOCK:
+                        video_cur.close()
+
+                record_video(ctx)
 
 
-        progress_count += 1
-        if info:
-            if OVERWRITE_UNCHANGED and unchanged: print("\r\033[F")
-            else: print()
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="video") as executor:
+                futures = [executor.submit(run_worker, video_id, index) for index, video_id in enumerate(video_ids, start=1)]
+                for future in as_completed(futures):
+                    future.result()
 
-        avg_times.append(time.time() - start_processing)
-        if len(avg_times) > 5:
-            _ = avg_times.pop(0)
+    finally:
+        close_download_pools()
 
-        eta_seconds: int =round((sum(avg_times) / len(avg_times)) * (total_videos - progress_count + 1))
-        eta_str = str(timedelta(seconds=eta_seconds))
+        if info: print()
 
-    if info: print()
+        # Whatever is still pending (videos read but not processed, failed workers), committed now
+        flush_video_db(cur=cur, conn=conn, durable=True)
 
     Processing_end_time: float = time.time()
     Processing_total_time: float = Processing_end_time - Processing_start_time
 
     return {
         "total": Processing_total_time,
-        "calculating_duration": calculating_duration,
-        "download_duration": download_duration if download_duration else None,
-        "cut_duration":  cut_duration,
-        "lyrics_duration": lyrics_duration,
-        "thumbnail_duration": thumbnail_duration,
-        "tag_duration": tag_duration,
-        "album_duration": album_duration,
-        "metadata_duration": metadata_duration
+        "calculating_duration": durations["calculating_duration"],
+        "download_duration": durations["download_duration"] if durations["download_duration"] else None,
+        "cut_duration":  durations["cut_duration"],
+        "lyrics_duration": durations["lyrics_duration"],
+        "thumbnail_duration": durations["thumbnail_duration"],
+        "tag_duration": durations["tag_duration"],
+        "album_duration": durations["album_duration"],
+        "metadata_duration": durations["metadata_duration"]
     }
\ No newline at end of file
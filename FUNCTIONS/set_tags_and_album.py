@@ -2,7 +2,7 @@ from pathlib import Path
 
 
 
-from FUNCTIONS.metadata import read_id3_tag, write_id3_tag
+from FUNCTIONS.metadata import TagSession, read_id3_tag, write_id3_tag
 
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
@@ -97,11 +97,12 @@ def set_tags(
     sep: str = " ~ ",
     start_def: str = "[",
     end_def: str = "]",
-    tag_sep: str = ","
+    tag_sep: str = ",",
+    session: TagSession | None = None
 ) -> bool:
     if filepath.exists():
         tags = {tag.lower() for tag in tags if tag.isalnum()}
-        artist, state = read_id3_tag(filepath=filepath,frame_id="TPE1")
+        artist, state = read_id3_tag(filepath=filepath,frame_id="TPE1", session=session)
         if state in (0, 1):
             if isinstance(artist, list):
                 artist = artist[0]
@@ -113,7 +114,7 @@ def set_tags(
             new_artist: str = put_tags_in_str(base_text=base_text,tags=new_tags, sep=sep, start_def=start_def, end_def=end_def, tag_sep=tag_sep)
 
             if new_tags != tags_set:
-                sucess = write_id3_tag(filepath=filepath, frame_id="TPE1", data=new_artist, test_run=test_run)
+                sucess = write_id3_tag(filepath=filepath, frame_id="TPE1", data=new_artist, test_run=test_run, session=session)
                 if sucess:
                     logger.info(f"[Set Tags] Sucessfully set {len(tags)} tags into '{filepath}'")
                     return True
@@ -137,7 +138,8 @@ def set_tags(
 def set_album(
     filepath: Path,
     album: str,
-    test_run: bool = False
+    test_run: bool = False,
+    session: TagSession | None = None
 ) -> bool:
     """
     Embed album info into MP3 file and update DB flag `update_album`.
@@ -147,7 +149,7 @@ def set_album(
         logger.error(f"[set Album] Filepath doesn't exist: '{filepath}'")
         return False
 
-    success = write_id3_tag(filepath=filepath, frame_id="TALB", data=album, test_run=test_run)
+    success = write_id3_tag(filepath=filepath, frame_id="TALB", data=album, test_run=test_run, session=session)
     if success:
         logger.verbose(f"[set Album] Album set to '{album}' for '{filepath}'")
         return True
@@ -38,6 +38,22 @@ def get_skip_segments(video_id: str, categories: list[str]) -> list[tuple[float,
 
 
 
+def removed_duration(segments: list[tuple[float, float]]) -> float:
+    """Seconds removed by cutting these segments"""
+    return sum(max(0.0, end - start) for start, end in segments)
+
+
+
+def segments_audio_filter(segments: list[tuple[float, float]]) -> str:
+    """
+    ffmpeg audio filter dropping these segments, to cut them within another transcode
+    (the one of the download) instead of decoding and encoding the file again
+    """
+    conditions: str = "+".join(f"between(t,{start},{end})" for start, end in sorted(segments))
+    return f"aselect='not({conditions})',asetpts=N/SR/TB"
+
+
+
 def cut_segments_ffmpeg(input_file: Path, output_file: Path, segments: list[tuple[float, float]], test_run: bool) -> float:
 
     if not segments and not test_run:
@@ -62,7 +78,7 @@ def cut_segments_ffmpeg(input_file: Path, output_file: Path, segments: list[tupl
         )
         duration = float(probe.stdout.strip())
 
-        total_removed = sum(max(0.0, end - start) for start, end in segments)
+        total_removed = removed_duration(segments)
 
         keep_segments: list[tuple[float, float]] = []
         last_end = 0.0
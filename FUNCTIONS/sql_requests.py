@@ -1,10 +1,12 @@
 import sqlite3
+import threading
 import time
-from typing import Literal
+from typing import Literal, TypeAlias
 import json
+import zlib
 
 
-from CONSTANTS import DB_PATH
+from CONSTANTS import DB_CACHE_SIZE_KIB, DB_COMMIT_BATCH, DB_COMMIT_INTERVAL, DB_MMAP_SIZE, DB_PATH, DB_SYNCHRONOUS
 from FUNCTIONS.HELPERS.helpers import VideoInfo, VideoInfoKey, remove_data_from_video_info
 
 
@@ -12,13 +14,50 @@ from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
 
 
+# Every access to the shared connection goes through this lock, so that the
+# parallel workers of process_all serialize their reads and writes
+DB_LOCK: threading.RLock = threading.RLock()
 
+# Identity map of the run: the VideoInfo of every video read so far, and the
+# fields updated since they were last written to the database
+_video_cache: dict[str, VideoInfo] = {}
+_dirty_fields: dict[str, VideoInfo] = {}
+_texts_loaded: set[str] = set() # Videos whose VIDEO_TEXT_COLUMNS were read from video_texts
 
+# tag -> tag_id, tags are never renamed nor deleted so the ids stay valid for the run
+_tag_ids: dict[str, int] = {}
 
+# Group commit: writes not committed yet, and when the last commit happened
+_uncommitted_writes: int = 0
+_last_commit: float = time.time()
 
-def get_db_connection(create_if_not: bool = True) -> sqlite3.Connection:
+# Columns of the videos table, read once (init_db may add some)
+_video_columns: set[str] | None = None
+
+
+
+
+def _configure_connection(conn: sqlite3.Connection) -> None:
+    """
+    WAL journal (readers don't block the writer, a commit appends to the log instead of
+    rewriting pages) and the synchronous / cache / mmap settings of the config.
+    """
+    conn.row_factory = sqlite3.Row
+    journal_mode: str = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]  # pyright: ignore[reportAny]
+    if journal_mode.lower() != "wal":
+        logger.warning(f"[Get DB conn] WAL mode not available, using '{journal_mode}'")
+    _ = conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS if DB_SYNCHRONOUS in ('OFF', 'NORMAL', 'FULL') else 'FULL'}")
+    _ = conn.execute(f"PRAGMA cache_size = {-int(DB_CACHE_SIZE_KIB)}") # Negative: in KiB
+    _ = conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+
+
+
+
+def get_db_connection(create_if_not: bool = True, check_same_thread: bool = True) -> sqlite3.Connection:
     """
     Connect to the SQLite database. If the DB file does not exist, create it.
+    Pass check_same_thread=False to share the connection between worker threads
+    (every access must then hold DB_LOCK).
     """
     
     if not DB_PATH.exists():
@@ -26,21 +65,190 @@ def get_db_connection(create_if_not: bool = True) -> sqlite3.Connection:
             logger.info(f"[Get DB conn] Database file not found, creating: {DB_PATH}")
             DB_PATH.parent.mkdir(parents=True, exist_ok=True)  # ensure parent folder exists
             # This will create an empty SQLite database
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
+            conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
+            _configure_connection(conn)
             logger.debug("[Get DB conn] New database created")
             return conn
         else:
             raise FileNotFoundError (f"{DB_PATH} does not exists, stopping execution here")
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
+    _configure_connection(conn)
     logger.debug("[Get DB conn] Successfully connected")
     return conn
 
 
 
 
+# Columns that older databases may lack, with their declaration
+ADDED_VIDEO_COLUMNS: dict[str, str] = {
+    "fingerprint": "TEXT",
+    "verified_at": "REAL",
+    "metadata_digest": "TEXT",
+}
+
+
+
+# Large text columns, kept in the video_texts side table so that the videos rows stay small.
+# They are only read by get_video_info_from_db(with_texts=True), for the stages that need them.
+VIDEO_TEXT_COLUMNS: list[str] = ["description", "lyrics", "subtitles", "syncedlyrics", "auto_subs", "subtitles_track", "auto_subs_track"]
+
+# The texts are stored as zlib BLOBs starting with this marker byte when it makes them smaller.
+# Rows written before are plain TEXT and are read as is.
+TEXT_COMPRESSION_MARKER: bytes = b"Z"
+TEXT_COMPRESSION_MIN_SIZE: int = 256 # Bytes, shorter texts are kept as TEXT
+
+
+
+def compress_text(value: object) -> object:
+    """Value to store in video_texts: compressed BLOB for long strings, unchanged otherwise"""
+    if not isinstance(value, str) or len(value) < TEXT_COMPRESSION_MIN_SIZE:
+        return value
+    raw: bytes = value.encode("utf-8")
+    compressed: bytes = TEXT_COMPRESSION_MARKER + zlib.compress(raw, 6)
+    return compressed if len(compressed) < len(raw) else value
+
+
+
+def decompress_text(value: object) -> object:
+    """Reverse of compress_text, plain TEXT values are returned as they are"""
+    if isinstance(value, bytes) and value.startswith(TEXT_COMPRESSION_MARKER):
+        return zlib.decompress(value[len(TEXT_COMPRESSION_MARKER):]).decode("utf-8")
+    return value
+
+
+
+# Written to their own tables instead of the videos row
+EXCLUDE_FOR_MAIN: set[str] = {"skips", "tags", *VIDEO_TEXT_COLUMNS}
+
+# Texts fetched from a track: cleared when the track (url or language) changes, to be fetched again from it
+TEXTS_OF_TRACKS: dict[str, str] = {"subtitles_track": "subtitles", "auto_subs_track": "auto_subs"}
+
+
+
+# Schema upgrades: the statements of version N are run once on databases whose
+# user_version is below N, in order, in one transaction with the new user_version.
+# Append new versions, never edit the existing ones.
+SCHEMA_MIGRATIONS: list[list[str]] = [
+    # 1: secondary indexes, covering the filters and sorts of the run
+    [
+        "CREATE INDEX IF NOT EXISTS idx_videos_status_date_added ON videos (status, date_added, video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_videos_date_added ON videos (date_added, video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_video_tags_tag_id ON video_tags (tag_id, video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_removed_segments_video_id ON removed_segments (video_id, segment_start, segment_end)",
+    ],
+    # 2: large texts moved out of the videos rows (the old columns are left empty)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS video_texts (
+            video_id TEXT PRIMARY KEY,
+            description TEXT,
+            lyrics TEXT,
+            subtitles TEXT,
+            syncedlyrics TEXT,
+            auto_subs TEXT,
+            FOREIGN KEY(video_id) REFERENCES videos(video_id) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO video_texts (video_id, description, lyrics, subtitles, syncedlyrics, auto_subs)
+        SELECT video_id, description, lyrics, subtitles, syncedlyrics, auto_subs FROM videos
+        WHERE COALESCE(description, lyrics, subtitles, syncedlyrics, auto_subs) IS NOT NULL
+        """,
+        "UPDATE videos SET description = NULL, lyrics = NULL, subtitles = NULL, syncedlyrics = NULL, auto_subs = NULL",
+    ],
+    # 3: subtitle tracks found at extraction, their content is fetched when the lyrics need it
+    [
+        "ALTER TABLE video_texts ADD COLUMN subtitles_track TEXT",
+        "ALTER TABLE video_texts ADD COLUMN auto_subs_track TEXT",
+    ],
+]
+SCHEMA_VERSION: int = len(SCHEMA_MIGRATIONS)
+
+
+
+def _migrate_schema(cur: sqlite3.Cursor, conn: sqlite3.Connection) -> None:
+    """
+    Bring the database to SCHEMA_VERSION (stored in PRAGMA user_version),
+    then refresh the planner statistics with ANALYZE.
+    Each version is one transaction, its DDL included: a version interrupted
+    midway is rolled back and run again from its start by the next run.
+    """
+    _ = cur.execute("PRAGMA user_version")
+    version: int = cur.fetchone()[0]  # pyright: ignore[reportAny]
+    if version >= SCHEMA_VERSION:
+        return
+
+    if conn.in_transaction:
+        conn.commit()
+    for number, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+        # Explicit, as sqlite3 doesn't open a transaction before DDL statements
+        _ = cur.execute("BEGIN")
+        try:
+            for statement in statements:
+                _ = cur.execute(statement)
+            _ = cur.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"[Init DB] Failed to upgrade the schema to version {number}: {e}")
+            raise
+        logger.info(f"[Init DB] Upgraded the schema to version {number}")
+
+    _ = cur.execute("ANALYZE")
+    conn.commit()
+    logger.debug("[Init DB] Analyzed the database")
+
+
+
+
+def _add_missing_columns(table: str, columns: dict[str, str], cur: sqlite3.Cursor) -> None:
+    """Add to an existing table the columns it doesn't have yet"""
+    _ = cur.execute(f"PRAGMA table_info({table})")
+    existing_columns: set[str] = {row["name"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+
+    for name, declaration in columns.items():
+        if name not in existing_columns:
+            _ = cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+            logger.info(f"[Init DB] Added missing column '{name}' to '{table}'")
+
+
+
+
+def get_video_columns(cur: sqlite3.Cursor) -> set[str]:
+    """Columns of the videos table, read with PRAGMA table_info on first use only"""
+    global _video_columns
+    with DB_LOCK:
+        if _video_columns is None:
+            _ = cur.execute("PRAGMA table_info(videos)")
+            _video_columns = {row["name"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+        return _video_columns
+
+
+
+def commit_db(conn: sqlite3.Connection, force: bool = False) -> None:
+    """
+    Group commit: count a finished write, and commit once DB_COMMIT_BATCH writes were made
+    or DB_COMMIT_INTERVAL seconds passed since the last commit.
+    `force` commits right away, for the writes that must not be lost and at the end of the run.
+    Without synchronous FULL, a forced commit is also checkpointed, as the WAL isn't synced on commit.
+    Writes lost by a crash are made again by the next run, as the files are checked again.
+    """
+    global _uncommitted_writes, _last_commit
+    with DB_LOCK:
+        _uncommitted_writes += 1
+        if not force and _uncommitted_writes < DB_COMMIT_BATCH and time.time() - _last_commit < DB_COMMIT_INTERVAL:
+            return
+        conn.commit()
+        if force and DB_SYNCHRONOUS != "FULL":
+            _ = conn.execute("PRAGMA wal_checkpoint(FULL)")
+        logger.verbose(f"[Commit] Committed {_uncommitted_writes} writes")
+        _uncommitted_writes = 0
+        _last_commit = time.time()
+
+
+
+
 def init_db(cur: sqlite3.Cursor, conn: sqlite3.Connection):
 
 
@@ -87,12 +295,21 @@ def init_db(cur: sqlite3.Cursor, conn: sqlite3.Connection):
         status INTEGER NOT NULL CHECK (status in (0,1,2,3)) DEFAULT (3),
         reason TEXT,
 
+        fingerprint TEXT,
+        verified_at REAL,
+        metadata_digest TEXT,
+
         date_added REAL DEFAULT ((julianday('now') - 2440587.5) * 86400.0),
         date_modified REAL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
     )
     """)
     logger.debug("[Init DB] Initialized videos")
 
+    # Columns added after the table was first created
+    _add_missing_columns(table="videos", columns=ADDED_VIDEO_COLUMNS, cur=cur)
+    global _video_columns
+    _video_columns = None
+
 
 
 
@@ -133,8 +350,26 @@ def init_db(cur: sqlite3.Cursor, conn: sqlite3.Connection):
     """)
     logger.debug("[Init DB] Initialized video_tags")
 
+
+
+
+    _ = cur.execute("""
+    CREATE TABLE IF NOT EXISTS scan_cache (
+        filename TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        state INTEGER NOT NULL,
+        data TEXT
+    )
+    """)
+    logger.debug("[Init DB] Initialized scan_cache")
+
     conn.commit()
 
+    _migrate_schema(cur=cur, conn=conn)
+
+
 
 
 
@@ -142,27 +377,62 @@ def init_db(cur: sqlite3.Cursor, conn: sqlite3.Connection):
 
 
 
+def _get_tag_ids(tags: set[str], cur: sqlite3.Cursor) -> dict[str, int]:
+    """
+    tag -> tag_id for these tags, creating the missing ones.
+    The ids are kept in _tag_ids, the tags table is only read again when new tags appear.
+    """
+    missing: set[str] = tags - _tag_ids.keys()
+    if missing:
+        _ = cur.executemany("INSERT OR IGNORE INTO tags (tag) VALUES (?)", [(tag,) for tag in sorted(missing)])
+        # The tags table is small, reading it whole avoids one SELECT per new tag
+        _ = cur.execute("SELECT tag, tag_id FROM tags")
+        _tag_ids.update({row["tag"]: row["tag_id"] for row in cur.fetchall()})  # pyright: ignore[reportAny]
+
+    return {tag: _tag_ids[tag] for tag in tags}
 
-def _apply_skips_and_tags(video_id: str, data: VideoInfo, cur: sqlite3.Cursor) -> None:
+
+
+def _apply_skips_and_tags(videos: list[tuple[str, VideoInfo]], cur: sqlite3.Cursor) -> None:
+    """Replace the removed segments and tags of these videos (the ones they carry), with one executemany per table"""
     # --- Skips ---
-    if "skips" in data:
-        _ = cur.execute("DELETE FROM removed_segments WHERE video_id = ?", (video_id,))
-        for start, end in data["skips"]:
-            _ = cur.execute(
-                "INSERT INTO removed_segments (video_id, segment_start, segment_end) VALUES (?, ?, ?)",
-                (video_id, start, end)
-            )
-        logger.debug(f"[DB] Applied {len(data['skips'])} removed_segments for '{video_id}'")
+    with_skips: list[tuple[str, VideoInfo]] = [(video_id, data) for video_id, data in videos if "skips" in data]
+    if with_skips:
+        _ = cur.executemany("DELETE FROM removed_segments WHERE video_id = ?", [(video_id,) for video_id, _ in with_skips])
+        _ = cur.executemany(
+            "INSERT INTO removed_segments (video_id, segment_start, segment_end) VALUES (?, ?, ?)",
+            [(video_id, start, end) for video_id, data in with_skips for start, end in data["skips"]]
+        )
+        logger.debug(f"[DB] Applied the removed_segments of {len(with_skips)} videos")
 
     # --- Tags ---
-    if "tags" in data:
-        _ = cur.execute("DELETE FROM video_tags WHERE video_id = ?", (video_id,))
-        for tag in data["tags"]:
-            _ = cur.execute("INSERT OR IGNORE INTO tags (tag) VALUES (?)", (tag,))
-            _ = cur.execute("SELECT tag_id FROM tags WHERE tag = ?", (tag,))
-            tag_id = cur.fetchone()[0]  # pyright: ignore[reportAny]
-            _ = cur.execute("INSERT OR IGNORE INTO video_tags (video_id, tag_id) VALUES (?, ?)", (video_id, tag_id))
-        logger.debug(f"[DB] Applied {len(data['tags'])} tags for '{video_id}'")
+    with_tags: list[tuple[str, VideoInfo]] = [(video_id, data) for video_id, data in videos if "tags" in data]
+    if with_tags:
+        tag_ids: dict[str, int] = _get_tag_ids(tags={tag for _, data in with_tags for tag in data["tags"]}, cur=cur)
+        _ = cur.executemany("DELETE FROM video_tags WHERE video_id = ?", [(video_id,) for video_id, _ in with_tags])
+        _ = cur.executemany(
+            "INSERT OR IGNORE INTO video_tags (video_id, tag_id) VALUES (?, ?)",
+            [(video_id, tag_ids[tag]) for video_id, data in with_tags for tag in data["tags"]]
+        )
+        logger.debug(f"[DB] Applied the tags of {len(with_tags)} videos")
+
+
+
+def _apply_texts(videos: list[tuple[str, VideoInfo]], cur: sqlite3.Cursor, replace: bool) -> None:
+    """
+    Write the VIDEO_TEXT_COLUMNS of these videos to video_texts, one executemany per set of columns.
+    Without `replace`, the texts of a video already in the table are left untouched.
+    """
+    upserts: dict[tuple[str, ...], list[list[object]]] = {}
+    for video_id, data in videos:
+        columns: tuple[str, ...] = tuple(column for column in VIDEO_TEXT_COLUMNS if column in data)
+        if columns:
+            upserts.setdefault(columns, []).append([video_id] + [compress_text(data[column]) for column in columns])  # pyright: ignore[reportUnknownArgumentType, reportArgumentType]
+
+    for columns, rows in upserts.items():
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        conflict: str = "DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in columns) if replace else "DO NOTHING"
+        _ = cur.executemany(f"INSERT INTO video_texts (video_id, {', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT(video_id) {conflict}", rows)
 
 
 
@@ -170,52 +440,218 @@ def _apply_skips_and_tags(video_id: str, data: VideoInfo, cur: sqlite3.Cursor) -
 
 
 def insert_video_db(video_data: VideoInfo, cur: sqlite3.Cursor, conn: sqlite3.Connection) -> None:
-    _ = cur.execute("PRAGMA table_info(videos)")
-    video_columns = {row["name"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+    with DB_LOCK:
+        video_columns = get_video_columns(cur=cur)
 
-    # Extract valid fields
-    video_row = {k: v for k, v in video_data.items() if k in video_columns and k not in {"skips", "tags"}}
-    if "video_id" not in video_row:
-        logger.error("[Insert Video] Missing 'video_id'")
-        return
+        # Extract valid fields
+        video_row = {k: v for k, v in video_data.items() if k in video_columns and k not in EXCLUDE_FOR_MAIN}
+        if "video_id" not in video_row:
+            logger.error("[Insert Video] Missing 'video_id'")
+            return
 
-    placeholders = ", ".join("?" for _ in video_row)
-    columns = ", ".join(video_row.keys())
-    sql = f"INSERT OR IGNORE INTO videos ({columns}) VALUES ({placeholders})"
-    _ = cur.execute(sql, tuple(video_row.values()))
+        placeholders = ", ".join("?" for _ in video_row)
+        columns = ", ".join(video_row.keys())
+        sql = f"INSERT OR IGNORE INTO videos ({columns}) VALUES ({placeholders})"
+        _ = cur.execute(sql, tuple(video_row.values()))
 
-    _apply_skips_and_tags(video_id=video_row["video_id"], data=video_data, cur=cur)  # pyright: ignore[reportArgumentType]
-    conn.commit()
-    logger.info(f"[Insert Video] Inserted '{video_row['video_id']}' with {len(video_row)} fields")
+        _apply_skips_and_tags(videos=[(video_row["video_id"], video_data)], cur=cur)  # pyright: ignore[reportArgumentType]
+        _apply_texts(videos=[(video_row["video_id"], video_data)], cur=cur, replace=False)  # pyright: ignore[reportArgumentType]
+        commit_db(conn=conn)
 
+        # The row may have been ignored or completed, it is loaded again on next read
+        flush_video_db(cur=cur, conn=conn, video_id=video_row["video_id"])  # pyright: ignore[reportArgumentType]
+        _ = _video_cache.pop(video_row["video_id"], None)  # pyright: ignore[reportArgumentType]
+        _texts_loaded.discard(video_row["video_id"])  # pyright: ignore[reportArgumentType]
+        logger.info(f"[Insert Video] Inserted '{video_row['video_id']}' with {len(video_row)} fields")
 
 
 
+def insert_videos_db(videos: list[VideoInfo], cur: sqlite3.Cursor, conn: sqlite3.Connection) -> int:
+    """
+    Insert many videos at once: rows with the same columns share one executemany,
+    all in a single transaction. Videos already in the database are left untouched.
+    Returns the number of rows inserted.
+    """
+    if not videos:
+        return 0
 
+    with DB_LOCK:
+        video_columns = get_video_columns(cur=cur)
 
+        inserts: dict[tuple[str, ...], list[list[object]]] = {}
+        for video_data in videos:
+            if "video_id" not in video_data:
+                logger.error("[Insert Videos] Missing 'video_id', skipped")
+                continue
+            columns: tuple[str, ...] = tuple(sorted(k for k in video_data if k in video_columns and k not in EXCLUDE_FOR_MAIN))
+            inserts.setdefault(columns, []).append([video_data[k] for k in columns])  # pyright: ignore[reportUnknownArgumentType, reportArgumentType]
 
-def update_video_db(video_id: str, update_fields: VideoInfo, cur: sqlite3.Cursor, conn: sqlite3.Connection) -> None:
-    _ = cur.execute("PRAGMA table_info(videos)")
-    video_columns = {row["name"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+        _ = cur.execute("SELECT total_changes()")
+        changes_before: int = cur.fetchone()[0]  # pyright: ignore[reportAny]
+        for columns, rows in inserts.items():
+            placeholders = ", ".join("?" for _ in columns)
+            _ = cur.executemany(f"INSERT OR IGNORE INTO videos ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        _ = cur.execute("SELECT total_changes()")
+        inserted: int = cur.fetchone()[0] - changes_before  # pyright: ignore[reportAny]
 
-    # Secutity to avoid rewriting date added
-    update_fields = remove_data_from_video_info(update_fields,["date_added","date_updated"])
+        for video_data in videos:
+            _ = _video_cache.pop(video_data.get("video_id", ""), None)
+            _texts_loaded.discard(video_data.get("video_id", ""))
+        with_ids: list[tuple[str, VideoInfo]] = [(video_data["video_id"], video_data) for video_data in videos if "video_id" in video_data]
+        _apply_skips_and_tags(videos=with_ids, cur=cur)
+        _apply_texts(videos=with_ids, cur=cur, replace=False)
 
-    # Update only valid DB fields
-    EXCLUDE_FOR_MAIN = {"skips", "tags"}
-    video_update_data = {k: v for k, v in update_fields.items() if k in video_columns and k not in EXCLUDE_FOR_MAIN}
-    
-    video_update_data["date_modified"] = time.time()
+        commit_db(conn=conn)
 
-    if video_update_data:
-        set_clause = ", ".join(f"{k} = ?" for k in video_update_data.keys())
-        values = list(video_update_data.values()) + [video_id]
-        sql = f"UPDATE videos SET {set_clause} WHERE video_id = ?"
-        _ = cur.execute(sql, values)
+    logger.info(f"[Insert Videos] Inserted {inserted} videos in {len(inserts)} statements")
+    return inserted
+
+
+
+def get_incomplete_video_ids(keys: set[str], cur: sqlite3.Cursor) -> set[str]:
+    """Ids of the videos missing (NULL or empty) at least one of these columns, in one query"""
+    with DB_LOCK:
+        columns: list[str] = sorted(key for key in keys if key in get_video_columns(cur=cur))
+        if not columns:
+            return set()
+        condition: str = " OR ".join(f"{column} IS NULL OR {column} = ''" for column in columns)
+        _ = cur.execute(f"SELECT video_id FROM videos WHERE {condition}")
+        return {row["video_id"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+
+
+
+
+
+
+
+def _is_empty(value: object) -> bool:
+    """Values that get_video_info_from_db leaves out of a VideoInfo"""
+    return value is None or value == "" or value == []
+
+
+
+def update_video_db(video_id: str, update_fields: VideoInfo, cur: sqlite3.Cursor, conn: sqlite3.Connection, flush: bool = False) -> None:
+    """
+    Apply the update to the cached VideoInfo of the video (write-through: every holder
+    of it sees the new values) and keep the fields that actually changed until the
+    next flush_video_db.
+    `flush` writes them right away, for the updates that must survive a crash
+    because the file was already modified.
+    """
+    with DB_LOCK:
+        video_info: VideoInfo = get_video_info_from_db(video_id=video_id, cur=cur)
+        if not video_info:
+            logger.debug(f"[Update Video] No entry found for video_id '{video_id}', nothing updated")
+            return
+
+        video_columns = get_video_columns(cur=cur)
+
+        # The texts must be known to tell whether they changed
+        if any(key in update_fields for key in VIDEO_TEXT_COLUMNS):
+            _load_texts(video_id=video_id, video_info=video_info, cur=cur)
+
+        # Secutity to avoid rewriting date added
+        update_fields = remove_data_from_video_info(update_fields.copy(),["date_added","date_updated","video_id"])
+
+        # Update only valid DB fields, that differ from what is already known
+        changed: VideoInfo = {}
+        for key, value in update_fields.items():
+            if key not in video_columns and key not in EXCLUDE_FOR_MAIN:
+                continue
+            current: object = video_info.get(key)
+            if current == value or (_is_empty(current) and _is_empty(value)):
+                continue
+            if key == "tags" and set(video_info.get("tags", [])) == set(update_fields.get("tags", [])):
+                continue # Same tags, in another order
+            changed[key] = value
+
+        for track_key, text_key in TEXTS_OF_TRACKS.items():
+            if track_key in changed and text_key not in update_fields and not _is_empty(video_info.get(text_key)):
+                changed[text_key] = ""
+
+        if changed:
+            changed["date_modified"] = time.time()
+            for key, value in changed.items():
+                if _is_empty(value):
+                    _ = video_info.pop(key, None)
+                else:
+                    video_info[key] = value
+
+            dirty: VideoInfo = _dirty_fields.setdefault(video_id, {})
+            dirty.update(changed)
+            logger.debug(f"[Update Video] Updated '{video_id}' with {len(changed)} fields")
+
+        if flush:
+            flush_video_db(cur=cur, conn=conn, video_id=video_id, durable=True)
+
+
+
+def flush_video_db(cur: sqlite3.Cursor, conn: sqlite3.Connection, video_id: str | None = None, durable: bool = False) -> None:
+    """
+    Write the pending updates of a video (of every video if None) to the database.
+    Updates writing the same columns share an executemany.
+    They are committed with the next group commit, or right away if `durable`.
+    """
+    with DB_LOCK:
+        video_ids: list[str] = [video_id] if video_id is not None else list(_dirty_fields)
+        pending: list[tuple[str, VideoInfo]] = [(vid, _dirty_fields.pop(vid)) for vid in video_ids if vid in _dirty_fields]
+        if not pending:
+            if durable:
+                commit_db(conn=conn, force=True)
+            return
+
+        updates: dict[tuple[str, ...], list[list[object]]] = {}
+        for vid, fields in pending:
+            columns: tuple[str, ...] = tuple(sorted(k for k in fields if k not in EXCLUDE_FOR_MAIN))
+            if columns:
+                updates.setdefault(columns, []).append([fields[k] for k in columns] + [vid])  # pyright: ignore[reportUnknownArgumentType, reportArgumentType]
+        _apply_skips_and_tags(videos=pending, cur=cur)
+        _apply_texts(videos=pending, cur=cur, replace=True)
+
+        for columns, rows in updates.items():
+            set_clause = ", ".join(f"{k} = ?" for k in columns)
+            _ = cur.executemany(f"UPDATE videos SET {set_clause} WHERE video_id = ?", rows)
+
+        commit_db(conn=conn, force=durable)
+        logger.debug(f"[Flush Videos] Wrote the pending updates of {len(pending)} videos in {len(updates)} statements")
+
+
+
+def fill_missing_texts(video_id: str, texts: VideoInfo, cur: sqlite3.Cursor, conn: sqlite3.Connection) -> None:
+    """
+    Store the VIDEO_TEXT_COLUMNS of `texts` the video doesn't have yet (NULL or empty),
+    in one upsert: the stored texts are neither read nor replaced.
+    """
+    with DB_LOCK:
+        columns: list[str] = [column for column in VIDEO_TEXT_COLUMNS if texts.get(column)]
+        if not columns:
+            return
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        fill: str = ", ".join(f"{column} = COALESCE(NULLIF({column}, ''), excluded.{column})" for column in columns)
+        missing: str = " OR ".join(f"COALESCE({column}, '') = ''" for column in columns) # Row left as it is when complete
+        _ = cur.execute(
+            f"INSERT INTO video_texts (video_id, {', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT(video_id) DO UPDATE SET {fill} WHERE {missing}",
+            [video_id] + [compress_text(texts[column]) for column in columns]  # pyright: ignore[reportLiteralTypeMismatch]
+        )
+
+        # Texts already loaded in the cache: complete them the same way
+        video_info: VideoInfo | None = _video_cache.get(video_id)
+        if video_info is not None and video_id in _texts_loaded:
+            pending: VideoInfo = _dirty_fields.get(video_id, {})
+            for column in columns:
+                if column not in pending and not video_info.get(column):
+                    video_info[column] = texts[column]  # pyright: ignore[reportLiteralTypeMismatch]
+        commit_db(conn=conn)
 
-    _apply_skips_and_tags(video_id=video_id, data=update_fields, cur=cur)
-    conn.commit()
-    logger.debug(f"[Update Video] Updated '{video_id}' with {len(video_update_data)} fields")
+
+
+
+def forget_video(video_id: str) -> None:
+    """Drop a video from the identity map, with its pending updates (its row was deleted)"""
+    with DB_LOCK:
+        _ = _video_cache.pop(video_id, None)
+        _ = _dirty_fields.pop(video_id, None)
+        _texts_loaded.discard(video_id)
 
 
 
@@ -228,14 +664,68 @@ def remove_video(video_id: str, cur: sqlite3.Cursor, conn: sqlite3.Connection) -
     Remove a video and all its related data from the database.
     Cascades take care of related rows in removed_segments and video_tags.
     """
-    _ = cur.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
-    if cur.rowcount > 0:
-        logger.info(f"[Remove Video] Successfully removed video_id '{video_id}' and related data")
-    else:
-        logger.warning(f"[Remove Video] No video found with video_id '{video_id}'")
-    conn.commit()
+    with DB_LOCK:
+        forget_video(video_id)
+        _ = cur.execute("DELETE FROM video_texts WHERE video_id = ?", (video_id,))
+        _ = cur.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+        if cur.rowcount > 0:
+            logger.info(f"[Remove Video] Successfully removed video_id '{video_id}' and related data")
+        else:
+            logger.warning(f"[Remove Video] No video found with video_id '{video_id}'")
+        commit_db(conn=conn)
+
+
+
+
+
+
 
 
+def _fill_id_set(video_ids: set[str], cur: sqlite3.Cursor) -> None:
+    """Put these ids in the TEMP table id_set, to join against it instead of one query per id"""
+    _ = cur.execute("CREATE TEMP TABLE IF NOT EXISTS id_set (video_id TEXT PRIMARY KEY)")
+    _ = cur.execute("DELETE FROM id_set")
+    _ = cur.executemany("INSERT OR IGNORE INTO id_set (video_id) VALUES (?)", [(video_id,) for video_id in video_ids])
+
+
+
+def get_filenames(video_ids: set[str], cur: sqlite3.Cursor) -> dict[str, str]:
+    """video_id -> filename of these videos (the ones without a file are left out), in one query"""
+    with DB_LOCK:
+        _fill_id_set(video_ids=video_ids, cur=cur)
+        _ = cur.execute("""
+            SELECT v.video_id, v.filename
+            FROM videos v
+            JOIN id_set s ON s.video_id = v.video_id
+            WHERE v.filename IS NOT NULL AND v.filename != ''
+        """)
+        return {row["video_id"]: row["filename"] for row in cur.fetchall()}  # pyright: ignore[reportAny]
+
+
+
+def remove_videos(video_ids: set[str], cur: sqlite3.Cursor, conn: sqlite3.Connection) -> int:
+    """
+    Remove many videos and their related rows in one transaction, the deletes
+    joining a TEMP table of the ids. Returns the number of videos removed.
+    """
+    if not video_ids:
+        return 0
+
+    with DB_LOCK:
+        _fill_id_set(video_ids=video_ids, cur=cur)
+        # Foreign keys aren't enforced on the connection, the related rows are deleted explicitly
+        _ = cur.execute("DELETE FROM removed_segments WHERE video_id IN (SELECT video_id FROM id_set)")
+        _ = cur.execute("DELETE FROM video_tags WHERE video_id IN (SELECT video_id FROM id_set)")
+        _ = cur.execute("DELETE FROM video_texts WHERE video_id IN (SELECT video_id FROM id_set)")
+        _ = cur.execute("DELETE FROM videos WHERE video_id IN (SELECT video_id FROM id_set)")
+        removed: int = cur.rowcount
+        for video_id in video_ids:
+            forget_video(video_id)
+        commit_db(conn=conn, force=True)
+
+    logger.info(f"[Remove Videos] Removed {removed} videos and their related data")
+    return removed
+
 
 
 
@@ -243,12 +733,13 @@ def remove_video(video_id: str, cur: sqlite3.Cursor, conn: sqlite3.Connection) -
 
 
 def get_videos_in_list(include_not_status0: bool,cur: sqlite3.Cursor) -> list[str]:
-    if include_not_status0:
-        _ = cur.execute("SELECT video_id FROM videos ORDER BY date_added DESC")
-    else:
-        _ = cur.execute("SELECT video_id FROM videos WHERE status IN (0,3) ORDER BY date_added ASC")
-    rows = cur.fetchall()
-    return [row["video_id"] for row in rows]  # pyright: ignore[reportAny]
+    with DB_LOCK:
+        if include_not_status0:
+            _ = cur.execute("SELECT video_id FROM videos ORDER BY date_added DESC")
+        else:
+            _ = cur.execute("SELECT video_id FROM videos WHERE status IN (0,3) ORDER BY date_added ASC")
+        rows = cur.fetchall()
+        return [row["video_id"] for row in rows]  # pyright: ignore[reportAny]
 
 
 
@@ -355,6 +846,10 @@ def row_to_video_info(row: sqlite3.Row) -> VideoInfo:
         "status": safe_status(row, "status"),
         "reason": safe_str(row, "reason"),
 
+        "fingerprint": safe_str(row, "fingerprint"),
+        "verified_at": safe_float(row, "verified_at"),
+        "metadata_digest": safe_str(row, "metadata_digest"),
+
         "date_added": safe_float(row, "date_added"),
         "date_modified": safe_float(row, "date_modified"),
     }
@@ -365,58 +860,220 @@ def row_to_video_info(row: sqlite3.Row) -> VideoInfo:
 
 
 
-def get_video_info_from_db(video_id: str, cur: sqlite3.Cursor) -> VideoInfo:
+def _assemble_video_info(row: sqlite3.Row, tags: list[str], skips: list[tuple[float, float]]) -> VideoInfo:
+    """Build the VideoInfo of a video from its row, tags and removed segments"""
+    video_info: VideoInfo = row_to_video_info(row=row)
+    if tags:
+        video_info["tags"] = tags
+    if skips:
+        video_info["skips"] = skips
+
+    # Only keep keys with non-null values
+    video_info_copy = video_info.copy()
+    for key, value in video_info_copy.items():
+        if value is None or (isinstance(value, str) and value == ""):
+            del video_info[key]
+
+    return video_info
+
+
+
+def _load_texts(video_id: str, video_info: VideoInfo, cur: sqlite3.Cursor) -> None:
+    """Add the VIDEO_TEXT_COLUMNS of the video to its cached VideoInfo, on first call only"""
+    if video_id in _texts_loaded:
+        return
+    _ = cur.execute(f"SELECT {', '.join(VIDEO_TEXT_COLUMNS)} FROM video_texts WHERE video_id = ?", (video_id,))
+    row: sqlite3.Row | None = cur.fetchone()  # pyright: ignore[reportAny]
+    if row is not None:
+        pending: VideoInfo = _dirty_fields.get(video_id, {})
+        for column in VIDEO_TEXT_COLUMNS:
+            value: object = decompress_text(row[column])
+            # Texts updated before being loaded are newer than the stored ones
+            if column not in pending and isinstance(value, str) and value:
+                video_info[column] = value
+    _texts_loaded.add(video_id)
+    logger.verbose(f"[Get Video Info] Loaded the texts of '{video_id}'")
+
+
+
+def get_video_info_from_db(video_id: str, cur: sqlite3.Cursor, with_texts: bool = False) -> VideoInfo:
     """
     Fetch a video's metadata (including tags and removed_segments)
     from the database and return it as a VideoInfo dict.
     Only non-null fields are included in the result.
+    The large texts (VIDEO_TEXT_COLUMNS) are only included `with_texts`.
+    A video is loaded once per run: every call returns the same VideoInfo,
+    kept up to date by update_video_db, so it must not be modified directly.
+    """
+    with DB_LOCK:
+        cached: VideoInfo | None = _video_cache.get(video_id)
+        if cached is not None:
+            if with_texts:
+                _load_texts(video_id=video_id, video_info=cached, cur=cur)
+            return cached
+
+        # --- Fetch main video row ---
+        _ = cur.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,))
+        row: sqlite3.Row = cur.fetchone()  # pyright: ignore[reportAny]
+        if not row:
+            logger.verbose(f"[Get Video Info] No entry found for video_id '{video_id}'")
+            return {}
+
+
+        # --- Fetch tags ---
+        _ = cur.execute("""
+            SELECT t.tag
+            FROM tags t
+            JOIN video_tags vt ON t.tag_id = vt.tag_id
+            WHERE vt.video_id = ?
+        """, (video_id,))
+        tags = [tag_row["tag"] for tag_row in cur.fetchall()]  # pyright: ignore[reportAny]
+
+        # --- Fetch removed segments ---
+        _ = cur.execute("""
+            SELECT segment_start, segment_end
+            FROM removed_segments
+            WHERE video_id = ?
+            ORDER BY segment_start
+        """, (video_id,))
+        skips: list[tuple[float, float]] = [(seg_row["segment_start"], seg_row["segment_end"]) for seg_row in cur.fetchall()]  # pyright: ignore[reportAny]
+
+        logger.verbose(f"[Get Video Info] Retrieved info for video_id '{video_id}'")
+
+        video_info: VideoInfo = _assemble_video_info(row=row, tags=tags, skips=skips)
+        _video_cache[video_id] = video_info
+        if with_texts:
+            _load_texts(video_id=video_id, video_info=video_info, cur=cur)
+        return video_info
+
+
+
+def preload_videos(cur: sqlite3.Cursor) -> int:
     """
-    # --- Fetch main video row ---
-    _ = cur.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,))
-    row: sqlite3.Row = cur.fetchone()  # pyright: ignore[reportAny]
-    if not row:
-        logger.verbose(f"[Get Video Info] No entry found for video_id '{video_id}'")
-        return {}
+    Load every video of the database into the identity map up front, with one query
+    per table instead of three per video, so that the following get_video_info_from_db
+    calls of the run don't touch the database.
+    Videos already loaded are kept as they are (they may have pending updates).
+    Returns the number of videos loaded.
+    """
+    with DB_LOCK:
+        _ = cur.execute("""
+            SELECT vt.video_id, t.tag
+            FROM video_tags vt
+            JOIN tags t ON t.tag_id = vt.tag_id
+        """)
+        tags_by_video: dict[str, list[str]] = {}
+        for tag_row in cur.fetchall():  # pyright: ignore[reportAny]
+            tags_by_video.setdefault(tag_row["video_id"], []).append(tag_row["tag"])  # pyright: ignore[reportAny]
+
+        _ = cur.execute("""
+            SELECT video_id, segment_start, segment_end
+            FROM removed_segments
+            ORDER BY video_id, segment_start
+        """)
+        skips_by_video: dict[str, list[tuple[float, float]]] = {}
+        for seg_row in cur.fetchall():  # pyright: ignore[reportAny]
+            skips_by_video.setdefault(seg_row["video_id"], []).append((seg_row["segment_start"], seg_row["segment_end"]))  # pyright: ignore[reportAny]
+
+        _ = cur.execute("SELECT * FROM videos")
+        loaded: int = 0
+        for row in cur.fetchall():  # pyright: ignore[reportAny]
+            video_id: str = row["video_id"]  # pyright: ignore[reportAny]
+            if video_id in _video_cache:
+                continue
+            _video_cache[video_id] = _assemble_video_info(
+                row=row,  # pyright: ignore[reportAny]
+                tags=tags_by_video.get(video_id, []),
+                skips=skips_by_video.get(video_id, [])
+            )
+            loaded += 1
 
-    # Only add keys with non-null values
-    video_info: VideoInfo = row_to_video_info(row=row)
+    logger.debug(f"[Preload Videos] Loaded {loaded} videos in 3 queries")
+    return loaded
 
 
-    # --- Fetch tags ---
-    _ = cur.execute("""
-        SELECT t.tag
-        FROM tags t
-        JOIN video_tags vt ON t.tag_id = vt.tag_id
-        WHERE vt.video_id = ?
-    """, (video_id,))
-    tags = [tag_row["tag"] for tag_row in cur.fetchall()]  # pyright: ignore[reportAny]
-    if tags:
-        video_info["tags"] = tags
 
-    # --- Fetch removed segments ---
-    _ = cur.execute("""
-        SELECT segment_start, segment_end
-        FROM removed_segments
-        WHERE video_id = ?
-        ORDER BY segment_start
-    """, (video_id,))
-    skips: list[tuple[float, float]] = [(seg_row["segment_start"], seg_row["segment_end"]) for seg_row in cur.fetchall()]  # pyright: ignore[reportAny]
-    if skips:
-        video_info["skips"] = skips
 
-    logger.verbose(f"[Get Video Info] Retrieved info for video_id '{video_id}'")
 
-    video_info_copy = video_info.copy()
 
 
-    for key, value in video_info_copy.items():
-        if value is None or (isinstance(value, str) and value == ""):
-            del video_info[key]
+def compact_db(conn: sqlite3.Connection) -> tuple[int, int]:
+    """
+    One-shot compaction: compress the texts stored before compression existed
+    (or before they moved to video_texts), then VACUUM to give the freed pages back.
+    Returns the size in bytes of the database (with its WAL) before and after.
+    """
+    def db_size() -> int:
+        return sum(path.stat().st_size for path in (DB_PATH, DB_PATH.with_name(DB_PATH.name + "-wal")) if path.exists())
+
+    with DB_LOCK:
+        size_before: int = db_size()
+        cur: sqlite3.Cursor = conn.cursor()
+
+        _ = cur.execute(f"SELECT video_id, {', '.join(VIDEO_TEXT_COLUMNS)} FROM video_texts")
+        recompressed: list[list[object]] = []
+        for row in cur.fetchall():  # pyright: ignore[reportAny]
+            values: list[object] = [row[column] for column in VIDEO_TEXT_COLUMNS]
+            compressed: list[object] = [compress_text(value) for value in values]
+            if compressed != values:
+                recompressed.append(compressed + [row["video_id"]])
+        _ = cur.executemany(
+            f"UPDATE video_texts SET {', '.join(f'{column} = ?' for column in VIDEO_TEXT_COLUMNS)} WHERE video_id = ?",
+            recompressed
+        )
+        conn.commit()
+        logger.info(f"[Compact DB] Compressed the texts of {len(recompressed)} videos")
+
+        # VACUUM can't run inside a transaction, the checkpoint folds the WAL back into the file
+        _ = cur.execute("VACUUM")
+        _ = cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cur.close()
+        size_after: int = db_size()
+
+    logger.info(f"[Compact DB] Database went from {size_before} to {size_after} bytes")
+    return size_before, size_after
+
+
 
 
-    return video_info
 
 
 
+# -----------------------------
+# Download directory scan cache
+# -----------------------------
+ScanCacheEntry: TypeAlias = tuple[int, int, int, Literal[0, 1, 2, 3], str | None] # size, mtime_ns, inode, state, data
+
+
+def get_scan_cache(cur: sqlite3.Cursor) -> dict[str, ScanCacheEntry]:
+    """
+    Return the cached result of the last parsing of every file of the download directory,
+    keyed by filename.
+    """
+    with DB_LOCK:
+        _ = cur.execute("SELECT filename, size, mtime_ns, inode, state, data FROM scan_cache")
+        rows = cur.fetchall()
+    return {row["filename"]: (row["size"], row["mtime_ns"], row["inode"], row["state"], row["data"]) for row in rows}  # pyright: ignore[reportAny]
 
 
+
+def update_scan_cache(
+    to_save: dict[str, ScanCacheEntry],
+    to_remove: set[str],
+    cur: sqlite3.Cursor,
+    conn: sqlite3.Connection
+) -> None:
+    """
+    Store the newly parsed files and forget the ones that are gone, in one transaction.
+    """
+    if not to_save and not to_remove:
+        return
+
+    with DB_LOCK:
+        _ = cur.executemany(
+            "INSERT OR REPLACE INTO scan_cache (filename, size, mtime_ns, inode, state, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(filename, *entry) for filename, entry in to_save.items()]
+        )
+        _ = cur.executemany("DELETE FROM scan_cache WHERE filename = ?", [(filename,) for filename in to_remove])
+        commit_db(conn=conn)
+    logger.debug(f"[Scan Cache] Saved {len(to_save)} entries, removed {len(to_remove)}")
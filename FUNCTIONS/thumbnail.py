@@ -8,6 +8,8 @@ from pathlib import Path
 from typing import Literal
 
 
+from FUNCTIONS.metadata import TagSession, save_tags
+
 from FUNCTIONS.HELPERS.logger import setup_logger
 logger = setup_logger(__name__)
 
@@ -56,17 +58,18 @@ def download_and_pad_image(image_url: str, save_path: Path,thumbnail_format: Lit
 
 
 
-def embed_image_in_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> bool:
+def embed_image_in_mp3(mp3_path: Path, image_path: Path, test_run: bool, session: TagSession | None = None) -> bool:
     """
     Loads an image from the specified file and embeds it as cover art into an MP3 file.
 
     :param mp3_path: Path to the MP3 file to modify.
     :param image_path: Path to the image file to embed as the cover art.
+    :param session: if given, the cover is queued on it instead of saving the file
     :return: True if embedding succeeded, False otherwise.
     """
     try:
         # Load the MP3 file
-        audio: MP3 = MP3(mp3_path, ID3=ID3)
+        audio: MP3 = session.audio if session else MP3(mp3_path, ID3=ID3)
         logger.debug(f"[Embed Cover] Loaded MP3: '{mp3_path}'")
 
         # Add ID3 tag if not already present
@@ -81,6 +84,10 @@ def embed_image_in_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> bool
             image_data: bytes = img_file.read()
             logger.debug(f"[Embed Cover] Read image file: '{image_path}'")
 
+        if session and has_embedded_cover(mp3_path=mp3_path, session=session) == image_data:
+            logger.debug(f"[Embed Cover] Same cover already embedded in '{mp3_path.name}'")
+            return True
+
         # Embed the image as cover art
         audio.tags.add(  # pyright: ignore[reportOptionalMemberAccess, reportUnknownMemberType]
             APIC(
@@ -94,7 +101,8 @@ def embed_image_in_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> bool
 
 
         # Save the MP3 with new tag
-        if not test_run: audio.save()  # pyright: ignore[reportUnknownMemberType]
+        if session: session.mark_changed()
+        elif not test_run: save_tags(audio=audio)
         logger.info(f"[Embed Cover] Successfully embedded cover into '{mp3_path.name}'")
         return True
 
@@ -105,13 +113,14 @@ def embed_image_in_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> bool
 
 
 
-def remove_image_from_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> bool:
+def remove_image_from_mp3(mp3_path: Path, image_path: Path, test_run: bool, session: TagSession | None = None) -> bool:
     """
     Removes any embedded cover art (APIC frames) from the MP3 file 
     and deletes the separate image if provided.
+    With a session, the removal is queued on it instead of saving the file.
     """
     try:
-        audio = MP3(mp3_path, ID3=ID3)
+        audio = session.audio if session else MP3(mp3_path, ID3=ID3)
         logger.debug(f"[Remove Cover] Loaded MP3: '{mp3_path}'")
 
         if audio.tags is None:  # pyright: ignore[reportUnknownMemberType]
@@ -131,8 +140,13 @@ def remove_image_from_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> b
                 del audio.tags[key]  # pyright: ignore[reportUnknownMemberType]
 
 
+        if session:
+            session.v2_version = 3  # force save as ID3v2.3 for max compatibility
+            session.mark_changed()
+        elif not test_run:
+            save_tags(audio=audio, v2_version=3)  # force save as ID3v2.3 for max compatibility
+
         if not test_run:
-            audio.save(v2_version=3)  # force save as ID3v2.3 for max compatibility  # pyright: ignore[reportUnknownMemberType]
             if image_path.exists():
                 image_path.unlink(missing_ok=True)
 
@@ -145,7 +159,7 @@ def remove_image_from_mp3(mp3_path: Path, image_path: Path, test_run: bool) -> b
 
 
 
-def has_embedded_cover(mp3_path: Path) -> bytes | None:
+def has_embedded_cover(mp3_path: Path, session: TagSession | None = None) -> bytes | None:
     """
     Checks if the given MP3 file has a non-empty embedded front cover image 
     and returns its bytes if present.
@@ -154,7 +168,7 @@ def has_embedded_cover(mp3_path: Path) -> bytes | None:
     :return: Tuple of (has_cover: bool, image_bytes: Optional[bytes])
     """
     try:
-        audio = MP3(mp3_path, ID3=ID3)
+        audio = session.audio if session else MP3(mp3_path, ID3=ID3)
         if audio.tags is None:  # pyright: ignore[reportUnknownMemberType]
             logger.debug(f"[Cover Check] No ID3 tags in '{mp3_path.name}'")
             return None
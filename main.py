@@ -1,3 +1,4 @@
+import sys
 import time
 from datetime import timedelta
 
@@ -10,7 +11,7 @@ from CONSTANTS import (
 )
 from FUNCTIONS.get_playlist_videos import fetch_playlist_videos
 from FUNCTIONS.PROCESS.show_final_stats import show_final_stats
-from FUNCTIONS.sql_requests import get_db_connection
+from FUNCTIONS.sql_requests import compact_db, get_db_connection, init_db
 from FUNCTIONS.process_all import process_all
 
 
@@ -48,7 +49,11 @@ def main_list_process() -> None:
     )
 
     # Step 2: Process database and files
-    with get_db_connection(create_if_not=CONFIG["processing"]["create_db_if_not"]) as conn:
+    # The parallel workers share the connection (serialized by DB_LOCK)
+    with get_db_connection(
+        create_if_not=CONFIG["processing"]["create_db_if_not"],
+        check_same_thread=CONFIG["processing"]["workers"] <= 1 and not CONFIG["processing"]["pipeline"] and CONFIG["processing"]["download_workers"] <= 1 and CONFIG["processing"]["prefetch_workers"] <= 1
+    ) as conn:
         cur = conn.cursor()
 
         processing_time: dict[str, float | None] = process_all(
@@ -101,6 +106,21 @@ def main_list_process() -> None:
             remove_no_longer_in_playlist=CONFIG["processing"]["remove_no_longer_in_playlist"],
             add_folder_files_not_in_list=CONFIG["processing"]["add_folder_files_not_in_list"],
 
+            # Concurrency
+            workers=CONFIG["processing"]["workers"],
+            pipeline=CONFIG["processing"]["pipeline"],
+            pipeline_queue_size=CONFIG["processing"]["pipeline_queue_size"],
+            pipeline_stage_workers=CONFIG["processing"]["pipeline_stage_workers"],
+            download_workers=CONFIG["processing"]["download_workers"],
+            prefetch_workers=CONFIG["processing"]["prefetch_workers"],
+
+            # Incremental runs
+            use_fingerprints=CONFIG["processing"]["use_fingerprints"],
+            scan_workers=CONFIG["processing"]["scan_workers"],
+            integrity_mode=CONFIG["processing"]["integrity_mode"],
+            metadata_format=CONFIG["processing"]["metadata_format"],
+            metadata_exclude_rebuildable=CONFIG["processing"]["metadata_exclude_rebuildable"],
+
             # DB cursor
             cur=cur,
             conn=conn,
@@ -132,7 +152,6 @@ def main_list_process() -> None:
         # Step 4: Show final stats
         if CONFIG["processing"]["info"]:
             show_final_stats(
-                download_path=DOWNLOAD_PATH,
                 entire_duration=total_processing_duration,
                 calculating_duration=calculating_duration,
                 download_duration=download_duration,
@@ -142,12 +161,26 @@ def main_list_process() -> None:
                 tag_duration=tag_duration,
                 album_duration=album_duration,
                 metadata_duration=metadata_duration,
-                cur=cur,
-                test_run=CONFIG["processing"]["test_run"],
-                remove_malformatted=CONFIG["processing"]["remove_malformatted"],
-                force_mp3_presence=CONFIG["processing"]["force_mp3_presence"]
+                cur=cur
             )
 
 
+def main_compact() -> None:
+    """
+    Compress the stored texts and VACUUM the database, then print the space saved.
+    Run with `python main.py --compact`, nothing else is processed.
+    """
+    with get_db_connection(create_if_not=False) as conn:
+        init_db(cur=conn.cursor(), conn=conn) # Brings older databases to the current schema first
+        size_before, size_after = compact_db(conn=conn)
+
+    saved: int = size_before - size_after
+    print(f"[Compact DB] {size_before / 1024 / 1024:.1f} MiB -> {size_after / 1024 / 1024:.1f} MiB ({saved / 1024 / 1024:.1f} MiB saved)")
+    logger.info(f"[Compact DB] Saved {saved} bytes")
+
+
 if __name__ == "__main__":
-    main_list_process()
+    if "--compact" in sys.argv[1:]:
+        main_compact()
+    else:
+        main_list_process()
@@ -0,0 +1,229 @@
+from pathlib import Path
+import struct
+
+import pytest
+
+from FUNCTIONS.mp3_frames import FrameHeader, find_frame, id3v2_size, parse_frame_header
+from FUNCTIONS.mp3_splice import Mp3SpliceError, splice_mp3
+
+
+
+
+# MPEG1 layer III, 128 kbps, 44.1 kHz, stereo, no CRC: 417 bytes and 1152 samples per frame
+HEADER: bytes = b"\xFF\xFB\x90\x00"
+FRAME_LENGTH: int = 417
+SIDE_INFO: int = 32
+FRAME_DURATION: float = 1152 / 44100
+FRAMES: int = 200 # 5.2s
+
+DELAY: int = 576
+PADDING: int = 1000
+
+ID3V2: bytes = b"ID3\x03\x00\x00\x00\x00\x00\x0A" + b"TIT2\x00\x00\x00\x00\x00\x00"
+ID3V1: bytes = b"TAG" + b"Title".ljust(30, b"\x00") + bytes(95)
+
+
+
+
+def crc16(data: bytes) -> int:
+    """Bitwise CRC-16/ARC, independent of the table-driven one being tested"""
+    crc: int = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+
+
+def audio_frame(index: int) -> bytes:
+    """Frame with empty side information (no bit reservoir) and its index as audio data"""
+    return HEADER + bytes(SIDE_INFO) + bytes([index % 200 + 1]) * (FRAME_LENGTH - 4 - SIDE_INFO)
+
+
+
+
+def info_frame(audio: bytes, frames: int) -> bytes:
+    """Info frame with every Xing field and a LAME tag, valid for `frames` frames of `audio`"""
+    frame: bytearray = bytearray(HEADER + bytes(SIDE_INFO) + b"Info" + struct.pack(">I", 0xF))
+    frame += struct.pack(">II", frames, FRAME_LENGTH + len(audio)) + bytes(range(0, 200, 2)) + struct.pack(">I", 0)
+    lame: int = len(frame)
+    frame += b"LAME3.100" + bytes(12) + ((DELAY << 12) | PADDING).to_bytes(3, "big") + bytes(4)
+    frame += struct.pack(">IH", FRAME_LENGTH + len(audio), crc16(audio))
+    frame += struct.pack(">H", crc16(bytes(frame[:lame + 34])))
+    return bytes(frame.ljust(FRAME_LENGTH, b"\x00"))
+
+
+
+
+def make_mp3(path: Path, xing: bool = True, trailer: bytes = ID3V1) -> Path:
+    audio: bytes = b"".join(audio_frame(index) for index in range(FRAMES))
+    _ = path.write_bytes(ID3V2 + (info_frame(audio, FRAMES) if xing else b"") + audio + trailer)
+    return path
+
+
+
+
+def frames_of(data: bytes) -> list[tuple[int, FrameHeader]]:
+    """Frames from the end of the ID3v2 tag, stopping at the first bytes that are not one"""
+    position: int = len(ID3V2)
+    frames: list[tuple[int, FrameHeader]] = []
+    while (header := parse_frame_header(data[position:position + 4])) is not None:
+        frames.append((position, header))
+        position += header["length"]
+    return frames
+
+
+
+
+def kept_indexes(data: bytes) -> list[int]:
+    """Index of each audio frame left, from the data byte it holds"""
+    return [data[position + 4 + SIDE_INFO] - 1 for position, _ in frames_of(data) if data[position + 4 + SIDE_INFO:position + 4 + SIDE_INFO + 4] != b"Info"]
+
+
+
+
+def dropped_by(segments: list[tuple[float, float]]) -> set[int]:
+    return {index for index in range(FRAMES) if any(start <= (index + 0.5) * FRAME_DURATION < end for start, end in segments)}
+
+
+
+
+@pytest.mark.parametrize("segments", [
+    [(0.0, 1.0)], # Start
+    [(2.0, 3.0)], # Middle
+    [(4.5, 10.0)], # End
+    [(0.0, 0.5), (2.0, 2.5), (4.9, 6.0)],
+])
+def test_cut_drops_the_frames_in_the_segments(tmp_path: Path, segments: list[tuple[float, float]]) -> None:
+    output: Path = tmp_path / "out.mp3"
+    removed: float = splice_mp3(input_file=make_mp3(tmp_path / "in.mp3"), output_file=output, segments=segments, test_run=False)
+
+    dropped: set[int] = dropped_by(segments)
+    assert kept_indexes(output.read_bytes()) == [index for index in range(FRAMES) if index not in dropped]
+    assert removed == pytest.approx(len(dropped) * FRAME_DURATION)
+
+
+
+
+def test_overlapping_segments_cut_like_their_union(tmp_path: Path) -> None:
+    source: Path = make_mp3(tmp_path / "in.mp3")
+    overlapping: Path = tmp_path / "overlapping.mp3"
+    union: Path = tmp_path / "union.mp3"
+    removed: float = splice_mp3(input_file=source, output_file=overlapping, segments=[(2.0, 3.0), (1.0, 2.5)], test_run=False)
+    _ = splice_mp3(input_file=source, output_file=union, segments=[(1.0, 3.0)], test_run=False)
+
+    assert overlapping.read_bytes() == union.read_bytes()
+    assert removed == pytest.approx(len(dropped_by([(1.0, 3.0)])) * FRAME_DURATION)
+
+
+
+
+@pytest.mark.parametrize("segments", [[(0.0, 1.0)], [(2.0, 3.0)], [(4.5, 10.0)]])
+def test_xing_and_lame_fields_match_the_output(tmp_path: Path, segments: list[tuple[float, float]]) -> None:
+    output: Path = tmp_path / "out.mp3"
+    _ = splice_mp3(input_file=make_mp3(tmp_path / "in.mp3"), output_file=output, segments=segments, test_run=False)
+    data: bytes = output.read_bytes()
+
+    frames: list[tuple[int, FrameHeader]] = frames_of(data)
+    info: bytes = data[len(ID3V2):len(ID3V2) + FRAME_LENGTH]
+    audio: bytes = data[len(ID3V2) + FRAME_LENGTH:len(data) - len(ID3V1)]
+    xing: int = 4 + SIDE_INFO
+    lame: int = xing + 8 + 4 + 4 + 100 + 4
+
+    assert struct.unpack(">I", info[xing + 8:xing + 12])[0] == len(frames) - 1
+    assert struct.unpack(">I", info[xing + 12:xing + 16])[0] == FRAME_LENGTH + len(audio)
+    assert list(info[xing + 16:xing + 116]) == sorted(info[xing + 16:xing + 116])
+
+    delay_padding: int = int.from_bytes(info[lame + 21:lame + 24], "big")
+    assert delay_padding >> 12 == (0 if segments[0][0] == 0.0 else DELAY)
+    assert delay_padding & 0xFFF == (0 if segments[0][1] > FRAMES * FRAME_DURATION else PADDING)
+    assert struct.unpack(">I", info[lame + 28:lame + 32])[0] == FRAME_LENGTH + len(audio)
+    assert struct.unpack(">H", info[lame + 32:lame + 34])[0] == crc16(audio)
+    assert struct.unpack(">H", info[lame + 34:lame + 36])[0] == crc16(info[:lame + 34])
+
+
+
+
+def test_tags_are_kept(tmp_path: Path) -> None:
+    ape_item: bytes = struct.pack("<II", 7, 0) + b"REPLAYGAIN_TRACK_GAIN\x00" + b"\xFF\xFB -6dB" # Frame sync in the value
+    ape_footer: bytes = b"APETAGEX" + struct.pack("<IIII", 2000, len(ape_item) + 32, 1, 0) + bytes(8)
+    trailer: bytes = ape_item + ape_footer + ID3V1
+    output: Path = tmp_path / "out.mp3"
+    _ = splice_mp3(input_file=make_mp3(tmp_path / "in.mp3", trailer=trailer), output_file=output, segments=[(1.0, 2.0)], test_run=False)
+    data: bytes = output.read_bytes()
+
+    assert data.startswith(ID3V2)
+    assert data.endswith(trailer)
+    assert kept_indexes(data) == [index for index in range(FRAMES) if index not in dropped_by([(1.0, 2.0)])]
+
+
+
+
+def test_without_xing_frame(tmp_path: Path) -> None:
+    output: Path = tmp_path / "out.mp3"
+    _ = splice_mp3(input_file=make_mp3(tmp_path / "in.mp3", xing=False, trailer=b""), output_file=output, segments=[(1.0, 2.0)], test_run=False)
+
+    assert output.read_bytes() == ID3V2 + b"".join(audio_frame(index) for index in range(FRAMES) if index not in dropped_by([(1.0, 2.0)]))
+
+
+
+
+def test_test_run_writes_nothing(tmp_path: Path) -> None:
+    output: Path = tmp_path / "out.mp3"
+    removed: float = splice_mp3(input_file=make_mp3(tmp_path / "in.mp3"), output_file=output, segments=[(1.0, 2.0)], test_run=True)
+
+    assert removed == 0.0
+    assert not output.exists()
+
+
+
+
+def test_no_frames_raises(tmp_path: Path) -> None:
+    source: Path = tmp_path / "in.mp3"
+    _ = source.write_bytes(ID3V2 + bytes(4000) + ID3V1)
+
+    with pytest.raises(Mp3SpliceError):
+        _ = splice_mp3(input_file=source, output_file=tmp_path / "out.mp3", segments=[(1.0, 2.0)], test_run=False)
+
+
+
+
+def test_parse_frame_header() -> None:
+    header: FrameHeader | None = parse_frame_header(HEADER)
+    assert header is not None
+    assert (header["version"], header["layer"], header["bitrate"], header["sample_rate"]) == ("1", 3, 128, 44100)
+    assert (header["samples"], header["length"], header["channel_mode"]) == (1152, FRAME_LENGTH, 0)
+
+    padded: FrameHeader | None = parse_frame_header(b"\xFF\xFB\x92\xC0") # Padding bit, mono
+    assert padded is not None
+    assert (padded["length"], padded["padding"], padded["channel_mode"]) == (FRAME_LENGTH + 1, True, 3)
+
+    mpeg2: FrameHeader | None = parse_frame_header(b"\xFF\xF3\x80\xC0") # MPEG2 layer III, 64 kbps, 22.05 kHz
+    assert mpeg2 is not None
+    assert (mpeg2["version"], mpeg2["samples"], mpeg2["length"]) == ("2", 576, 208)
+
+    assert parse_frame_header(b"\xFF\xFB\xF0\x00") is None # Bad bitrate
+    assert parse_frame_header(b"\xFF\xFB\x0C\x00") is None # Free format, bad sample rate
+    assert parse_frame_header(b"\xFF\xEB\x90\x00") is None # Reserved version
+    assert parse_frame_header(b"\xFF\xFB") is None
+
+
+
+
+def test_id3v2_size() -> None:
+    assert id3v2_size(ID3V2[:10]) == len(ID3V2)
+    assert id3v2_size(b"ID3\x04\x00\x10\x00\x00\x01\x00") == 10 + 128 + 10 # Footer
+    assert id3v2_size(HEADER + bytes(6)) == 0
+    assert id3v2_size(b"ID3\x03\x00\x00\x00\x00\x00\x80") is None # Not syncsafe
+
+
+
+
+def test_find_frame_skips_false_syncs() -> None:
+    data: bytes = b"\x00\xFF\xFB\x90\x00junk" + audio_frame(0) + audio_frame(1)
+    found: tuple[int, FrameHeader] | None = find_frame(data=data, start=0, end=len(data))
+    assert found is not None
+    assert found[0] == 9
+    assert find_frame(data=bytes(1000), start=0, end=1000) is None